@@ -0,0 +1,183 @@
+"""Content-addressed storage for telecaller uploads.
+
+Each distinct file is stored once, at BLOB_ROOT/<2 hex>/<sha256><ext>, and
+the blob table counts the upload rows that point at it. put() takes a file
+just streamed into INCOMING: a known hash only gains a reference, an
+unknown one gets a new row. release() drops a reference and deletes the row
+with the last one.
+
+Both run inside the caller's transaction and change the count with a
+single UPDATE, which holds the row lock until commit. The filesystem only
+changes once that commit has gone through: put() queues the move into the
+store (or the removal of a duplicate copy) on the session, run by an
+after_commit hook and dropped on rollback, so a failed transaction leaves
+every file where it was. The last release() returns the blob's path for
+remove_unreferenced() after the commit; it re-checks the row first, so a
+concurrent put() that stored the same content again keeps its file.
+
+Uploads stored before this (telecaller_{id}/{date}/{uid}.ext) are moved
+in, duplicates deleted, by `python blob_store.py` (add --dry-run to only
+report what would be reclaimed).
+"""
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Blob, Upload
+from uploads import ALLOWED_MIME, UPLOAD_ROOT, file_sha256
+
+BLOB_ROOT = UPLOAD_ROOT / "blobs"
+INCOMING = BLOB_ROOT / "incoming"
+BLOB_URL = "/uploads/blobs"
+
+
+def incoming_path(upload_id: str) -> Path:
+    """Where an upload is streamed before put() files it away."""
+    INCOMING.mkdir(parents=True, exist_ok=True)
+    return INCOMING / upload_id
+
+
+def blob_url(path: Path) -> str:
+    return f"{BLOB_URL}/{path.relative_to(BLOB_ROOT).as_posix()}"
+
+
+def in_store(filename: str) -> bool:
+    return Path(filename).is_relative_to(BLOB_ROOT)
+
+
+def blob_path(sha256: str, mime: str) -> Path:
+    return BLOB_ROOT / sha256[:2] / f"{sha256}{ALLOWED_MIME.get(mime, '')}"
+
+
+def _add_ref(db: Session, sha256: str) -> int:
+    return (
+        db.query(Blob)
+        .filter(Blob.sha256 == sha256)
+        .update({"refcount": Blob.refcount + 1}, synchronize_session=False)
+    )
+
+
+def put(db: Session, staged: Path, sha256: str, size: int, mime: str) -> Path:
+    """Take a reference to the blob holding `staged`'s content; returns its path.
+
+    When `db` commits, `staged` is moved into the store, or deleted if the
+    store already holds the content. On rollback it is left untouched (the
+    caller removes a temporary copy itself).
+    """
+    if not _add_ref(db, sha256):
+        path = blob_path(sha256, mime)
+        try:
+            with db.begin_nested():
+                db.add(Blob(sha256=sha256, path=path.as_posix(), size=size, refcount=1))
+        except IntegrityError:  # another upload stored the same content first
+            _add_ref(db, sha256)
+        else:
+            _on_commit(db, _file_away, staged, path)
+            return path
+
+    path = Path(db.query(Blob.path).filter(Blob.sha256 == sha256).scalar())
+    _on_commit(db, _file_away, staged, path)
+    return path
+
+
+def release(db: Session, sha256: str) -> Optional[Path]:
+    """Drop one reference (the caller commits).
+
+    Returns the blob's path when that was the last reference; pass it to
+    remove_unreferenced() once the commit has gone through.
+    """
+    db.query(Blob).filter(Blob.sha256 == sha256).update(
+        {"refcount": Blob.refcount - 1}, synchronize_session=False
+    )
+    blob = db.query(Blob).filter(Blob.sha256 == sha256).populate_existing().first()
+    if blob is not None and blob.refcount <= 0:
+        db.delete(blob)
+        return Path(blob.path)
+    return None
+
+
+def remove_unreferenced(db: Session, sha256: str, path: Path) -> None:
+    """Delete `path` unless a blob row for `sha256` exists (run outside the write transaction)."""
+    if db.query(Blob.sha256).filter(Blob.sha256 == sha256).first() is None:
+        path.unlink(missing_ok=True)
+
+
+# --- Filesystem changes applied on commit ---
+def _on_commit(db: Session, fn, *args) -> None:
+    db.info.setdefault("blob_file_ops", []).append((fn, args))
+
+
+def _file_away(staged: Path, path: Path) -> None:
+    if not staged.exists():
+        return
+    if path.exists():
+        staged.unlink()
+    else:  # new content, or the stored copy went missing: this one takes its place
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staged, path)
+
+
+# Both hooks also fire when a savepoint (begin_nested) ends; only the outer
+# transaction counts
+@sa_event.listens_for(Session, "after_commit")
+def _apply_file_ops(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    for fn, args in session.info.pop("blob_file_ops", None) or ():
+        fn(*args)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _drop_file_ops(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("blob_file_ops", None)
+
+
+# --- Moving the pre-existing upload tree into the store ---
+def dedup_uploads(db: Session, dry_run: bool = False) -> Dict[str, Any]:
+    """Move every upload still stored by date into the blob store, oldest first."""
+    report = {"uploads": 0, "stored": 0, "duplicates": 0, "bytes_reclaimed": 0, "missing": 0}
+    seen = {sha for (sha,) in db.query(Blob.sha256)}
+    rows = db.query(Upload).order_by(Upload.created_at, Upload.id).all()
+    for u in rows:
+        if in_store(u.filename):
+            continue
+        report["uploads"] += 1
+        path = Path(u.filename)
+        sha256 = file_sha256(path)
+        if sha256 is None:
+            report["missing"] += 1
+            continue
+        size = path.stat().st_size
+        if sha256 in seen:
+            report["duplicates"] += 1
+            report["bytes_reclaimed"] += size
+        else:
+            report["stored"] += 1
+            seen.add(sha256)
+        if dry_run:
+            continue
+        dest = put(db, path, sha256, size, u.mime)
+        u.filename, u.url, u.sha256 = dest.as_posix(), blob_url(dest), sha256
+        db.commit()
+
+    if not dry_run:
+        # The dated folders are empty now unless they hold files no row knew about
+        for folder in sorted(UPLOAD_ROOT.glob("telecaller_*/*"), reverse=True) + sorted(UPLOAD_ROOT.glob("telecaller_*")):
+            if folder.is_dir() and not any(folder.iterdir()):
+                folder.rmdir()
+    return report
+
+
+if __name__ == "__main__":
+    session = SessionLocal()
+    try:
+        print(dedup_uploads(session, dry_run="--dry-run" in sys.argv))
+    finally:
+        session.close()
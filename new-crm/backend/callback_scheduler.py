@@ -0,0 +1,194 @@
+"""Fires callback reminders when they fall due.
+
+Pending callbacks due in the future sit in a heap ordered by due_at; a timer
+thread sleeps until the earliest one and publishes a "callback_due" event to
+the telecaller's topic on the event bus. The callback routes call schedule()
+or cancel() after committing, and a periodic resync() from the table picks
+up changes made through other workers. Entries are never removed from the
+heap in place: each carries the due_at it was pushed with and is ignored
+when that no longer matches the callback's current one.
+
+Before firing, the due callbacks are re-read (with their lead) in one query,
+so a reminder is only sent for a callback that is still pending at that time.
+Overdue callbacks are not replayed here: a client gets those when it
+connects (see overdue_events).
+"""
+import heapq
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from event_bus import bus, telecaller_topic
+from models import Callback, Lead
+
+RESYNC_SECONDS = int(os.getenv("CRM_CALLBACK_RESYNC_SECONDS", "30"))
+
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    return dt.isoformat() + "Z" if dt else None
+
+
+def reminder_payload(cb: Callback, lead: Optional[Lead], overdue: bool = False) -> Dict[str, Any]:
+    return {
+        "id": cb.id,
+        "lead_id": cb.lead_id,
+        "telecaller_id": cb.telecaller_id,
+        "due_at": _iso(cb.due_at),
+        "note": cb.note,
+        "lead_name": lead.name if lead else None,
+        "lead_phone": lead.phone if lead else None,
+        "overdue": overdue,
+    }
+
+
+class CallbackScheduler:
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[datetime, int]] = []  # (due_at, callback id)
+        self._due: Dict[int, datetime] = {}           # callback id -> current due_at, pending only
+        self._settled: Dict[int, datetime] = {}       # already-due callbacks (fired or overdue on load)
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self.fired = 0
+
+    # --- Keeping the heap current ---
+    def schedule(self, callback_id: int, due_at: datetime, status: str = "pending") -> None:
+        """Record a callback's current due time; non-pending ones are dropped."""
+        if status != "pending":
+            self.cancel(callback_id)
+            return
+        with self._cond:
+            if self._due.get(callback_id) == due_at or self._settled.get(callback_id) == due_at:
+                return
+            self._settled.pop(callback_id, None)
+            self._due[callback_id] = due_at
+            heapq.heappush(self._heap, (due_at, callback_id))
+            if self._heap[0] == (due_at, callback_id):
+                self._cond.notify()  # new earliest deadline
+
+    def cancel(self, callback_id: int) -> None:
+        with self._cond:
+            self._due.pop(callback_id, None)
+            self._settled.pop(callback_id, None)
+
+    def resync(self, db: Session) -> Dict[str, int]:
+        """Reload pending callbacks from the table.
+
+        Callbacks this worker had not seen that are already due (created or
+        rescheduled through another worker since the last resync) fire now.
+        """
+        rows = db.query(Callback.id, Callback.due_at).filter(Callback.status == "pending").all()
+        now = datetime.utcnow()
+        # The startup load only seeds: whatever is overdue then was due before we were running
+        initial = self._thread is None
+        with self._cond:
+            due, settled, late = {}, {}, []
+            for cb_id, due_at in rows:
+                if due_at > now:
+                    due[cb_id] = due_at
+                    continue
+                if not initial and self._settled.get(cb_id) != due_at:
+                    late.append(cb_id)
+                settled[cb_id] = due_at
+            self._due, self._settled = due, settled
+            self._heap = [(due_at, cb_id) for cb_id, due_at in due.items()]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        if late:
+            self._fire(late)
+        return {"scheduled": len(self._heap), "fired_late": len(late)}
+
+    # --- Timer thread ---
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = False
+        db = SessionLocal()
+        try:
+            self.resync(db)
+        finally:
+            db.close()
+        self._thread = threading.Thread(target=self._run, name="callback-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    def _run(self) -> None:
+        next_resync = datetime.utcnow().timestamp() + RESYNC_SECONDS
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                now = datetime.utcnow()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, cb_id = heapq.heappop(self._heap)
+                    if self._due.get(cb_id) == due_at:  # else: stale entry
+                        del self._due[cb_id]
+                        self._settled[cb_id] = due_at
+                        due.append(cb_id)
+                if not due:
+                    wait = next_resync - now.timestamp()
+                    if self._heap:
+                        wait = min(wait, (self._heap[0][0] - now).total_seconds())
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+            if due:
+                self._fire(due)
+            if datetime.utcnow().timestamp() >= next_resync:
+                next_resync = datetime.utcnow().timestamp() + RESYNC_SECONDS
+                db = SessionLocal()
+                try:
+                    self.resync(db)
+                except Exception:
+                    db.rollback()
+                finally:
+                    db.close()
+
+    def _fire(self, callback_ids: List[int]) -> None:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(Callback, Lead)
+                .outerjoin(Lead, Lead.id == Callback.lead_id)
+                .filter(Callback.id.in_(callback_ids), Callback.status == "pending")
+                .all()
+            )
+        except Exception:
+            return
+        finally:
+            db.close()
+        now = datetime.utcnow()
+        for cb, lead in rows:
+            if cb.due_at <= now:  # else rescheduled later through another worker; resync re-adds it
+                bus.publish(telecaller_topic(cb.telecaller_id), "callback_due", reminder_payload(cb, lead))
+                self.fired += 1
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._due)
+
+
+def overdue_events(db: Session, telecaller_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+    """Reminders for callbacks already due, sent to a client as it connects."""
+    rows = (
+        db.query(Callback, Lead)
+        .outerjoin(Lead, Lead.id == Callback.lead_id)
+        .filter(Callback.telecaller_id == telecaller_id, Callback.status == "pending",
+                Callback.due_at <= datetime.utcnow())
+        .order_by(Callback.due_at)
+        .limit(limit)
+        .all()
+    )
+    return [reminder_payload(cb, lead, overdue=True) for cb, lead in rows]
+
+
+callback_scheduler = CallbackScheduler()
@@ -0,0 +1,106 @@
+"""Admin dashboard counters: two aggregate queries behind a TTL cache.
+
+stage_counts counts leads by their current stage (Lead.current_stage). It
+used to count lead_details history rows per stage, so a lead that moved
+fresh -> connected -> hot was counted under all three; now each lead is
+counted once, under the stage it is in. "Today" is the IST calendar day
+for every counter.
+
+Structural writes (imports, assignments, user/project/site-visit edits) call
+invalidate_stats(). Stage counts that move with every call outcome are left
+to the TTL, which also bounds how stale another worker process (which never
+sees an invalidation) can get.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from location_history import day_bounds, ist_today
+from models import Lead, LeadBatch, Project, SiteVisit, User
+
+STATS_TTL = float(os.getenv("CRM_STATS_TTL", "30"))
+
+_lock = threading.Lock()
+_cached: Optional[Dict[str, Any]] = None
+_cached_at = 0.0  # time.monotonic()
+_cached_wall: Optional[datetime] = None
+_generation = 0
+
+
+def invalidate_stats() -> None:
+    global _cached, _generation
+    _generation += 1
+    _cached = None
+
+
+def compute_stats(db: Session) -> Dict[str, Any]:
+    day_start, day_end = day_bounds(ist_today())  # naive UTC, like the stored timestamps
+
+    # One pass over leads: total, assigned and per-stage counts (Lead.current_stage)
+    stage_rows = (
+        db.query(Lead.current_stage, func.count(Lead.id), func.count(Lead.assigned_to))
+        .group_by(Lead.current_stage)
+        .all()
+    )
+    stage_counts = {stage: n for stage, n, _ in stage_rows if stage}
+
+    # Everything else is a scalar subquery of one SELECT; each is an index range
+    # (lead_batch.created_at, leads.batch_id) or a small table
+    uploaded_today = (
+        select(func.count(Lead.id))
+        .join(LeadBatch, LeadBatch.id == Lead.batch_id)
+        .where(LeadBatch.created_at >= day_start, LeadBatch.created_at < day_end)
+        .scalar_subquery()
+    )
+    users = select(
+        func.count(case((User.role == "manager", 1))),
+        func.count(case((User.role == "telecaller", 1))),
+    ).subquery()
+    row = db.execute(
+        select(
+            uploaded_today,
+            users.c[0],
+            users.c[1],
+            select(func.count(Project.id)).scalar_subquery(),
+            select(func.count(SiteVisit.id))
+            .where(SiteVisit.date >= day_start, SiteVisit.date < day_end)  # ix_site_visits_date
+            .scalar_subquery(),
+        ).select_from(users)
+    ).one()
+
+    return {
+        "leads_uploaded_today": row[0],
+        "total_leads": sum(n for _, n, _ in stage_rows),
+        "assigned_leads": sum(a for _, _, a in stage_rows),
+        "stage_counts": stage_counts,
+        "managers": row[1],
+        "telecallers": row[2],
+        "projects": row[3],
+        "site_visits_today": row[4],
+    }
+
+
+def get_stats(db: Session, refresh: bool = False) -> Dict[str, Any]:
+    """Cached stats plus cached_at / cache_age_seconds."""
+    global _cached, _cached_at, _cached_wall
+    with _lock:  # one recompute at a time; waiters get its result
+        now = time.monotonic()
+        if refresh or _cached is None or now - _cached_at > STATS_TTL:
+            generation = _generation
+            stats = compute_stats(db)
+            at, wall = now, datetime.utcnow()
+            # A write that landed mid-compute may be missing; serve, don't keep
+            if generation == _generation:
+                _cached, _cached_at, _cached_wall = stats, at, wall
+        else:
+            stats, at, wall = _cached, _cached_at, _cached_wall
+    return {
+        **stats,
+        "cached_at": wall.isoformat() + "Z",
+        "cache_age_seconds": round(time.monotonic() - at, 3),
+    }
@@ -0,0 +1,52 @@
+"""Conditional GET for endpoints whose body is a function of version stamps.
+
+The ETag is a hash of the endpoint, its parameters and the stamps
+(versions.py) of the data behind it, so it is known before the body is
+built: a matching If-None-Match gets a bodiless 304 without touching the
+data. Stamps are read with their updated_at, so a database recreated from
+scratch (stamps back at 0) never reproduces an old tag.
+"""
+import hashlib
+from typing import Any, Callable, Iterable
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from models import DataVersion
+
+# Clients may keep the body but must revalidate before each use
+CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(db: Session, names: Iterable[str], *params: Any) -> str:
+    names = sorted(names)
+    rows = {
+        name: (version, updated_at)
+        for name, version, updated_at in db.query(DataVersion.name, DataVersion.version, DataVersion.updated_at)
+        .filter(DataVersion.name.in_(names))
+        .all()
+    }
+    raw = "|".join(
+        [repr(p) for p in params]
+        + [f"{name}={rows[name][0]}@{rows[name][1].isoformat() if rows[name][1] else ''}" if name in rows else f"{name}=0"
+           for name in names]
+    )
+    return '"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+
+def _matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
+
+
+def conditional_json(request: Request, db: Session, names: Iterable[str], params: tuple, build: Callable[[], Any]) -> Response:
+    """304 if the client's copy is current, else build() as JSON with its ETag."""
+    etag = compute_etag(db, names, request.url.path, *params)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(jsonable_encoder(build()), headers=headers)
@@ -0,0 +1,229 @@
+"""In-process publish/subscribe for pushing events to connected clients.
+
+Topics are strings ("telecaller:7"). Subscribers are SSE connections living
+on the event loop; publishers are ordinary sync route handlers and
+background threads, so publish() hands each event to the loop thread-safely.
+Every subscriber has a bounded queue: a client too slow to keep up loses its
+oldest events rather than holding memory.
+
+Each worker process has its own bus and only reaches the clients connected
+to it. Events that originate in a request or job (lead assignment,
+attendance, site visits) go through announce(): they are sent when the
+session commits, as a Postgres NOTIFY that every worker's relay thread
+re-publishes locally, so a client gets them whichever worker it is
+connected to. Callback reminders don't need this; callback_scheduler runs in
+every worker and publishes directly.
+
+The last REPLAY_EVENTS events per topic are kept so a reconnecting client
+(Last-Event-ID) gets what it missed; ids carry the worker's epoch, and a
+client whose id this worker can't place is told to resync instead.
+"""
+import asyncio
+import itertools
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from sqlalchemy import event as sa_event, text
+from sqlalchemy.orm import Session
+
+from database import engine
+
+SUBSCRIBER_QUEUE = 256
+REPLAY_EVENTS = int(os.getenv("CRM_EVENT_REPLAY", "50"))
+NOTIFY_CHANNEL = "crm_events"
+NOTIFY_MAX_BYTES = 7900  # Postgres caps a NOTIFY payload at 8000 bytes
+
+
+def telecaller_topic(telecaller_id: int) -> str:
+    return f"telecaller:{telecaller_id}"
+
+
+class Subscription:
+    def __init__(self, topic: str, loop: asyncio.AbstractEventLoop, maxsize: int) -> None:
+        self.topic = topic
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize)
+        self.dropped = 0
+        # Newest event published before this subscription; every later one is queued
+        self.start_seq = 0
+        self.start_id = ""
+
+    def _deliver(self, event: Dict[str, Any]) -> None:
+        # Runs on the loop thread
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE, replay: int = REPLAY_EVENTS) -> None:
+        self._lock = threading.Lock()
+        self._subs: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._history: Dict[str, Deque[Dict[str, Any]]] = defaultdict(lambda: deque(maxlen=replay))
+        self._evicted: Dict[str, int] = {}  # topic -> seq of the newest event no longer replayable
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+
+    def subscribe(self, topic: str) -> Subscription:
+        """Call from the event loop that will consume the subscription's queue."""
+        sub = Subscription(topic, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            sub.start_seq = self._last_seq
+            sub.start_id = f"{self.epoch}-{self._last_seq}"
+            self._subs[topic].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.topic)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.topic]
+
+    def publish(self, topic: str, event_type: str, data: Any) -> Dict[str, Any]:
+        """Send to every subscriber of `topic` on this worker; safe from any thread."""
+        with self._lock:
+            seq = self._last_seq = next(self._seq)
+            event = {
+                "id": f"{self.epoch}-{seq}",
+                "seq": seq,
+                "type": event_type,
+                "data": data,
+                "at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            }
+            history = self._history[topic]
+            if len(history) == history.maxlen:
+                self._evicted[topic] = history[0]["seq"]
+            history.append(event)
+            subs = list(self._subs.get(topic, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, event)
+            except RuntimeError:  # loop closed under a dying connection
+                self.unsubscribe(sub)
+        return event
+
+    def since(self, topic: str, last_event_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Events on `topic` after `last_event_id`, or None if they can't be told apart
+        (an id from another worker or a restart, or older than the replay window)."""
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        last = int(seq)
+        with self._lock:
+            if last < self._evicted.get(topic, 0):
+                return None
+            return [e for e in self._history.get(topic, ()) if e["seq"] > last]
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        with self._lock:
+            if topic is not None:
+                return len(self._subs.get(topic, ()))
+            return sum(len(s) for s in self._subs.values())
+
+
+bus = EventBus()
+
+
+# --- Publishing on commit ---
+def announce(db: Session, topic: str, event_type: str, data: Any) -> None:
+    """Publish once `db` commits (dropped on rollback), on every worker."""
+    db.info.setdefault("pending_events", []).append((topic, event_type, data))
+
+
+def _is_postgres(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+# The commit/rollback hooks also fire when a savepoint (begin_nested, e.g. in
+# bump_version) ends; only the outer transaction counts
+@sa_event.listens_for(Session, "before_commit")
+def _notify_pending(session: Session) -> None:
+    pending = session.info.get("pending_events")
+    if not pending or session.in_nested_transaction() or not _is_postgres(session):
+        return
+    # NOTIFY is transactional: listeners see it only if this commit succeeds
+    for topic, event_type, data in pending:
+        payload = json.dumps({"topic": topic, "type": event_type, "data": data}, default=str)
+        if len(payload.encode()) > NOTIFY_MAX_BYTES:
+            payload = json.dumps({"topic": topic, "type": "resync", "data": {"reason": event_type}})
+        session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+    session.info["pending_events"] = []
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    # Without Postgres there is no NOTIFY; deliver to this worker's clients only
+    for topic, event_type, data in session.info.pop("pending_events", None) or ():
+        bus.publish(topic, event_type, data)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("pending_events", None)
+
+
+# --- Relay from Postgres ---
+class NotifyRelay:
+    """LISTENs on NOTIFY_CHANNEL and republishes each notification on the local bus."""
+
+    def __init__(self) -> None:
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.relayed = 0
+
+    def start(self) -> None:
+        if engine.dialect.name != "postgresql" or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                raw.detach()  # a LISTEN connection must not go back to the pool
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                while not self._stop.is_set():
+                    if not select.select([conn], [], [], 1.0)[0]:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._relay(conn.notifies.pop(0).payload)
+            except Exception:
+                time.sleep(5)  # database restarting; reconnect
+            finally:
+                if raw is not None:
+                    raw.close()
+
+    def _relay(self, payload: str) -> None:
+        try:
+            msg = json.loads(payload)
+            bus.publish(msg["topic"], msg["type"], msg.get("data"))
+            self.relayed += 1
+        except (ValueError, KeyError, TypeError):
+            pass
+
+
+event_relay = NotifyRelay()
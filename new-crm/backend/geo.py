@@ -0,0 +1,130 @@
+"""In-process spatial index for projects and telecaller positions.
+
+Points are bucketed into a fixed grid of CELL_DEG degrees (~1.1 km of
+latitude). A radius query scans only the cells overlapping the circle's
+bounding box; k-nearest walks outward ring by ring and stops once the ring
+is farther than the k-th best distance found. With thousands of points either
+answers in well under a millisecond, so no database spatial extension is
+needed: the project grid is cached per catalog version and the telecaller
+grid is rebuilt from the last-known-position index (O(agents)) per request.
+"""
+import heapq
+import math
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_KM = 6371.0088
+CELL_DEG = 0.01
+
+Point = Tuple[Any, float, float]  # (key, lat, lng)
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def valid_point(lat: Optional[float], lng: Optional[float]) -> bool:
+    return lat is not None and lng is not None and -90 <= lat <= 90 and -180 <= lng <= 180
+
+
+class GridIndex:
+    def __init__(self, points: Iterable[Point], cell_deg: float = CELL_DEG) -> None:
+        self.cell = cell_deg
+        self._cells: Dict[Tuple[int, int], List[Point]] = defaultdict(list)
+        keys, lats, lngs = [], [], []
+        for key, lat, lng in points:
+            if valid_point(lat, lng):
+                self._cells[self._cell_of(lat, lng)].append((key, lat, lng))
+                keys.append(key)
+                lats.append(lat)
+                lngs.append(lng)
+        self.size = len(keys)
+        # Flat copies for the vectorized full scan in nearest()
+        self._keys = keys
+        self._lat = np.radians(np.array(lats, dtype=float))
+        self._lng = np.radians(np.array(lngs, dtype=float))
+
+    def _cell_of(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell), math.floor(lng / self.cell)
+
+    def _lng_cells(self, lat: float, km: float) -> int:
+        # Degrees of longitude shrink with latitude; clamp near the poles
+        km_per_deg = 111.32 * max(math.cos(math.radians(lat)), 0.01)
+        return math.ceil(km / km_per_deg / self.cell)
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[Any, float]]:
+        """(key, distance_km) of every point within radius_km, nearest first."""
+        ci, cj = self._cell_of(lat, lng)
+        di = math.ceil(radius_km / 110.574 / self.cell)
+        dj = self._lng_cells(lat, radius_km)
+        hits = []
+        for i in range(ci - di, ci + di + 1):
+            for j in range(cj - dj, cj + dj + 1):
+                for key, plat, plng in self._cells.get((i, j), ()):
+                    d = haversine_km(lat, lng, plat, plng)
+                    if d <= radius_km:
+                        hits.append((key, d))
+        hits.sort(key=lambda h: h[1])
+        return hits
+
+    def nearest(self, lat: float, lng: float, k: int, max_km: Optional[float] = None) -> List[Tuple[Any, float]]:
+        """The k nearest (key, distance_km), optionally no farther than max_km."""
+        if k <= 0 or not self.size:
+            return []
+        ci, cj = self._cell_of(lat, lng)
+        # Points outside ring r are at least r cells away in both directions
+        ring_km = self.cell * 110.574 * max(math.cos(math.radians(lat)), 0.01)
+        best: List[Tuple[float, int, Any]] = []  # max-heap on distance (negated)
+        seq = 0
+
+        def offer(key, plat, plng) -> None:
+            nonlocal seq
+            d = haversine_km(lat, lng, plat, plng)
+            if max_km is not None and d > max_km:
+                return
+            seq += 1
+            if len(best) < k:
+                heapq.heappush(best, (-d, seq, key))
+            elif d < -best[0][0]:
+                heapq.heapreplace(best, (-d, seq, key))
+
+        ring = 0
+        while True:
+            if (2 * ring + 1) ** 2 > len(self._cells):
+                # The walk would visit more cells than are occupied: scan everything at once
+                return self._scan(lat, lng, k, max_km)
+            for cell in self._ring(ci, cj, ring):
+                for point in self._cells.get(cell, ()):
+                    offer(*point)
+            floor_km = ring * ring_km
+            if len(best) == k and floor_km >= -best[0][0]:
+                break
+            if max_km is not None and floor_km > max_km:
+                break
+            ring += 1
+        return sorted(((key, -nd) for nd, _, key in best), key=lambda h: h[1])
+
+    def _scan(self, lat: float, lng: float, k: int, max_km: Optional[float]) -> List[Tuple[Any, float]]:
+        p1, l1 = math.radians(lat), math.radians(lng)
+        a = np.sin((self._lat - p1) / 2) ** 2 + math.cos(p1) * np.cos(self._lat) * np.sin((self._lng - l1) / 2) ** 2
+        d = 2 * EARTH_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+        idx = np.argpartition(d, k - 1)[:k] if k < len(d) else np.arange(len(d))
+        idx = idx[np.argsort(d[idx], kind="stable")]
+        return [(self._keys[i], float(d[i])) for i in idx if max_km is None or d[i] <= max_km]
+
+    @staticmethod
+    def _ring(ci: int, cj: int, r: int):
+        if r == 0:
+            yield ci, cj
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield ci - r, j
+            yield ci + r, j
+        for i in range(ci - r + 1, ci + r):
+            yield i, cj - r
+            yield i, cj + r
@@ -1,5 +1,6 @@
 from database import Base, engine, SessionLocal
 from models import User, Lead, Project  # add Lead here
+from lead_import import normalize_phone
 
 db = SessionLocal()
 
@@ -26,9 +27,9 @@ db.commit()
 
 # Add leads for telecaller
 db.add_all([
-    Lead(name="Ravi Arjun", phone="9012345678", status="fresh", assigned_to=3),
-    Lead(name="Anjali Sanu", phone="9123456789", status="fresh", assigned_to=3),
-    Lead(name="Pooja Singh", phone="9234567890", status="fresh", assigned_to=3),
+    Lead(name="Ravi Arjun", phone="9012345678", phone_norm=normalize_phone("9012345678"), status="fresh", assigned_to=3),
+    Lead(name="Anjali Sanu", phone="9123456789", phone_norm=normalize_phone("9123456789"), status="fresh", assigned_to=3),
+    Lead(name="Pooja Singh", phone="9234567890", phone_norm=normalize_phone("9234567890"), status="fresh", assigned_to=3),
 ])
 
 db.commit()
@@ -8,9 +8,15 @@ import uuid
 from passlib.hash import bcrypt
 
 from database import Base, engine, SessionLocal
+from lead_import import normalize_phone
+from lead_state import rebuild_lead_state
+from project_match import backfill_features
+from site_visits import parse_visit_date
+from versions import bump_version
 from models import (
     User,
     Lead,
+    LeadBatch,
     LeadDetails,
     Project,
     ProjectInfo,
@@ -304,6 +310,8 @@ def seed_leads(db, telecallers, project_ids):
 
     leads_created = []
     seed_batch = f"seed_{str(uuid.uuid4())[:8]}"
+    db.add(LeadBatch(id=seed_batch, filename="seed"))
+    db.commit()
 
     for i in range(30):
         name = f"{pick(first_names)} {pick(last_names)}"
@@ -315,8 +323,10 @@ def seed_leads(db, telecallers, project_ids):
         lead = Lead(
             name=name,
             phone=phone,
+            phone_norm=normalize_phone(phone),  # import dedup matches on this
             status=status,
-            assigned_to=assigned_to
+            assigned_to=assigned_to,
+            batch_id=seed_batch
         )
         db.add(lead)
         db.commit()
@@ -343,7 +353,7 @@ def seed_leads(db, telecallers, project_ids):
             sv = SiteVisit(
                 lead_id=lead.id,
                 project_id=pick(project_ids),
-                date=visit_date.isoformat(),
+                date=parse_visit_date(visit_date.isoformat()),
                 notes=pick(["Morning slot", "Client prefers evening", "Bring brochure", "Parking needed"])
             )
             db.add(sv)
@@ -374,6 +384,11 @@ def main():
 
         print("📞 Seeding leads + details (+ some site visits)…")
         lead_ids = seed_leads(db, u["telecallers"], project_ids)
+        rebuild_lead_state(db)
+        backfill_features(db)
+        # Fresh stamps, so nothing cached against the dropped data is reused
+        bump_version(db, "users", "projects", "assignments", "site_visits")
+        db.commit()
 
         print("\n✅ Seed complete.")
         print(f"Admins: 1 | Managers: {len(u['managers'])} | Telecallers: {len(u['telecallers'])}")
@@ -0,0 +1,160 @@
+"""In-process background jobs: spreadsheet imports and report builds.
+
+Uploads are saved under JOB_ROOT and handed to a thread pool; state lives in
+the `import_job` table so any worker process can answer progress polls.
+"""
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import ImportJob
+
+JOB_ROOT = Path("job_files")
+JOB_WORKERS = int(os.getenv("CRM_JOB_WORKERS", "2"))
+# A queued/running job with no progress update for this long is considered lost
+STALE_AFTER = timedelta(minutes=10)
+
+# handler(db, path, job_id, on_progress, **params) -> JSON-serializable result
+JobHandler = Callable[..., Dict[str, Any]]
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="import-job")
+# Submitted jobs that have not started yet, so shutdown can fail the ones it cancels
+_queued: Dict[int, Future] = {}
+_queued_lock = threading.Lock()
+
+
+def save_upload(fileobj, suffix: str = ".xlsx") -> Path:
+    """Copy an uploaded file to JOB_ROOT in chunks and return its path."""
+    JOB_ROOT.mkdir(parents=True, exist_ok=True)
+    path = JOB_ROOT / f"{uuid.uuid4().hex}{suffix}"
+    with path.open("wb") as out:
+        while True:
+            block = fileobj.read(1024 * 1024)
+            if not block:
+                break
+            out.write(block)
+    return path
+
+
+def submit_job(
+    db: Session,
+    kind: str,
+    filename: str,
+    path: Optional[Path],
+    handler: JobHandler,
+    total_rows: Optional[int] = None,
+    **params: Any,
+) -> ImportJob:
+    job = ImportJob(kind=kind, status="queued", filename=filename, total_rows=total_rows)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    with _queued_lock:
+        _queued[job.id] = _executor.submit(_run_job, job.id, path, handler, params)
+    return job
+
+
+def _set(db: Session, job_id: int, **fields: Any) -> None:
+    fields["updated_at"] = datetime.utcnow()
+    db.query(ImportJob).filter(ImportJob.id == job_id).update(fields)
+    db.commit()
+
+
+def _run_job(job_id: int, path: Optional[Path], handler: JobHandler, params: Dict[str, Any]) -> None:
+    with _queued_lock:
+        _queued.pop(job_id, None)
+    db = SessionLocal()
+    try:
+        _set(db, job_id, status="running", started_at=datetime.utcnow())
+
+        def on_progress(processed: int, rejects: int) -> None:
+            _set(db, job_id, rows_processed=processed, rejects=rejects)
+
+        result = handler(db, path, job_id=job_id, on_progress=on_progress, **params)
+        _set(
+            db, job_id,
+            status="done",
+            result_json=json.dumps(result, default=str),
+            finished_at=datetime.utcnow(),
+        )
+    except Exception as exc:
+        db.rollback()
+        _set(db, job_id, status="failed", error=str(exc), finished_at=datetime.utcnow())
+    finally:
+        db.close()
+        if path is not None:  # the uploaded input, if the job had one
+            try:
+                path.unlink(missing_ok=True)
+            except Exception:
+                pass
+
+
+def fail_interrupted_jobs() -> None:
+    """Mark jobs lost with a previous process as failed.
+
+    Only stale jobs are touched, so a restarting worker does not fail jobs
+    that a sibling uvicorn worker is still running.
+    """
+    db = SessionLocal()
+    try:
+        db.query(ImportJob).filter(
+            ImportJob.status.in_(["queued", "running"]),
+            ImportJob.updated_at < datetime.utcnow() - STALE_AFTER,
+        ).update(
+            {"status": "failed", "error": "interrupted by server restart", "finished_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def shutdown_jobs() -> None:
+    """Stop the pool; jobs it cancels before they started are marked failed."""
+    _executor.shutdown(wait=False, cancel_futures=True)
+    with _queued_lock:
+        cancelled = [job_id for job_id, future in _queued.items() if future.cancelled()]
+    if not cancelled:
+        return
+    db = SessionLocal()
+    try:
+        db.query(ImportJob).filter(ImportJob.id.in_(cancelled), ImportJob.status == "queued").update(
+            {"status": "failed", "error": "cancelled by server shutdown", "finished_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def serialize_job(job: ImportJob) -> Dict[str, Any]:
+    end = job.finished_at or datetime.utcnow()
+    duration = (end - job.started_at).total_seconds() if job.started_at else None
+    progress = None
+    if job.status == "done":
+        progress = 1.0
+    elif job.total_rows:
+        progress = round(min((job.rows_processed or 0) / job.total_rows, 1.0), 3)
+
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "filename": job.filename,
+        "total_rows": job.total_rows,
+        "rows_processed": job.rows_processed or 0,
+        "rejects": job.rejects or 0,
+        "progress": progress,
+        "duration_seconds": round(duration, 3) if duration is not None else None,
+        "result": json.loads(job.result_json) if job.result_json else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+    }
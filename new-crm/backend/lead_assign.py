@@ -0,0 +1,89 @@
+"""Batch lead assignment: pure split planning plus set-based persistence."""
+import math
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from dashboard_stats import invalidate_stats
+from event_bus import announce, telecaller_topic
+from models import Lead, User
+from versions import bump_version
+
+# [(user_id, count), ...] in the order the admin listed the users
+Plan = List[Tuple[int, int]]
+
+
+def assign_mode(assignments: Sequence[Dict[str, Any]]) -> str:
+    # Same rule the UI has always relied on: all values <= 100 means percentages
+    return "percentage" if all(a["value"] <= 100 for a in assignments) else "count"
+
+
+def plan_allocation(total: int, assignments: Sequence[Dict[str, Any]]) -> Plan:
+    """Split `total` leads between users.
+
+    Percentages use the largest-remainder method: floor every quota, then hand
+    the seats lost to rounding to the largest fractional parts (ties go to the
+    earlier user). Counts are taken as given; if they leave leads over, each
+    user gets one more, in the order listed, while any remain (as the
+    assignment page always did), and the plan is truncated once leads run
+    out. Leads still left after that stay unassigned.
+    """
+    if assign_mode(assignments) == "percentage":
+        quotas = [a["value"] / 100 * total for a in assignments]
+        counts = [math.floor(q) for q in quotas]
+        target = min(total, math.floor(sum(quotas) + 1e-9))
+        by_remainder = sorted(range(len(quotas)), key=lambda i: (-(quotas[i] - counts[i]), i))
+        for i in by_remainder[: max(target - sum(counts), 0)]:
+            counts[i] += 1
+    else:
+        counts = [max(int(a["value"]), 0) for a in assignments]
+        leftover = total - sum(counts)
+        for i in range(min(max(leftover, 0), len(counts))):
+            counts[i] += 1
+
+    plan: Plan = []
+    left = total
+    for a, count in zip(assignments, counts):
+        take = min(count, left)
+        plan.append((a["user_id"], take))
+        left -= take
+    return plan
+
+
+def apply_allocation(db: Session, batch_id: str, lead_ids: Sequence[int], plan: Plan) -> int:
+    """Persist `plan` over the batch's unassigned `lead_ids` (sorted ascending).
+
+    Each user receives a contiguous slice of ids, so the write is one ranged
+    UPDATE per user instead of one per lead. `assigned_to IS NULL` keeps a
+    concurrent assignment from being overwritten.
+    """
+    # Only telecallers have an event stream; leads handed to managers are announced
+    # when the manager passes them on
+    telecallers = {
+        uid for (uid,) in db.query(User.id).filter(User.id.in_([u for u, _ in plan]), User.role == "telecaller")
+    }
+    assigned = 0
+    start = 0
+    for user_id, count in plan:
+        if count <= 0:
+            continue
+        lo, hi = lead_ids[start], lead_ids[start + count - 1]
+        result = db.execute(
+            update(Lead)
+            .where(
+                Lead.batch_id == batch_id,
+                Lead.assigned_to.is_(None),
+                Lead.id.between(lo, hi),
+            )
+            .values(assigned_to=user_id)
+            .execution_options(synchronize_session=False)
+        )
+        assigned += result.rowcount
+        start += count
+        if result.rowcount and user_id in telecallers:
+            announce(db, telecaller_topic(user_id), "lead_assigned", {"batch_id": batch_id, "count": result.rowcount})
+    bump_version(db, "assignments")
+    db.commit()
+    invalidate_stats()
+    return assigned
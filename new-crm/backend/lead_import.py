@@ -0,0 +1,270 @@
+"""Bulk lead import: streams rows out of an .xlsx and writes leads in chunks."""
+import re
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import openpyxl
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from dashboard_stats import invalidate_stats
+from models import Lead, LeadDetails, User
+from versions import bump_version
+
+# Rows per INSERT round trip / transaction
+CHUNK_SIZE = 2000
+
+# Called after each committed chunk with (rows_processed, rejects)
+ProgressFn = Callable[[int, int], None]
+
+# Duplicate phones echoed back in the dedup report
+DUPLICATE_SAMPLE = 50
+
+
+def clean_phone(value: Any) -> str:
+    """Display form: as typed, minus the '.0' Excel adds to numeric cells."""
+    phone_str = str(value).strip()
+    if phone_str.endswith(".0"):
+        phone_str = phone_str[:-2]
+    return phone_str
+
+
+def normalize_phone(value: Any) -> str:
+    """Dedup key: digits only, without the +91 country code or trunk '0'."""
+    digits = re.sub(r"\D", "", clean_phone(value))
+    if len(digits) == 12 and digits.startswith("91"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    return digits
+
+
+def sheet_row_estimate(source) -> Optional[int]:
+    """Data rows (excluding header) according to the sheet dimensions, if recorded."""
+    wb = openpyxl.load_workbook(source, read_only=True)
+    try:
+        max_row = wb.active.max_row
+    finally:
+        wb.close()
+    return max(max_row - 1, 0) if max_row else None
+
+
+def iter_sheet_rows(source) -> Iterator[tuple]:
+    """Yield raw value tuples from the first sheet, skipping the header.
+
+    `source` is a path or seekable file object; the workbook is opened in
+    read-only mode so rows are streamed instead of loaded all at once.
+    """
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def _parse_lead_row(row: tuple) -> Optional[Tuple[str, str, str]]:
+    if not row or len(row) < 2 or not row[0] or not row[1]:
+        return None
+    phone_norm = normalize_phone(row[1])
+    if not phone_norm:
+        return None
+    return str(row[0]).strip(), clean_phone(row[1]), phone_norm
+
+
+def existing_phones(db: Session, phone_norms: Iterable[str]) -> set:
+    """Subset of `phone_norms` already on a lead (one indexed IN lookup)."""
+    wanted = list(phone_norms)
+    if not wanted:
+        return set()
+    return {p for (p,) in db.query(Lead.phone_norm).filter(Lead.phone_norm.in_(wanted)).all()}
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _insert_chunk(db: Session, chunk: List[Tuple[str, str, str]], batch_id: str) -> List[int]:
+    now = datetime.utcnow()
+    ids = db.execute(
+        insert(Lead).returning(Lead.id, sort_by_parameter_order=True),
+        [
+            {
+                "name": name,
+                "phone": phone,
+                "phone_norm": phone_norm,
+                "status": "fresh",
+                "assigned_to": None,
+                "batch_id": batch_id,
+                "current_stage": "fresh",
+                "last_update": now,
+            }
+            for name, phone, phone_norm in chunk
+        ],
+    ).scalars().all()
+
+    details_ids = db.execute(
+        insert(LeadDetails).returning(LeadDetails.id, sort_by_parameter_order=True),
+        [
+            {
+                "lead_id": lead_id,
+                "looking_for": "",
+                "budget": "",
+                "location_preference": "",
+                "possession_time": "",
+                "work_location": "",
+                "spouse_work_location": "",
+                "current_residence": "",
+                "remarks": "",
+                "stage": "fresh",
+                "created_at": now,
+            }
+            for lead_id in ids
+        ],
+    ).scalars().all()
+
+    # Point the current-state projection at the new rows (see lead_state.py)
+    db.execute(
+        update(Lead),
+        [{"id": lead_id, "last_details_id": details_id} for lead_id, details_id in zip(ids, details_ids)],
+    )
+    return ids
+
+
+def import_leads(
+    db: Session,
+    rows: Iterable[tuple],
+    batch_id: str,
+    chunk_size: int = CHUNK_SIZE,
+    on_progress: Optional[ProgressFn] = None,
+) -> Dict[str, Any]:
+    """Insert leads plus their initial 'fresh' LeadDetails, one transaction per chunk.
+
+    The LeadBatch row `batch_id` must already exist.
+
+    Each chunk is three statements: multi-row INSERT ... RETURNING for `leads`
+    and `lead_details` (ids come back in parameter order), then a bulk UPDATE
+    by primary key linking each lead to its current details row. Rows
+    without a name or usable phone are counted as rejects. Phones already
+    seen earlier in the file (hash set) or already on a lead (one
+    `phone_norm IN (...)` lookup per chunk) are skipped and reported under
+    "dedup". Returns the new lead ids and throughput stats.
+    """
+    started = time.perf_counter()
+    lead_ids: List[int] = []
+    rejects = 0
+    seen: set = set()
+    dup_in_file = 0
+    dup_existing = 0
+    dup_sample: List[str] = []
+
+    def note_duplicate(phone: str) -> None:
+        if len(dup_sample) < DUPLICATE_SAMPLE:
+            dup_sample.append(phone)
+
+    for raw_chunk in _chunks(rows, chunk_size):
+        candidates = []
+        for raw in raw_chunk:
+            parsed = _parse_lead_row(raw)
+            if parsed is None:
+                rejects += 1
+            elif parsed[2] in seen:
+                dup_in_file += 1
+                note_duplicate(parsed[1])
+            else:
+                seen.add(parsed[2])
+                candidates.append(parsed)
+
+        # A concurrent import can claim a number between lookup and insert;
+        # the unique index catches that, so re-check once and retry.
+        for attempt in range(2):
+            taken = existing_phones(db, (c[2] for c in candidates))
+            chunk = [c for c in candidates if c[2] not in taken]
+            try:
+                ids = _insert_chunk(db, chunk, batch_id) if chunk else []
+                db.commit()
+                break
+            except IntegrityError:
+                db.rollback()
+                if attempt:
+                    raise
+
+        for c in candidates:
+            if c[2] in taken:
+                note_duplicate(c[1])
+        dup_existing += len(taken)
+        lead_ids.extend(ids)
+
+        if on_progress:
+            on_progress(len(lead_ids) + rejects + dup_in_file + dup_existing, rejects)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "lead_ids": lead_ids,
+        "rows": len(lead_ids),
+        "rejects": rejects,
+        "dedup": {
+            "duplicates_in_file": dup_in_file,
+            "duplicates_existing": dup_existing,
+            "sample": dup_sample,
+        },
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(len(lead_ids) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def auto_assign_to_managers(db: Session, lead_ids: List[int]) -> Optional[str]:
+    """Round-robin the given leads over all managers.
+
+    Returns None when assigned, otherwise the reason assignment was skipped.
+    """
+    managers = db.query(User).filter(User.role == "manager").all()
+    if not managers:
+        return "no managers available"
+    if len(lead_ids) < len(managers):
+        return "fewer leads than managers"
+
+    # Bulk UPDATE by primary key (executemany)
+    db.execute(
+        update(Lead),
+        [{"id": lead_id, "assigned_to": managers[i % len(managers)].id} for i, lead_id in enumerate(lead_ids)],
+    )
+    bump_version(db, "assignments")
+    db.commit()
+    return None
+
+
+def lead_import_job(
+    db: Session,
+    path,
+    job_id: int,
+    on_progress: ProgressFn,
+    batch_id: str,
+    auto_assign: bool = False,
+) -> Dict[str, Any]:
+    """Background-job handler for /admin/upload-leads (see jobs.submit_job)."""
+    result = import_leads(db, iter_sheet_rows(path), batch_id, on_progress=on_progress)
+    lead_ids = result.pop("lead_ids")
+    message = f"{len(lead_ids)} leads uploaded"
+    duplicates = result["dedup"]["duplicates_in_file"] + result["dedup"]["duplicates_existing"]
+    if duplicates:
+        message += f" ({duplicates} duplicate phone numbers skipped)"
+
+    if auto_assign:
+        skipped = auto_assign_to_managers(db, lead_ids)
+        if skipped:
+            message += f". Auto-assignment skipped: {skipped}."
+        else:
+            message += " and auto-assigned to managers"
+
+    invalidate_stats()
+    result.update({"message": message, "batch_id": batch_id})
+    return result
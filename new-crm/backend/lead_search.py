@@ -0,0 +1,210 @@
+"""Substring search over lead name/phone.
+
+Postgres with pg_trgm: ILIKE '%q%' is served by the GIN trigram indexes
+created in migrate.py, and results are ranked by similarity().
+Anything else (SQLite dev databases, Postgres without the extension): a
+process-local trigram index maps each 3-gram to the lead ids containing it;
+candidates are the intersection for the query's grams, verified by a real
+substring check. Leads are never renamed, so the index only has to pick up
+new ids, which it does on every search.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from models import Lead
+
+GRAM = 3
+DEFAULT_BUDGET_MS = 250
+
+
+def _grams(s: str) -> Set[str]:
+    return {s[i:i + GRAM] for i in range(len(s) - GRAM + 1)}
+
+
+def _doc(name: Optional[str], phone: Optional[str]) -> str:
+    return f"{(name or '').lower()}\x00{phone or ''}"
+
+
+class NgramIndex:
+    def __init__(self) -> None:
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+        self._docs: Dict[int, str] = {}
+        self._max_id = 0
+        self._lock = threading.Lock()
+
+    def sync(self, db: Session) -> None:
+        """Index leads created since the last sync (one PK range scan)."""
+        with self._lock:
+            rows = (
+                db.query(Lead.id, Lead.name, Lead.phone)
+                .filter(Lead.id > self._max_id)
+                .order_by(Lead.id)
+                .all()
+            )
+            for lead_id, name, phone in rows:
+                doc = _doc(name, phone)
+                self._docs[lead_id] = doc
+                for g in _grams(doc):
+                    self._grams[g].add(lead_id)
+                self._max_id = lead_id
+
+    def matches(self, q: str) -> Optional[Set[int]]:
+        """Ids whose name/phone contain `q`; None if q is shorter than a gram."""
+        q = q.lower()
+        grams = _grams(q)
+        if not grams:
+            return None
+        with self._lock:
+            postings = sorted((self._grams.get(g, set()) for g in grams), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            return {i for i in candidates if q in self._docs[i]}
+
+    def score(self, lead_id: int, q: str) -> float:
+        """Trigram Jaccard similarity, with exact/prefix matches on top."""
+        q = q.lower()
+        doc = self._docs.get(lead_id, "")
+        name, _, phone = doc.partition("\x00")
+        if q in (name, phone):
+            return 2.0
+        if name.startswith(q) or phone.startswith(q):
+            return 1.0 + len(q) / max(len(name), len(phone), 1)
+        qg, dg = _grams(q), _grams(doc)
+        return len(qg & dg) / len(qg | dg) if qg else 0.0
+
+
+ngram_index = NgramIndex()
+
+_trgm: Dict[str, bool] = {}
+
+
+def use_trigram(db: Session) -> bool:
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    key = str(bind.url)
+    if key not in _trgm:
+        _trgm[key] = bool(db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first())
+    return _trgm[key]
+
+
+# Larger n-gram candidate sets fall back to a plain scan instead of an IN
+# list (SQLite caps bound variables per statement)
+MAX_IN_IDS = 500
+
+
+def _assigned_ids(db: Session, assigned_to: int) -> Set[int]:
+    return {i for (i,) in db.query(Lead.id).filter(Lead.assigned_to == assigned_to)}
+
+
+def lead_text_filter(db: Session, q: str, assigned_to: Optional[int] = None):
+    """WHERE clause for 'name or phone contains q', index-backed on both paths.
+
+    Pass `assigned_to` when the caller's query is scoped to one telecaller so
+    the n-gram candidates are narrowed to that telecaller's leads.
+    """
+    like = f"%{q}%"
+    scan = Lead.name.ilike(like) | Lead.phone.ilike(like)
+    if use_trigram(db):
+        return scan
+    ngram_index.sync(db)
+    ids = ngram_index.matches(q)
+    if ids is None:  # too short for trigrams: plain scan
+        return scan
+    if assigned_to is not None:
+        ids &= _assigned_ids(db, assigned_to)
+    if len(ids) > MAX_IN_IDS:
+        return scan
+    return Lead.id.in_(ids)
+
+
+def _is_timeout(exc: DBAPIError) -> bool:
+    # SQLSTATE 57014 is query_canceled, raised when statement_timeout fires
+    return getattr(exc.orig, "pgcode", None) == "57014"
+
+
+def search_leads(
+    db: Session,
+    q: str,
+    limit: int = 20,
+    assigned_to: Optional[int] = None,
+    budget_ms: int = DEFAULT_BUDGET_MS,
+) -> Dict[str, Any]:
+    """Ranked org-wide search; stops at `budget_ms` and reports timed_out."""
+    started = time.perf_counter()
+    q = q.strip()
+    # Plain columns: rows stay usable after the rollback below
+    columns = (Lead.id, Lead.name, Lead.phone, Lead.assigned_to, Lead.current_stage)
+    base = db.query(*columns)
+    if assigned_to is not None:
+        base = base.filter(Lead.assigned_to == assigned_to)
+
+    timed_out = False
+    ranked: List[Tuple[Any, float]] = []
+
+    if use_trigram(db):
+        score = func.greatest(func.similarity(Lead.name, q), func.similarity(Lead.phone, q))
+        try:
+            # Server-side budget; SET LOCAL only lasts for this transaction
+            db.execute(text(f"SET LOCAL statement_timeout = {int(budget_ms)}"))
+            rows = (
+                base.add_columns(score)
+                .filter(lead_text_filter(db, q))
+                .order_by(score.desc(), Lead.id)
+                .limit(limit)
+                .all()
+            )
+        except DBAPIError as exc:
+            db.rollback()
+            if not _is_timeout(exc):
+                raise
+            timed_out = True
+        else:
+            db.rollback()  # ends the transaction that carries the timeout
+            ranked = [(row, row[-1]) for row in rows]
+    else:
+        ids = None
+        if len(q) >= GRAM:
+            ngram_index.sync(db)
+            ids = ngram_index.matches(q)
+        if ids is None:
+            rows = base.filter(lead_text_filter(db, q)).limit(limit).all()
+            ranked = [(row, 0.0) for row in rows]
+        else:
+            if assigned_to is not None:
+                ids &= _assigned_ids(db, assigned_to)
+            # Budget covers ranking; the first sync after startup builds the
+            # whole index and is not something a shorter query would avoid
+            scored = []
+            deadline = time.perf_counter() + budget_ms / 1000
+            for i, lead_id in enumerate(ids):
+                if i and i % 1024 == 0 and time.perf_counter() > deadline:
+                    timed_out = True
+                    break
+                scored.append((ngram_index.score(lead_id, q), lead_id))
+            scored.sort(key=lambda t: (-t[0], t[1]))
+            top = scored[:limit]
+            by_id = {row.id: row for row in base.filter(Lead.id.in_([i for _, i in top])).all()}
+            ranked = [(by_id[i], s) for s, i in top if i in by_id]
+
+    return {
+        "q": q,
+        "results": [
+            {
+                "id": row.id,
+                "name": row.name,
+                "phone": row.phone,
+                "assigned_to": row.assigned_to,
+                "current_stage": row.current_stage,
+                "score": round(float(s or 0), 3),
+            }
+            for row, s in ranked
+        ],
+        "took_ms": round((time.perf_counter() - started) * 1000, 1),
+        "timed_out": timed_out,
+    }
@@ -0,0 +1,68 @@
+"""Current-state projection of LeadDetails history onto `leads`.
+
+Every LeadDetails write goes through record_lead_details(), which points
+Lead.last_details_id / current_stage / last_update at the new row in the
+same transaction. Rebuild from history with:  python lead_state.py
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import Lead, LeadDetails
+from project_match import apply_lead_features
+
+
+def record_lead_details(db: Session, details: LeadDetails) -> LeadDetails:
+    """Add a history row and make it the lead's current state (caller commits)."""
+    if details.created_at is None:
+        details.created_at = datetime.utcnow()
+    apply_lead_features(details)
+    db.add(details)
+    db.flush()  # assigns details.id
+    db.query(Lead).filter(Lead.id == details.lead_id).update(
+        {
+            "last_details_id": details.id,
+            "current_stage": details.stage,
+            "last_update": details.created_at,
+        },
+        synchronize_session="fetch",
+    )
+    return details
+
+
+# Latest row per lead by created_at, then id; both statements run per lead
+# against ix_lead_details_lead_created / the primary key
+REBUILD_SQL = [
+    """
+    UPDATE leads SET last_details_id = (
+        SELECT ld.id FROM lead_details ld
+        WHERE ld.lead_id = leads.id
+        ORDER BY ld.created_at DESC, ld.id DESC
+        LIMIT 1
+    )
+    """,
+    """
+    UPDATE leads SET
+        current_stage = (SELECT ld.stage FROM lead_details ld WHERE ld.id = leads.last_details_id),
+        last_update = (SELECT ld.created_at FROM lead_details ld WHERE ld.id = leads.last_details_id)
+    """,
+]
+
+
+def rebuild_lead_state(db: Session) -> None:
+    """Recompute the projection for every lead from lead_details."""
+    for sql in REBUILD_SQL:
+        db.execute(text(sql))
+    db.commit()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        rebuild_lead_state(session)
+        print("lead current state rebuilt")
+    finally:
+        session.close()
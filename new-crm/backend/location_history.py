@@ -0,0 +1,243 @@
+"""Partitioning, downsampling and retention for live-location history.
+
+On Postgres `live_location` is partitioned by range on `timestamp`, one
+partition per IST day (live_location_pYYYYMMDD) plus a DEFAULT partition for
+pings outside every range, so a day's trail reads a single partition.
+Maintenance, run hourly by each worker (only one wins the advisory lock) or
+by hand with `python location_history.py`:
+
+- creates partitions PARTITIONS_AHEAD days ahead, moving any rows the
+  DEFAULT partition caught for that day into the new partition;
+- before raw pings pass LOCATION_RAW_DAYS, keeps one point per telecaller
+  per minute in live_location_minute, then drops the expired partitions;
+- deletes minute points older than LOCATION_HISTORY_DAYS.
+
+Elsewhere (SQLite in development) the same retention runs as DELETEs.
+"""
+import os
+import re
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import LiveLocation, LiveLocationMinute
+
+LOCATION_RAW_DAYS = int(os.getenv("CRM_LOCATION_RAW_DAYS", "14"))
+LOCATION_HISTORY_DAYS = int(os.getenv("CRM_LOCATION_HISTORY_DAYS", "365"))
+MAINTENANCE_INTERVAL = int(os.getenv("CRM_LOCATION_MAINTENANCE_MINUTES", "60")) * 60
+PARTITIONS_AHEAD = 3
+
+# Partition days follow the business day, not the UTC one
+IST = timezone(timedelta(hours=5, minutes=30))
+_PARTITION = re.compile(r"^live_location_p(\d{8})$")
+_LOCK_KEY = 0x6C6F6361  # pg advisory lock shared by every worker's maintenance run
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """Naive-UTC [start, end) of an IST calendar day."""
+    start = datetime.combine(day, time.min, tzinfo=IST).astimezone(timezone.utc).replace(tzinfo=None)
+    return start, start + timedelta(days=1)
+
+
+def ist_today() -> date:
+    return datetime.now(IST).date()
+
+
+def partition_name(day: date) -> str:
+    return f"live_location_p{day:%Y%m%d}"
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.bind.dialect.name != "postgresql":
+        return False
+    return bool(db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('live_location')"
+    )).first())
+
+
+def partition_days(db: Session) -> List[date]:
+    rows = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'live_location'::regclass"
+    )).all()
+    days = []
+    for (name,) in rows:
+        m = _PARTITION.match(name)
+        if m:
+            days.append(datetime.strptime(m.group(1), "%Y%m%d").date())
+    return sorted(days)
+
+
+def ensure_partitions(db: Session, first: date, last: date) -> List[str]:
+    """Create the day partitions first..last that are missing (caller commits)."""
+    existing = set(partition_days(db))
+    created = []
+    day = first
+    while day <= last:
+        if day not in existing:
+            name = partition_name(day)
+            lo, hi = day_bounds(day)
+            bounds = {"lo": lo, "hi": hi}
+            # Build detached, take over what DEFAULT caught for the range, then attach:
+            # attaching over rows still in DEFAULT would fail
+            db.execute(text(f"CREATE TABLE {name} (LIKE live_location INCLUDING DEFAULTS)"))
+            db.execute(text(
+                f'WITH moved AS (DELETE FROM live_location_default WHERE "timestamp" >= :lo AND "timestamp" < :hi '
+                f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            ), bounds)
+            db.execute(text(
+                f"ALTER TABLE live_location ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+            ))
+            created.append(name)
+        day += timedelta(days=1)
+    return created
+
+
+def downsample(db: Session, before: datetime, since: Optional[datetime] = None, source: str = "live_location") -> int:
+    """Copy the best ping per telecaller per minute in [since, before) to live_location_minute.
+
+    "Best" is the most accurate, then the latest. Minutes already stored are
+    left alone, so re-running over a range is harmless. Caller commits.
+    `source` lets the migration read the pre-partitioning table (Postgres).
+    """
+    if db.bind.dialect.name == "postgresql":
+        where = '"timestamp" < :before' + (' AND "timestamp" >= :since' if since else "")
+        result = db.execute(text(f"""
+            INSERT INTO live_location_minute (telecaller_id, minute, lat, lng, accuracy)
+            SELECT DISTINCT ON (telecaller_id, date_trunc('minute', "timestamp"))
+                   telecaller_id, date_trunc('minute', "timestamp"), lat, lng, accuracy
+            FROM {source}
+            WHERE {where}
+            ORDER BY telecaller_id, date_trunc('minute', "timestamp"), accuracy ASC NULLS LAST, "timestamp" DESC
+            ON CONFLICT (telecaller_id, minute) DO NOTHING
+        """), {"before": before, "since": since})
+        return result.rowcount
+
+    q = db.query(LiveLocation.telecaller_id, LiveLocation.timestamp, LiveLocation.lat,
+                 LiveLocation.lng, LiveLocation.accuracy).filter(LiveLocation.timestamp < before)
+    if since:
+        q = q.filter(LiveLocation.timestamp >= since)
+    best: Dict[Tuple[int, datetime], Tuple] = {}
+    for tid, ts, lat, lng, acc in q.yield_per(5000):
+        key = (tid, ts.replace(second=0, microsecond=0))
+        rank = (acc if acc is not None else float("inf"), -ts.timestamp())
+        if key not in best or rank < best[key][0]:
+            best[key] = (rank, lat, lng, acc)
+    if not best:
+        return 0
+    stored = db.query(LiveLocationMinute.telecaller_id, LiveLocationMinute.minute).filter(
+        LiveLocationMinute.minute < before,
+        *([LiveLocationMinute.minute >= since.replace(second=0, microsecond=0)] if since else []),
+    )
+    for key in map(tuple, stored):
+        best.pop(key, None)
+    db.bulk_insert_mappings(LiveLocationMinute, [
+        {"telecaller_id": tid, "minute": minute, "lat": lat, "lng": lng, "accuracy": acc}
+        for (tid, minute), (_, lat, lng, acc) in best.items()
+    ])
+    return len(best)
+
+
+def expire_raw(db: Session, today: date) -> Dict[str, Any]:
+    """Downsample and remove raw pings from before the retention window (caller commits)."""
+    keep_from = today - timedelta(days=LOCATION_RAW_DAYS)
+    cutoff = day_bounds(keep_from)[0]
+    kept = downsample(db, cutoff)
+    dropped = []
+    if is_partitioned(db):
+        for day in partition_days(db):
+            if day < keep_from:
+                db.execute(text(f"DROP TABLE {partition_name(day)}"))
+                dropped.append(partition_name(day))
+    # Whatever is left below the cutoff: DEFAULT-partition strays, or the whole table elsewhere
+    deleted = db.query(LiveLocation).filter(LiveLocation.timestamp < cutoff).delete(synchronize_session=False)
+    return {"minute_points": kept, "dropped_partitions": dropped, "deleted_rows": deleted}
+
+
+def expire_history(db: Session, today: date) -> int:
+    cutoff = day_bounds(today - timedelta(days=LOCATION_HISTORY_DAYS))[0]
+    return db.query(LiveLocationMinute).filter(LiveLocationMinute.minute < cutoff).delete(synchronize_session=False)
+
+
+def run_maintenance(db: Session, today: Optional[date] = None) -> Dict[str, Any]:
+    today = today or ist_today()
+    if db.bind.dialect.name == "postgresql":
+        if not db.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _LOCK_KEY}).scalar():
+            return {"skipped": "another worker is running maintenance"}
+    result: Dict[str, Any] = {"created_partitions": []}
+    if is_partitioned(db):
+        result["created_partitions"] = ensure_partitions(db, today - timedelta(days=1), today + timedelta(days=PARTITIONS_AHEAD))
+    result.update(expire_raw(db, today))
+    result["expired_minute_points"] = expire_history(db, today)
+    db.commit()
+    return result
+
+
+def trail_points(db: Session, telecaller_id: int, day: date) -> Tuple[str, List[Tuple[datetime, float, float, Optional[float]]]]:
+    """(resolution, [(timestamp, lat, lng, accuracy)]) for one IST day, oldest first.
+
+    Raw pings while they are kept; the per-minute points once they expired.
+    """
+    lo, hi = day_bounds(day)
+    raw = (
+        db.query(LiveLocation.timestamp, LiveLocation.lat, LiveLocation.lng, LiveLocation.accuracy)
+        .filter(LiveLocation.telecaller_id == telecaller_id, LiveLocation.timestamp >= lo, LiveLocation.timestamp < hi)
+        .order_by(LiveLocation.timestamp)
+        .all()
+    )
+    if raw or day >= ist_today() - timedelta(days=LOCATION_RAW_DAYS):
+        return "raw", [tuple(r) for r in raw]
+    minute = (
+        db.query(LiveLocationMinute.minute, LiveLocationMinute.lat, LiveLocationMinute.lng, LiveLocationMinute.accuracy)
+        .filter(LiveLocationMinute.telecaller_id == telecaller_id,
+                LiveLocationMinute.minute >= lo, LiveLocationMinute.minute < hi)
+        .order_by(LiveLocationMinute.minute)
+        .all()
+    )
+    return "minute", [tuple(r) for r in minute]
+
+
+# --- Periodic runner ---
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+last_run: Dict[str, Any] = {}
+
+
+def _loop() -> None:
+    while True:
+        db = SessionLocal()
+        try:
+            last_run.update(at=datetime.utcnow().isoformat(), result=run_maintenance(db), error=None)
+        except Exception as exc:
+            db.rollback()
+            last_run.update(at=datetime.utcnow().isoformat(), error=str(exc))
+        finally:
+            db.close()
+        if _stop.wait(MAINTENANCE_INTERVAL):
+            return
+
+
+def start_maintenance() -> None:
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="location-maintenance", daemon=True)
+    _thread.start()
+
+
+def stop_maintenance() -> None:
+    _stop.set()
+
+
+if __name__ == "__main__":
+    session = SessionLocal()
+    try:
+        print(run_maintenance(session))
+    finally:
+        session.close()
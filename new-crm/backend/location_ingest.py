@@ -0,0 +1,142 @@
+"""Buffered ingestion of live-location pings.
+
+Requests only enqueue; one writer thread per process drains the queue into
+multi-row INSERTs, flushing every LOCATION_FLUSH_MS or LOCATION_FLUSH_ROWS
+pings, whichever comes first. The queue is bounded: when the database falls
+behind, offer() refuses new pings (the route answers 503 + Retry-After)
+instead of letting memory grow. stop() drains and flushes what is queued.
+"""
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from database import SessionLocal
+from models import LiveLocation
+
+LOCATION_FLUSH_MS = int(os.getenv("CRM_LOCATION_FLUSH_MS", "500"))
+LOCATION_FLUSH_ROWS = int(os.getenv("CRM_LOCATION_FLUSH_ROWS", "500"))
+LOCATION_QUEUE_MAX = int(os.getenv("CRM_LOCATION_QUEUE_MAX", "20000"))
+# How long a request may wait for room before being told to retry
+OFFER_TIMEOUT = 0.05
+# Attempts per batch before it is dropped (counted in failed_rows)
+FLUSH_ATTEMPTS = 3
+
+
+class LocationBuffer:
+    def __init__(self, max_size: int = LOCATION_QUEUE_MAX, flush_ms: int = LOCATION_FLUSH_MS,
+                 flush_rows: int = LOCATION_FLUSH_ROWS) -> None:
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_size)
+        self.flush_interval = flush_ms / 1000
+        self.flush_rows = flush_rows
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            "accepted": 0, "rejected": 0, "flushed_rows": 0, "failed_rows": 0,
+            "flushes": 0, "last_flush_ms": None, "max_flush_ms": 0.0, "total_flush_ms": 0.0,
+            "last_flush_at": None, "last_error": None,
+        }
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="location-ingest", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush everything queued, then stop the writer."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def offer(self, row: Dict[str, Any]) -> bool:
+        """Queue one ping; False when the buffer is full (caller should ask the client to retry)."""
+        if not self._thread:
+            self.start()
+        try:
+            self._queue.put(row, timeout=OFFER_TIMEOUT)
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            return False
+        with self._lock:
+            self._stats["accepted"] += 1
+        return True
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        """Block for the first ping, then gather until the batch is full or the interval is up."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 and not self._stop.is_set():
+                break
+            try:
+                # Shutting down: drain without waiting
+                batch.append(self._queue.get(timeout=max(remaining, 0)) if not self._stop.is_set()
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        error = None
+        for attempt in range(FLUSH_ATTEMPTS):
+            db = SessionLocal()
+            try:
+                db.execute(insert(LiveLocation), batch)
+                db.commit()
+                error = None
+                break
+            except Exception as exc:
+                db.rollback()
+                error = str(exc)
+                time.sleep(0.2 * (attempt + 1))
+            finally:
+                db.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            s = self._stats
+            s["flushes"] += 1
+            s["last_flush_ms"] = round(elapsed, 2)
+            s["max_flush_ms"] = max(s["max_flush_ms"], round(elapsed, 2))
+            s["total_flush_ms"] += elapsed
+            s["last_flush_at"] = datetime.utcnow().isoformat()
+            if error is None:
+                s["flushed_rows"] += len(batch)
+            else:
+                s["failed_rows"] += len(batch)
+                s["last_error"] = error
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+        total = s.pop("total_flush_ms")
+        s["avg_flush_ms"] = round(total / s["flushes"], 2) if s["flushes"] else None
+        s["queue_depth"] = self._queue.qsize()
+        s["queue_max"] = self._queue.maxsize
+        s["flush_interval_ms"] = int(self.flush_interval * 1000)
+        s["flush_rows"] = self.flush_rows
+        s["running"] = bool(self._thread and self._thread.is_alive())
+        return s
+
+
+location_buffer = LocationBuffer()
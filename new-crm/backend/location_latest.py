@@ -0,0 +1,146 @@
+"""Last known position of every telecaller, kept in memory.
+
+Each ping is applied as it is accepted, so this worker's own pings show up
+immediately. Pings taken by other workers reach the table through their
+ingest buffers; sync() picks those up before the index is served, keyed on
+the id sequence: rows past the highest id seen, plus the id ranges skipped
+below it. A skipped range is usually another worker's batch that took its
+ids earlier but committed later, so it is re-checked on each sync until it
+shows up or SYNC_GAP_SECONDS pass (ids lost to a rollback never fill). A
+sync that would read more than SYNC_MAX_ROWS rebuilds instead. rebuild()
+also seeds the index at startup from the raw pings still retained.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from location_history import LOCATION_RAW_DAYS
+from models import LiveLocation
+
+# A position older than this is flagged stale
+STALE_AFTER = timedelta(minutes=int(os.getenv("CRM_LOCATION_STALE_MINUTES", "10")))
+# How long skipped ids are re-checked: covers an ingest batch that commits late
+# (flush interval plus retries)
+SYNC_GAP_SECONDS = float(os.getenv("CRM_LOCATION_SYNC_GAP_SECONDS", "30"))
+SYNC_MAX_GAPS = 256
+SYNC_MAX_ROWS = int(os.getenv("CRM_LOCATION_SYNC_MAX_ROWS", "20000"))
+
+# (first id, last id, time.monotonic() when first skipped)
+Gap = Tuple[int, int, float]
+
+
+def _missing(lo: int, hi: int, ids: Sequence[int]) -> Iterator[Tuple[int, int]]:
+    """Sub-ranges of [lo, hi] holding none of the sorted `ids`."""
+    for i in ids:
+        if i < lo:
+            continue
+        if i > hi:
+            break
+        if i > lo:
+            yield lo, i - 1
+        lo = i + 1
+    if lo <= hi:
+        yield lo, hi
+
+
+class Position(NamedTuple):
+    timestamp: datetime  # naive UTC
+    lat: float
+    lng: float
+    accuracy: Optional[float]
+
+
+class LatestPositions:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._positions: Dict[int, Position] = {}
+        self._last_id = 0
+        self._gaps: List[Gap] = []
+        self._built = False
+
+    def update(self, telecaller_id: int, pos: Position) -> None:
+        """Keep `pos` unless a newer fix is already known (pings can arrive out of order)."""
+        with self._lock:
+            cur = self._positions.get(telecaller_id)
+            if cur is None or pos.timestamp >= cur.timestamp:
+                self._positions[telecaller_id] = pos
+
+    def apply(self, row: Dict[str, Any]) -> None:
+        self.update(row["telecaller_id"], Position(row["timestamp"], row["lat"], row["lng"], row["accuracy"]))
+
+    def rebuild(self, db: Session) -> int:
+        """Reload from the table: the newest retained ping per telecaller. Returns the count."""
+        since = datetime.utcnow() - timedelta(days=LOCATION_RAW_DAYS + 1)
+        newest = (
+            db.query(LiveLocation.telecaller_id, func.max(LiveLocation.timestamp).label("ts"))
+            .filter(LiveLocation.timestamp >= since)
+            .group_by(LiveLocation.telecaller_id)
+            .subquery()
+        )
+        rows = (
+            db.query(LiveLocation.telecaller_id, LiveLocation.timestamp, LiveLocation.lat,
+                     LiveLocation.lng, LiveLocation.accuracy)
+            .join(newest, (newest.c.telecaller_id == LiveLocation.telecaller_id) & (newest.c.ts == LiveLocation.timestamp))
+            .all()
+        )
+        top = db.query(func.max(LiveLocation.id)).scalar() or 0
+        positions = {tid: Position(ts, lat, lng, acc) for tid, ts, lat, lng, acc in rows}
+        with self._lock:
+            self._positions = positions
+            self._last_id = top
+            self._gaps = []
+            self._built = True
+        return len(positions)
+
+    def sync(self, db: Session) -> int:
+        """Apply pings other workers wrote since the last sync; returns rows read (or positions, if it rebuilt)."""
+        if not self._built:
+            return self.rebuild(db)
+        now = time.monotonic()
+        last_id = self._last_id
+        gaps = [g for g in self._gaps if now - g[2] < SYNC_GAP_SECONDS]
+        wanted = LiveLocation.id > last_id
+        for lo, hi, _ in gaps:
+            wanted = wanted | LiveLocation.id.between(lo, hi)
+        rows = (
+            db.query(LiveLocation.id, LiveLocation.telecaller_id, LiveLocation.timestamp,
+                     LiveLocation.lat, LiveLocation.lng, LiveLocation.accuracy)
+            .filter(wanted)
+            .order_by(LiveLocation.id)
+            .limit(SYNC_MAX_ROWS + 1)
+            .all()
+        )
+        if len(rows) > SYNC_MAX_ROWS:
+            return self.rebuild(db)
+        for row_id, tid, ts, lat, lng, acc in rows:
+            self.update(tid, Position(ts, lat, lng, acc))
+
+        ids = [r[0] for r in rows]
+        top = max(last_id, ids[-1]) if ids else last_id
+        still = [(lo, hi, t) for glo, ghi, t in gaps for lo, hi in _missing(glo, ghi, ids)]
+        still += [(lo, hi, now) for lo, hi in _missing(last_id + 1, top, ids)]
+        with self._lock:
+            self._last_id = top
+            self._gaps = still[-SYNC_MAX_GAPS:]
+        return len(rows)
+
+    def snapshot(self) -> Dict[int, Position]:
+        with self._lock:
+            return dict(self._positions)
+
+
+latest_positions = LatestPositions()
+
+
+def rebuild_latest() -> None:
+    db = SessionLocal()
+    try:
+        latest_positions.rebuild(db)
+    finally:
+        db.close()
@@ -1,9 +1,34 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from route import router
+from jobs import fail_interrupted_jobs, shutdown_jobs
+from location_ingest import location_buffer
+from location_history import start_maintenance, stop_maintenance
+from location_latest import rebuild_latest
+from callback_scheduler import callback_scheduler
+from event_bus import event_relay
+from uploads import UploadLimitMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    fail_interrupted_jobs()
+    location_buffer.start()
+    rebuild_latest()
+    start_maintenance()
+    callback_scheduler.start()
+    event_relay.start()
+    yield
+    event_relay.stop()
+    callback_scheduler.stop()
+    stop_maintenance()
+    location_buffer.stop()
+    shutdown_jobs()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(router)
 
@@ -13,6 +38,8 @@ app.mount("/", StaticFiles(directory="static", html=True), name="static")
 # Optional: if you want frontend JS to call /api/*
 # (Not strictly needed since they share domain now)
 app.add_middleware(SessionMiddleware, secret_key="your_secret_key")
+# Oversized uploads are refused from Content-Length, before the body is spooled
+app.add_middleware(UploadLimitMiddleware)
 
 # Include your API routes at /api/*
 #app.include_router(router, prefix="/api")
@@ -0,0 +1,285 @@
+"""Bring an existing database up to the current models without dropping data.
+
+init_db.py recreates everything from scratch; run this instead on a database
+that already holds leads:  python migrate.py
+Every step is idempotent, so it is safe to run after each deploy.
+"""
+from datetime import timedelta
+from pathlib import Path
+
+from sqlalchemy import DateTime, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from database import Base, engine
+import models  # noqa: F401  (registers all tables on Base.metadata)
+from lead_import import normalize_phone
+from lead_state import REBUILD_SQL
+from location_history import LOCATION_RAW_DAYS, PARTITIONS_AHEAD, day_bounds, downsample, ensure_partitions, ist_today
+from project_match import backfill_features
+from site_visits import parse_visit_date
+from uploads import file_sha256, import_json_indexes, mark_imported
+from versions import bump_version
+
+
+def _columns(conn, table: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table: str, column: str, ddl_type: str) -> None:
+    if column not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _create_index(conn, name: str, table: str, columns: str) -> None:
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def create_missing_tables(conn) -> None:
+    Base.metadata.create_all(bind=conn)
+
+
+def lead_batches(conn) -> None:
+    """Move upload batch ids out of LeadDetails.remarks into lead_batch / leads.batch_id."""
+    _add_column(conn, "leads", "batch_id", "VARCHAR REFERENCES lead_batch(id)")
+    _create_index(conn, "ix_leads_batch_assigned", "leads", "batch_id, assigned_to")
+
+    # Uploads wrote str(uuid4())[:8] into the remarks of each lead's initial 'fresh' row
+    conn.execute(text("""
+        INSERT INTO lead_batch (id, filename, created_at)
+        SELECT ld.remarks, '', MIN(ld.created_at)
+        FROM lead_details ld
+        WHERE ld.stage = 'fresh' AND length(ld.remarks) = 8
+          AND ld.remarks NOT IN (SELECT id FROM lead_batch)
+        GROUP BY ld.remarks
+    """))
+    conn.execute(text("""
+        UPDATE leads SET batch_id = ld.remarks
+        FROM lead_details ld
+        JOIN lead_batch b ON b.id = ld.remarks
+        WHERE ld.lead_id = leads.id AND ld.stage = 'fresh' AND leads.batch_id IS NULL
+    """))
+
+
+def lead_phone_norm(conn) -> None:
+    """Backfill leads.phone_norm and add its unique index.
+
+    The oldest lead keeps each number; later legacy duplicates stay NULL so
+    the unique index can be built (they are reported, not deleted).
+    """
+    _add_column(conn, "leads", "phone_norm", "VARCHAR")
+
+    taken = {p for (p,) in conn.execute(text("SELECT phone_norm FROM leads WHERE phone_norm IS NOT NULL"))}
+    updates, duplicates = [], 0
+    for lead_id, phone in conn.execute(text("SELECT id, phone FROM leads WHERE phone_norm IS NULL ORDER BY id")).all():
+        norm = normalize_phone(phone) if phone else ""
+        if not norm:
+            continue
+        if norm in taken:
+            duplicates += 1
+            continue
+        taken.add(norm)
+        updates.append({"id": lead_id, "norm": norm})
+
+    if updates:
+        conn.execute(text("UPDATE leads SET phone_norm = :norm WHERE id = :id"), updates)
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_leads_phone_norm ON leads (phone_norm)"))
+    print(f"   phone_norm set on {len(updates)} leads, {duplicates} legacy duplicates left NULL")
+
+
+def lead_current_state(conn) -> None:
+    """Denormalized current stage on leads, rebuilt from lead_details history."""
+    _add_column(conn, "leads", "last_details_id", "INTEGER")
+    _add_column(conn, "leads", "current_stage", "VARCHAR")
+    _add_column(conn, "leads", "last_update", "TIMESTAMP")
+    _create_index(conn, "ix_lead_details_lead_created", "lead_details", "lead_id, created_at")
+    _create_index(conn, "ix_leads_assigned_last_update", "leads", "assigned_to, last_update")
+    for sql in REBUILD_SQL:
+        conn.execute(text(sql))
+
+
+def lead_trigram_search(conn) -> None:
+    """GIN trigram indexes for '%q%' search on name/phone (Postgres only).
+
+    Without pg_trgm (or on SQLite) lead_search.py falls back to its
+    in-process n-gram index, so a missing extension is reported, not fatal.
+    """
+    if conn.dialect.name != "postgresql":
+        print("   not postgres, using the in-process n-gram index")
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError as e:
+        print(f"   pg_trgm unavailable ({e.orig}), using the in-process n-gram index")
+        return
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_leads_name_trgm ON leads USING gin (name gin_trgm_ops)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_leads_phone_trgm ON leads USING gin (phone gin_trgm_ops)"))
+
+
+def report_cache(conn) -> None:
+    """Index for report date ranges (data_version / report_artifact come from create_all)."""
+    _create_index(conn, "ix_lead_details_created_at", "lead_details", "created_at")
+    if conn.dialect.name == "postgresql":  # SQLite integers are already 64-bit
+        conn.execute(text("ALTER TABLE report_artifact ALTER COLUMN size TYPE BIGINT"))
+    _add_column(conn, "report_artifact", "evicted_at", "TIMESTAMP")
+
+
+def match_features(conn) -> None:
+    """Parsed budget / BHK columns on projects and lead_details, backfilled from the text."""
+    for table in ("projects", "lead_details"):
+        _add_column(conn, table, "budget_min", "BIGINT")
+        _add_column(conn, table, "budget_max", "BIGINT")
+        _add_column(conn, table, "bhk_mask", "INTEGER")
+    _create_index(conn, "ix_projects_budget", "projects", "budget_min, budget_max")
+    session = Session(bind=conn)
+    projects, details = backfill_features(session)
+    bump_version(session, "projects")  # running catalogs pick up the new fields
+    session.commit()
+    print(f"   parsed {projects} projects, {details} lead_details rows")
+
+
+def live_location_partitions(conn) -> None:
+    """Rebuild live_location as a day-partitioned table (Postgres only).
+
+    Pings inside the raw retention window are copied into day partitions;
+    older ones are only kept downsampled in live_location_minute.
+    """
+    if conn.dialect.name != "postgresql":
+        _create_index(conn, "ix_live_location_telecaller_ts", "live_location", "telecaller_id, timestamp")
+        print("   not postgres, live_location stays a plain table")
+        return
+    if conn.execute(text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'live_location'::regclass")).first():
+        return
+
+    today = ist_today()
+    keep_from = today - timedelta(days=LOCATION_RAW_DAYS)
+    conn.execute(text("ALTER TABLE live_location RENAME TO live_location_unpartitioned"))
+    conn.execute(text("ALTER INDEX live_location_pkey RENAME TO live_location_unpartitioned_pkey"))
+    # Keep the id sequence alive past the old table
+    conn.execute(text("ALTER SEQUENCE live_location_id_seq OWNED BY NONE"))
+    conn.execute(text("""
+        CREATE TABLE live_location (
+            id INTEGER NOT NULL DEFAULT nextval('live_location_id_seq'),
+            telecaller_id INTEGER NOT NULL,
+            lat DOUBLE PRECISION NOT NULL,
+            lng DOUBLE PRECISION NOT NULL,
+            accuracy DOUBLE PRECISION,
+            "timestamp" TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    """))
+    conn.execute(text("CREATE TABLE live_location_default PARTITION OF live_location DEFAULT"))
+
+    session = Session(bind=conn)
+    first = conn.execute(text('SELECT min("timestamp") FROM live_location_unpartitioned')).scalar()
+    first_day = max(keep_from, first.date()) if first else today
+    ensure_partitions(session, first_day, today + timedelta(days=PARTITIONS_AHEAD))
+    cutoff = day_bounds(keep_from)[0]
+    copied = conn.execute(text("""
+        INSERT INTO live_location (id, telecaller_id, lat, lng, accuracy, "timestamp")
+        SELECT id, telecaller_id, lat, lng, accuracy, "timestamp"
+        FROM live_location_unpartitioned WHERE "timestamp" >= :cutoff
+    """), {"cutoff": cutoff}).rowcount
+
+    # Older pings: downsample straight from the old table, then drop it
+    minute_points = downsample(session, cutoff, source="live_location_unpartitioned")
+    conn.execute(text("DROP TABLE live_location_unpartitioned"))
+    conn.execute(text("ALTER SEQUENCE live_location_id_seq OWNED BY live_location.id"))
+    _create_index(conn, "ix_live_location_telecaller_ts", "live_location", 'telecaller_id, "timestamp"')
+    print(f"   {copied} recent pings partitioned by day, {minute_points} older minute points kept")
+
+
+def project_coordinates(conn) -> None:
+    """Optional site coordinates on projects (read by the in-process geo grid)."""
+    _add_column(conn, "projects", "lat", "DOUBLE PRECISION")
+    _add_column(conn, "projects", "lng", "DOUBLE PRECISION")
+    session = Session(bind=conn)
+    bump_version(session, "projects")
+    session.commit()
+
+
+def callback_due_index(conn) -> None:
+    """(telecaller_id, status, due_at) for list_callbacks; it covers the old telecaller_id index."""
+    _create_index(conn, "ix_callback_telecaller_status_due", "callback", "telecaller_id, status, due_at")
+    conn.execute(text("DROP INDEX IF EXISTS ix_callback_telecaller_id"))
+
+
+def site_visit_timestamps(conn) -> None:
+    """Turn site_visits.date from free text into a naive-UTC timestamp.
+
+    The text column is renamed to date_text and kept, so a value that can't
+    be parsed (left NULL in date) is not lost.
+    """
+    date_col = next(c for c in inspect(conn).get_columns("site_visits") if c["name"] == "date")
+    if not isinstance(date_col["type"], DateTime):
+        conn.execute(text("ALTER TABLE site_visits RENAME COLUMN date TO date_text"))
+        conn.execute(text("ALTER TABLE site_visits ADD COLUMN date TIMESTAMP"))
+        updates, unreadable = [], 0
+        for svs_id, raw in conn.execute(text("SELECT id, date_text FROM site_visits WHERE date_text IS NOT NULL")).all():
+            parsed = parse_visit_date(raw)
+            if parsed is None:
+                unreadable += 1
+                continue
+            updates.append({"id": svs_id, "date": parsed})
+        if updates:
+            conn.execute(text("UPDATE site_visits SET date = :date WHERE id = :id"), updates)
+        # Cached report artifacts still hold the old strings
+        session = Session(bind=conn)
+        bump_version(session, "site_visits")
+        session.commit()
+        print(f"   {len(updates)} visit dates converted, {unreadable} unreadable (kept in date_text)")
+    _create_index(conn, "ix_site_visits_date", "site_visits", "date")
+    _create_index(conn, "ix_site_visits_lead_date", "site_visits", "lead_id, date")
+
+
+def upload_metadata(conn):
+    """Upload table (created by create_all) filled from the per-telecaller JSON indexes,
+    with the SHA-256 of every stored file."""
+    _add_column(conn, "upload", "sha256", "VARCHAR(64)")
+    session = Session(bind=conn)
+    result = import_json_indexes(session)
+    print(f"   {result['imported']} uploads imported from {result['files']} index files, "
+          f"{result['skipped']} skipped, {result['malformed']} malformed")
+
+    hashed = missing = 0
+    for upload_id, filename in conn.execute(text("SELECT id, filename FROM upload WHERE sha256 IS NULL")).all():
+        digest = file_sha256(Path(filename))
+        if digest is None:
+            missing += 1
+            continue
+        conn.execute(text("UPDATE upload SET sha256 = :h WHERE id = :id"), {"h": digest, "id": upload_id})
+        hashed += 1
+    print(f"   {hashed} stored uploads hashed, {missing} files missing")
+    # Renamed by run() once this step's transaction has committed
+    return lambda: mark_imported(result["paths"])
+
+
+STEPS = [
+    create_missing_tables,
+    lead_batches,
+    lead_phone_norm,
+    lead_current_state,
+    lead_trigram_search,
+    report_cache,
+    match_features,
+    live_location_partitions,
+    project_coordinates,
+    callback_due_index,
+    site_visit_timestamps,
+    upload_metadata,
+]
+
+
+def run() -> None:
+    for step in STEPS:
+        with engine.begin() as conn:
+            print(f"-> {step.__name__}")
+            after_commit = step(conn)
+        # A step may return work that must wait for its commit (e.g. renaming files)
+        if after_commit:
+            after_commit()
+
+
+if __name__ == "__main__":
+    run()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float, Date, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Text, Float, Date, UniqueConstraint, Index
 from database import Base
 from datetime import datetime
 
@@ -9,13 +9,35 @@ class User(Base):
     password = Column(String)
     role = Column(String)
 
+class LeadBatch(Base):
+    __tablename__ = "lead_batch"
+    id = Column(String, primary_key=True)       # short upload id, e.g. "3f9c2a1b"
+    filename = Column(String, default="")
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
 class Lead(Base):
     __tablename__ = "leads"
     id = Column(Integer, primary_key=True)
     name = Column(String)
     phone = Column(String)
+    phone_norm = Column(String, nullable=True)  # digits only, no +91/0 prefix; dedup key
     status = Column(String)  # 'fresh', 'in_progress', 'closed'
     assigned_to = Column(Integer, ForeignKey("users.id"))
+    batch_id = Column(String, ForeignKey("lead_batch.id"), nullable=True)
+
+    # Current-state projection of the latest LeadDetails row (see lead_state.py)
+    last_details_id = Column(Integer, nullable=True)  # lead_details.id (no FK: avoids a leads<->lead_details cycle)
+    current_stage = Column(String, nullable=True)
+    last_update = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Covers batch lookup, batch stats and "unassigned in batch" without touching the heap
+        Index("ix_leads_batch_assigned", "batch_id", "assigned_to"),
+        # One lead per number org-wide; NULL for rows that predate normalization duplicates
+        Index("uq_leads_phone_norm", "phone_norm", unique=True),
+        # My-leads: a telecaller's leads in last-update order
+        Index("ix_leads_assigned_last_update", "assigned_to", "last_update"),
+    )
 
 class LeadDetails(Base):
     __tablename__ = "lead_details"
@@ -33,6 +55,17 @@ class LeadDetails(Base):
     stage = Column(String)  # New, Interested, Follow-up, Not Interested
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Parsed from budget / looking_for (see project_match.py)
+    budget_min = Column(BigInteger, nullable=True)  # rupees
+    budget_max = Column(BigInteger, nullable=True)  # rupees; NULL = open-ended
+    bhk_mask = Column(Integer, nullable=True)       # bit n = n BHK, bit 0 = studio/RK
+
+    __table_args__ = (
+        Index("ix_lead_details_lead_created", "lead_id", "created_at"),
+        # Report date ranges
+        Index("ix_lead_details_created_at", "created_at"),
+    )
+
 class Project(Base):
     __tablename__ = "projects"
     id = Column(Integer, primary_key=True)
@@ -42,6 +75,20 @@ class Project(Base):
     budget_range = Column(String)  # Matchable with lead budget
     description = Column(String)
 
+    # Parsed from budget_range / property_type / types_of_inventory (see project_match.py)
+    budget_min = Column(BigInteger, nullable=True)  # rupees
+    budget_max = Column(BigInteger, nullable=True)  # rupees; NULL = open-ended
+    bhk_mask = Column(Integer, nullable=True)       # bit n = n BHK, bit 0 = studio/RK
+
+    # Site coordinates (WGS84), optional; proximity queries use geo.py's in-process grid
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+
+    __table_args__ = (
+        # Budget range-overlap lookups for suggestions
+        Index("ix_projects_budget", "budget_min", "budget_max"),
+    )
+
 class ProjectInfo(Base):
     __tablename__ = "project_info"
 
@@ -72,9 +119,14 @@ class SiteVisit(Base):
     id = Column(Integer, primary_key=True)
     lead_id = Column(Integer, ForeignKey("leads.id"))
     project_id = Column(Integer, ForeignKey("projects.id"))
-    date = Column(String)
+    date = Column(DateTime)   # naive UTC (see site_visits.py)
     notes = Column(String)
 
+    __table_args__ = (
+        Index("ix_site_visits_date", "date"),
+        Index("ix_site_visits_lead_date", "lead_id", "date"),
+    )
+
 
 class Attendance(Base):
     __tablename__ = "attendance"
@@ -91,20 +143,108 @@ class Attendance(Base):
     )
 
 class LiveLocation(Base):
+    # Raw pings. On Postgres migrate.py turns this into a table partitioned by
+    # day on `timestamp` (see location_history.py); PK there is (id, timestamp).
     __tablename__ = "live_location"
     id = Column(Integer, primary_key=True, index=True)
-    telecaller_id = Column(Integer, index=True, nullable=False)
+    telecaller_id = Column(Integer, nullable=False)
     lat = Column(Float, nullable=False)
     lng = Column(Float, nullable=False)
     accuracy = Column(Float, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (Index("ix_live_location_telecaller_ts", "telecaller_id", "timestamp"),)
+
+class LiveLocationMinute(Base):
+    # Downsampled history: one point per telecaller per minute, kept after raw pings expire
+    __tablename__ = "live_location_minute"
+    telecaller_id = Column(Integer, primary_key=True)
+    minute = Column(DateTime, primary_key=True)   # naive UTC, truncated to the minute
+    lat = Column(Float, nullable=False)
+    lng = Column(Float, nullable=False)
+    accuracy = Column(Float, nullable=True)
+
+    __table_args__ = (Index("ix_live_location_minute_minute", "minute"),)
+
 class Callback(Base):
     __tablename__ = "callback"
     id = Column(Integer, primary_key=True, index=True)
     lead_id = Column(Integer, index=True, nullable=False)
-    telecaller_id = Column(Integer, index=True, nullable=False)
+    telecaller_id = Column(Integer, nullable=False)
     due_at = Column(DateTime, nullable=False)   # store as NAIVE UTC
     note = Column(String, default="")
     status = Column(String, default="pending")  # pending | done | canceled
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # list_callbacks: equality on telecaller/status, range + order on due_at
+    __table_args__ = (Index("ix_callback_telecaller_status_due", "telecaller_id", "status", "due_at"),)
+
+class Upload(Base):
+    # Telecaller documents / location selfies; the file lives under static/uploads
+    __tablename__ = "upload"
+    id = Column(String, primary_key=True)          # 16 hex chars, also the file's base name
+    telecaller_id = Column(Integer, nullable=False)
+    url = Column(String, nullable=False)
+    filename = Column(String, nullable=False)      # path on disk, relative to the backend dir
+    description = Column(String, default="")
+    kind = Column(String, nullable=False)          # document | selfie | ...
+    mime = Column(String, nullable=False)
+    size = Column(BigInteger, default=0)
+    sha256 = Column(String(64), nullable=True)     # hex digest of the stored file
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # naive UTC
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+
+    __table_args__ = (Index("ix_upload_telecaller_created", "telecaller_id", "created_at"),)
+
+class Blob(Base):
+    # One stored copy per distinct upload content (see blob_store.py)
+    __tablename__ = "blob"
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    refcount = Column(Integer, nullable=False, default=0)   # upload rows pointing here
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ImportJob(Base):
+    __tablename__ = "import_job"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)          # leads | projects | report
+    status = Column(String, default="queued")      # queued | running | done | failed
+    filename = Column(String, default="")
+    total_rows = Column(Integer, nullable=True)    # estimate from sheet dimensions
+    rows_processed = Column(Integer, default=0)
+    rejects = Column(Integer, default=0)
+    result_json = Column(Text, nullable=True)      # JSON: handler-specific summary
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DataVersion(Base):
+    """Counter per data set, bumped in the same transaction as the write (see versions.py)."""
+    __tablename__ = "data_version"
+    name = Column(String, primary_key=True)        # assignments | site_visits | projects | users
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ReportArtifact(Base):
+    """A generated report file on disk, keyed by type, range, format and data version."""
+    __tablename__ = "report_artifact"
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String, unique=True, nullable=False)
+    report_type = Column(String, nullable=False)
+    start = Column(Date, nullable=False)
+    end = Column(Date, nullable=False)
+    format = Column(String, nullable=False)        # csv | xlsx
+    data_version = Column(String, nullable=False)
+    job_id = Column(Integer, ForeignKey("import_job.id"), nullable=True)
+    path = Column(String, nullable=True)           # set once the job is done
+    size = Column(BigInteger, nullable=True)
+    rows = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_access_at = Column(DateTime, default=datetime.utcnow, index=True)
+    evicted_at = Column(DateTime, nullable=True)  # no longer served; file removed after a grace period
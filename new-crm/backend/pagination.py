@@ -0,0 +1,116 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+A sort is a list of (expression, descending) pairs ending in a unique
+column. The cursor is the sort-key tuple of the last row served, so the
+next page is a range condition on an index rather than an OFFSET scan.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+SortKeys = Sequence[Tuple[Any, bool]]
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def _encode_value(v: Any) -> Any:
+    if isinstance(v, datetime):
+        return {"dt": v.isoformat()}
+    return v
+
+
+def _decode_value(v: Any) -> Any:
+    if isinstance(v, dict) and "dt" in v:
+        return datetime.fromisoformat(v["dt"])
+    return v
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, width: Optional[int] = None) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or (width is not None and len(values) != width):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [_decode_value(v) for v in values]
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def after_cursor(keys: SortKeys, values: Sequence[Any]):
+    """Rows strictly after `values` in the order given by `keys`.
+
+    (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... with > flipped to < for
+    descending keys, so mixed directions work.
+    """
+    clauses = []
+    for i, (expr, desc) in enumerate(keys):
+        prefix = [keys[j][0] == values[j] for j in range(i)]
+        step = expr < values[i] if desc else expr > values[i]
+        clauses.append(and_(*prefix, step))
+    return or_(*clauses)
+
+
+def order_by_keys(query: Query, keys: SortKeys) -> Query:
+    return query.order_by(*[expr.desc() if desc else expr.asc() for expr, desc in keys])
+
+
+def keyset_page(
+    query: Query,
+    keys: SortKeys,
+    cursor: Optional[str],
+    limit: int,
+    with_total: bool = False,
+) -> Tuple[List[Any], Optional[str], Optional[int]]:
+    """Fetch one page of `query` (unordered, filters applied).
+
+    The sort expressions are selected alongside the row so the cursor holds
+    exactly what the database compared. Returns (rows, next_cursor, total);
+    total is only counted on request.
+    """
+    limit = clamp_limit(limit)
+    total = query.order_by(None).count() if with_total else None
+    width = len(query.column_descriptions)
+    if cursor:
+        query = query.filter(after_cursor(keys, decode_cursor(cursor, len(keys))))
+    rows = order_by_keys(query.add_columns(*[expr for expr, _ in keys]), keys).limit(limit + 1).all()
+
+    next_cursor = encode_cursor(tuple(rows[limit - 1])[width:]) if len(rows) > limit else None
+    page = [row[0] if width == 1 else tuple(row)[:width] for row in rows[:limit]]
+    return page, next_cursor, total
+
+
+def paginate(
+    query: Query,
+    keys: SortKeys,
+    serialize: Callable[[Any], Dict[str, Any]],
+    cursor: Optional[str],
+    limit: Optional[int],
+    with_total: bool = False,
+):
+    """Legacy full list when neither `limit` nor `cursor` is given, else one page envelope."""
+    if limit is None and cursor is None:
+        return [serialize(row) for row in order_by_keys(query, keys).all()]
+    rows, next_cursor, total = keyset_page(query, keys, cursor, limit or DEFAULT_LIMIT, with_total)
+    return page_response([serialize(row) for row in rows], next_cursor, total)
+
+
+def page_response(items: List[Any], next_cursor: Optional[str], total: Optional[int]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"items": items, "next_cursor": next_cursor}
+    if total is not None:
+        out["total"] = total
+    return out
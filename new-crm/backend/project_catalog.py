@@ -0,0 +1,120 @@
+"""Process-local project catalog.
+
+The catalog is small and rarely written, so each worker keeps every project
+pre-serialized in memory. Writers bump the "projects" stamp (versions.py) in
+their transaction; readers compare it (one primary-key read) before serving,
+so a change made through any worker is picked up by all of them.
+
+The dicts handed out are shared between requests: treat them as read-only.
+"""
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Project, ProjectInfo
+from project_match import bhk_list
+from versions import get_versions
+
+
+def serialize_project(p: Project, info: Optional[ProjectInfo]) -> dict:
+    types_list = (info.types_of_inventory.split(",") if info and info.types_of_inventory else [])
+    try:
+        carpet = json.loads(info.carpet_area_json) if (info and info.carpet_area_json) else {}
+    except Exception:
+        carpet = {}
+
+    return {
+        "id": p.id,
+        "name": p.name,
+        "location": p.location,
+        "property_type": p.property_type,
+        "budget_range": p.budget_range,
+        "budget_min": p.budget_min,
+        "budget_max": p.budget_max,
+        "bhk": bhk_list(p.bhk_mask),
+        "lat": p.lat,
+        "lng": p.lng,
+        "description": p.description,
+        "info": {
+            "developer_name": info.developer_name if info else "",
+            "experience": info.experience if info else "",
+            "completed_projects": info.completed_projects if info else "",
+            "landmark": info.landmark if info else "",
+            "possession_type": info.possession_type if info else "",
+            "total_land": info.total_land if info else "",
+            "total_towers": info.total_towers if info else "",
+            "number_of_floors": info.number_of_floors if info else "",
+            "construction_technology": info.construction_technology if info else "",
+            "number_of_amenities": info.number_of_amenities if info else "",
+            "types_of_inventory": types_list,
+            "carpet_area": carpet,
+            "flats_per_floor": info.flats_per_floor if info else "",
+            "lifts": info.lifts if info else "",
+        },
+    }
+
+
+class ProjectCatalog:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._projects: List[Dict[str, Any]] = []
+        self._by_id: Dict[int, Dict[str, Any]] = {}
+        self._summaries: List[Dict[str, Any]] = []
+        self._derived: Dict[str, Tuple[int, Any]] = {}
+
+    def _load(self, db: Session, version: int) -> None:
+        rows = (
+            db.query(Project, ProjectInfo)
+            .outerjoin(ProjectInfo, ProjectInfo.project_id == Project.id)
+            .order_by(Project.id)
+            .all()
+        )
+        projects = [serialize_project(p, info) for p, info in rows]
+        # Swap all views at once so readers never see a half-built catalog
+        self._projects = projects
+        self._by_id = {p["id"]: p for p in projects}
+        self._summaries = [{"id": p["id"], "name": p["name"], "location": p["location"]} for p in projects]
+        self._version = version
+
+    def refresh(self, db: Session) -> int:
+        """Reload if the stored stamp moved; returns the version being served."""
+        # Stamp first: a write landing during the load only causes one extra reload
+        version = get_versions(db, ["projects"])["projects"]
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._load(db, version)
+        return version
+
+    def all(self, db: Session) -> List[Dict[str, Any]]:
+        self.refresh(db)
+        return self._projects
+
+    def summaries(self, db: Session) -> List[Dict[str, Any]]:
+        self.refresh(db)
+        return self._summaries
+
+    def by_id(self, db: Session) -> Dict[int, Dict[str, Any]]:
+        """id -> project; fetch once per request rather than calling get() per row."""
+        self.refresh(db)
+        return self._by_id
+
+    def get(self, db: Session, project_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        return self.by_id(db).get(project_id)
+
+    def derived(self, db: Session, name: str, build: Callable[[List[Dict[str, Any]]], Any]) -> Any:
+        """A structure computed from the project list, rebuilt when the catalog reloads."""
+        self.refresh(db)
+        with self._lock:
+            hit = self._derived.get(name)
+            if hit and hit[0] == self._version:
+                return hit[1]
+            value = build(self._projects)
+            self._derived[name] = (self._version, value)
+            return value
+
+
+catalog = ProjectCatalog()
@@ -0,0 +1,79 @@
+"""Project catalog import from an .xlsx (Name, Location, Type, Budget, Description[, Latitude, Longitude])."""
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from dashboard_stats import invalidate_stats
+from lead_import import CHUNK_SIZE, ProgressFn, _chunks, iter_sheet_rows
+from geo import valid_point
+from models import Project
+from project_match import project_features
+from versions import bump_version
+
+
+def _coord(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_project_row(row: tuple) -> Optional[Dict[str, Any]]:
+    if not row or not row[0]:
+        return None
+    name, location, property_type, budget_range, description, lat, lng = (tuple(row) + (None,) * 7)[:7]
+    lat, lng = _coord(lat), _coord(lng)
+    if not valid_point(lat, lng):
+        lat = lng = None
+    row = {
+        "name": str(name).strip(),
+        "location": str(location).strip(),
+        "property_type": str(property_type).strip(),
+        "budget_range": str(budget_range).strip(),
+        "description": (str(description).strip() if description else ""),
+        "lat": lat,
+        "lng": lng,
+    }
+    row.update(project_features(row["property_type"], row["budget_range"], None))
+    return row
+
+
+def import_projects(
+    db: Session,
+    rows: Iterable[tuple],
+    chunk_size: int = CHUNK_SIZE,
+    on_progress: Optional[ProgressFn] = None,
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    count = 0
+    rejects = 0
+
+    for raw_chunk in _chunks(rows, chunk_size):
+        chunk = []
+        for raw in raw_chunk:
+            parsed = _parse_project_row(raw)
+            if parsed is None:
+                rejects += 1
+            else:
+                chunk.append(parsed)
+
+        if chunk:
+            db.execute(insert(Project), chunk)
+            bump_version(db, "projects")
+            db.commit()
+            count += len(chunk)
+
+        if on_progress:
+            on_progress(count + rejects, rejects)
+
+    return {"rows": count, "rejects": rejects, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def project_import_job(db: Session, path, job_id: int, on_progress: ProgressFn) -> Dict[str, Any]:
+    """Background-job handler for /admin/upload-projects (see jobs.submit_job)."""
+    result = import_projects(db, iter_sheet_rows(path), on_progress=on_progress)
+    invalidate_stats()
+    result["message"] = f"{result['rows']} projects uploaded successfully."
+    return result
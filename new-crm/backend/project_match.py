@@ -0,0 +1,209 @@
+"""Structured budget / BHK features for matching leads to projects.
+
+Free-text budgets ("₹90L–₹1.6Cr", "Below 50 LAKHS", "1.15-2.25") become a
+rupee range [min, max] (max None = open-ended) and inventory text
+("2BHK,3BHK", "Studio") becomes a bitmask: bit n = n BHK, bit 0 = studio/RK.
+Both are stored on projects and lead_details when written, so suggestions
+are an indexed range-overlap query instead of substring guessing.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import Session
+
+from models import Lead, LeadDetails, Project, ProjectInfo
+
+Budget = Tuple[Optional[int], Optional[int]]
+
+_UNITS = [
+    ("crores", 10**7), ("crore", 10**7), ("cr", 10**7),
+    ("lakhs", 10**5), ("lakh", 10**5), ("lacs", 10**5), ("lac", 10**5), ("l", 10**5),
+    ("thousand", 10**3), ("k", 10**3),
+]
+_AMOUNT = re.compile(r"(\d+(?:\.\d+)?)\s*(" + "|".join(u for u, _ in _UNITS) + r")?(?![a-z])")
+_UPPER_ONLY = re.compile(r"below|under|upto|up to|less than|within|max|<")
+_LOWER_ONLY = re.compile(r"above|over|onwards|more than|min|plus|\+|>")
+
+# Leads quote a figure, not a hard limit: widen their range this much when matching
+BUDGET_SLACK = 0.10
+
+
+def _unitless(value: float) -> int:
+    # No unit given: small figures are crores ("1.15-2.25"), mid-size lakhs ("50-60"),
+    # anything large is already rupees
+    if value < 10:
+        return int(value * 10**7)
+    if value < 10000:
+        return int(value * 10**5)
+    return int(value)
+
+
+def parse_budget(value: Optional[str]) -> Budget:
+    """Rupee range for a free-text budget; (None, None) if nothing parses."""
+    if not value:
+        return None, None
+    s = value.lower().replace("₹", " ").replace("rs.", " ").replace("inr", " ")
+    s = re.sub(r"(?<=\d),(?=\d)", "", s)  # 45,00,000
+    amounts = _AMOUNT.findall(s)
+    if not amounts:
+        return None, None
+
+    units = dict(_UNITS)
+    # A unit written once applies to the bare figures before it: "1.2-1.5 Cr"
+    resolved: List[int] = []
+    pending: List[float] = []
+    for num, unit in amounts:
+        if unit:
+            resolved += [int(float(n) * units[unit]) for n in pending]
+            resolved.append(int(float(num) * units[unit]))
+            pending = []
+        else:
+            pending.append(float(num))
+    resolved += [_unitless(n) for n in pending]
+
+    lo, hi = min(resolved), max(resolved)
+    if _UPPER_ONLY.search(s):
+        return 0, hi
+    if _LOWER_ONLY.search(s):
+        return lo, None
+    return lo, hi
+
+
+_BHK_TOKENS = re.compile(r"\d+(?:\.\d+)?|bhk|rk|studio|-|to|and|or|&|/|,|[a-z]+")
+_JOINERS = {"-", "to", "and", "or", "&", "/", ","}
+
+
+def parse_bhk(value: Optional[str]) -> int:
+    """Bitmask of the BHK sizes mentioned: "2BHK,3BHK" -> 0b1100; studio/RK -> bit 0."""
+    if not value:
+        return 0
+    mask = 0
+    pending: List[int] = []
+    ranged = False
+    for tok in _BHK_TOKENS.findall(value.lower()):
+        if tok in ("rk", "studio"):
+            mask |= 1
+            pending, ranged = [], False
+        elif tok == "bhk":
+            if ranged and len(pending) >= 2:
+                pending = list(range(pending[-2], pending[-1] + 1))
+            for n in pending:
+                if 1 <= n <= 9:
+                    mask |= 1 << n
+            pending, ranged = [], False
+        elif tok[0].isdigit():
+            pending.append(int(float(tok)))
+        elif tok in _JOINERS:
+            ranged = ranged or tok in ("-", "to")
+        else:
+            pending, ranged = [], False
+    return mask
+
+
+def bhk_list(mask: Optional[int]) -> List[str]:
+    if not mask:
+        return []
+    return (["Studio"] if mask & 1 else []) + [f"{n}BHK" for n in range(1, 10) if mask & (1 << n)]
+
+
+def project_features(property_type: Optional[str], budget_range: Optional[str], types_of_inventory: Optional[str]) -> Dict[str, Any]:
+    """Column values for Project.budget_min / budget_max / bhk_mask."""
+    lo, hi = parse_budget(budget_range)
+    mask = parse_bhk(property_type) | parse_bhk(types_of_inventory)
+    return {"budget_min": lo, "budget_max": hi, "bhk_mask": mask or None}
+
+
+def apply_project_features(project: Project, info: Optional[ProjectInfo]) -> None:
+    for k, v in project_features(
+        project.property_type, project.budget_range, info.types_of_inventory if info else None
+    ).items():
+        setattr(project, k, v)
+
+
+def apply_lead_features(details: LeadDetails) -> None:
+    details.budget_min, details.budget_max = parse_budget(details.budget)
+    details.bhk_mask = parse_bhk(details.looking_for) or None
+
+
+def _states_preference():
+    return or_(
+        LeadDetails.budget != "",
+        LeadDetails.looking_for != "",
+        LeadDetails.location_preference != "",
+    )
+
+
+def preferences(db: Session, lead_id: int) -> Optional[LeadDetails]:
+    """The lead's latest details row that states any preference."""
+    return (
+        db.query(LeadDetails)
+        .filter(LeadDetails.lead_id == lead_id, _states_preference())
+        .order_by(LeadDetails.created_at.desc(), LeadDetails.id.desc())
+        .first()
+    )
+
+
+def queue_preferences(db: Session, telecaller_id: int) -> List[LeadDetails]:
+    """preferences() for every lead assigned to a telecaller, in one query."""
+    latest = (
+        db.query(func.max(LeadDetails.id))
+        .join(Lead, Lead.id == LeadDetails.lead_id)
+        .filter(Lead.assigned_to == telecaller_id, _states_preference())
+        .group_by(LeadDetails.lead_id)
+    )
+    return db.query(LeadDetails).filter(LeadDetails.id.in_(latest)).order_by(LeadDetails.lead_id).all()
+
+
+def matching_project_ids(db: Session, ld: LeadDetails) -> List[int]:
+    """Projects overlapping the lead's budget and BHK sizes, in the preferred location.
+
+    Each preference only applies when it was given (and, for budget / BHK,
+    parsed); an unparseable looking_for falls back to a property_type substring.
+    """
+    q = db.query(Project.id)
+    if ld.budget_min is not None or ld.budget_max is not None:
+        lo = int((ld.budget_min or 0) * (1 - BUDGET_SLACK))
+        q = q.filter(or_(Project.budget_max.is_(None), Project.budget_max >= lo))
+        if ld.budget_max is not None:
+            hi = int(ld.budget_max * (1 + BUDGET_SLACK))
+            q = q.filter(or_(Project.budget_min.is_(None), Project.budget_min <= hi))
+    if ld.bhk_mask:
+        q = q.filter(Project.bhk_mask.op("&")(ld.bhk_mask) != 0)
+    elif ld.looking_for:
+        q = q.filter(Project.property_type.ilike(f"%{ld.looking_for}%"))
+    if ld.location_preference:
+        q = q.filter(Project.location.ilike(f"%{ld.location_preference}%"))
+    return [pid for (pid,) in q.order_by(Project.id).all()]
+
+
+def backfill_features(db: Session, batch: int = 5000) -> Tuple[int, int]:
+    """Compute the parsed columns for every project and lead_details row; returns counts."""
+    projects = db.query(Project, ProjectInfo).outerjoin(ProjectInfo, ProjectInfo.project_id == Project.id).all()
+    for p, info in projects:
+        apply_project_features(p, info)
+    db.flush()
+
+    updated = 0
+    last_id = 0
+    sql = text("UPDATE lead_details SET budget_min = :lo, budget_max = :hi, bhk_mask = :mask WHERE id = :id")
+    while True:
+        rows = (
+            db.query(LeadDetails.id, LeadDetails.budget, LeadDetails.looking_for)
+            .filter(LeadDetails.id > last_id)
+            .filter(or_(LeadDetails.budget != "", LeadDetails.looking_for != ""))
+            .order_by(LeadDetails.id)
+            .limit(batch)
+            .all()
+        )
+        if not rows:
+            break
+        params = []
+        for row_id, budget, looking_for in rows:
+            lo, hi = parse_budget(budget)
+            params.append({"id": row_id, "lo": lo, "hi": hi, "mask": parse_bhk(looking_for) or None})
+        db.execute(sql, params)
+        updated += len(rows)
+        last_id = rows[-1][0]
+    db.commit()
+    return len(projects), updated
@@ -0,0 +1,171 @@
+"""Score every project against a lead's preferences in one NumPy pass.
+
+Project features are arrays built once per catalog version (see
+ProjectCatalog.derived). Each feature scores 0..1; a lead's total is the
+weighted mean over the features the lead actually stated, so a lead with
+only a budget is ranked on budget alone. rank_leads() scores a whole queue
+as an (L leads x N projects) matrix.
+"""
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import LeadDetails
+from project_catalog import catalog
+from project_match import BUDGET_SLACK, parse_bhk
+
+FEATURES = ("location", "budget", "bhk", "possession", "work_location")
+WEIGHTS = np.array([0.30, 0.30, 0.25, 0.10, 0.05])
+
+# Neutral score where the project side of a feature is unknown
+UNKNOWN = 0.5
+
+_STAGE_MONTHS = [("ready", 0.0), ("near", 12.0), ("under construction", 24.0), ("launch", 36.0)]
+
+
+def possession_months(value: Optional[str]) -> Optional[float]:
+    """Months until possession: "Ready Possession (0-6 Months)" -> 6, "Under Construction" -> 24."""
+    if not value:
+        return None
+    s = value.lower()
+    nums = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", s)]
+    if nums:
+        return max(nums) * (12 if "year" in s else 1)
+    for word, months in _STAGE_MONTHS:
+        if word in s:
+            return months
+    return None
+
+
+def _place_score(pref: str, place: str) -> float:
+    if not pref or not place:
+        return 0.0
+    if pref == place:
+        return 1.0
+    return 0.7 if pref in place or place in pref else 0.0
+
+
+class ProjectFeatures:
+    """Column arrays over the catalog, index-aligned with `projects`."""
+
+    def __init__(self, projects: List[Dict[str, Any]]) -> None:
+        self.projects = projects
+        n = len(projects)
+        self.ids = np.array([p["id"] for p in projects], dtype=np.int64)
+        lo = np.array([p["budget_min"] if p["budget_min"] is not None else np.nan for p in projects], dtype=float)
+        hi = np.array([p["budget_max"] if p["budget_max"] is not None else np.nan for p in projects], dtype=float)
+        self.has_budget = ~(np.isnan(lo) & np.isnan(hi))
+        self.budget_lo = np.nan_to_num(lo, nan=0.0)
+        self.budget_hi = np.where(np.isnan(hi), np.inf, hi)
+        self.bhk = np.array([parse_bhk(",".join(p["bhk"])) for p in projects], dtype=np.int64)
+        self.possession = np.array(
+            [m if (m := possession_months(p["info"]["possession_type"])) is not None else np.nan for p in projects],
+            dtype=float,
+        )
+        # Locations are few and repeated: score each distinct one, then gather
+        self.places: List[str] = []
+        codes: Dict[str, int] = {}
+        self.place_code = np.empty(n, dtype=np.int64)
+        for i, p in enumerate(projects):
+            place = (p["location"] or "").strip().lower()
+            if place not in codes:
+                codes[place] = len(self.places)
+                self.places.append(place)
+            self.place_code[i] = codes[place]
+
+    def place_scores(self, pref: Optional[str]) -> np.ndarray:
+        per_place = np.array([_place_score((pref or "").strip().lower(), p) for p in self.places] or [0.0])
+        return per_place[self.place_code]
+
+
+def project_features(db: Session) -> ProjectFeatures:
+    return catalog.derived(db, "rank_features", ProjectFeatures)
+
+
+def _score_matrix(F: ProjectFeatures, leads: Sequence[LeadDetails]):
+    """(total L x N, parts {feature: L x N}, weights L x len(FEATURES))."""
+    L, N = len(leads), len(F.ids)
+    parts = {name: np.zeros((L, N)) for name in FEATURES}
+    w = np.zeros((L, len(FEATURES)))
+
+    # Budget: 1 inside the lead's (slackened) range, decaying with the relative gap
+    b_lo = np.array([ld.budget_min if ld.budget_min is not None else np.nan for ld in leads], dtype=float)
+    b_hi = np.array([ld.budget_max if ld.budget_max is not None else np.nan for ld in leads], dtype=float)
+    has_b = ~(np.isnan(b_lo) & np.isnan(b_hi))
+    lo = (np.nan_to_num(b_lo, nan=0.0) * (1 - BUDGET_SLACK))[:, None]
+    hi = np.where(np.isnan(b_hi), np.inf, b_hi * (1 + BUDGET_SLACK))[:, None]
+    gap = np.maximum(F.budget_lo[None, :] - hi, 0) + np.maximum(lo - F.budget_hi[None, :], 0)
+    scale = np.where(np.isinf(hi), lo, (lo + hi) / 2)
+    scale = np.where(scale > 0, scale, 1.0)
+    s = np.exp(-gap / (0.2 * scale))
+    parts["budget"] = np.where(F.has_budget[None, :], s, UNKNOWN)
+    w[:, 1] = np.where(has_b, WEIGHTS[1], 0)
+
+    # BHK: any overlap of the size sets
+    masks = np.array([ld.bhk_mask or 0 for ld in leads], dtype=np.int64)[:, None]
+    overlap = (F.bhk[None, :] & masks) != 0
+    parts["bhk"] = np.where(overlap, 1.0, np.where(F.bhk[None, :] == 0, UNKNOWN, 0.0))
+    w[:, 2] = np.where(masks[:, 0] != 0, WEIGHTS[2], 0)
+
+    # Possession: on time scores 1, later decays by a year's wait
+    want = np.array([m if (m := possession_months(ld.possession_time)) is not None else np.nan for ld in leads])
+    late = F.possession[None, :] - want[:, None]
+    s = np.where(late <= 0, 1.0, np.exp(-np.maximum(late, 0) / 12))
+    parts["possession"] = np.where(np.isnan(F.possession)[None, :], UNKNOWN, s)
+    w[:, 3] = np.where(np.isnan(want), 0, WEIGHTS[3])
+
+    # Location / work location: one score vector per distinct stated place
+    by_place: Dict[str, np.ndarray] = {}
+    for row, ld in enumerate(leads):
+        for f, name, pref in ((0, "location", ld.location_preference), (4, "work_location", ld.work_location)):
+            if pref:
+                if pref not in by_place:
+                    by_place[pref] = F.place_scores(pref)
+                parts[name][row] = by_place[pref]
+                w[row, f] = WEIGHTS[f]
+
+    total = np.zeros((L, N))
+    for f, name in enumerate(FEATURES):
+        total += np.nan_to_num(parts[name]) * w[:, f, None]
+    wsum = w.sum(axis=1)
+    total /= np.where(wsum > 0, wsum, 1.0)[:, None]
+    return total, parts, w
+
+
+def _top_k(F: ProjectFeatures, total: np.ndarray, parts, w: np.ndarray, row: int, k: int,
+           allowed: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+    scores = total[row]
+    candidates = np.arange(len(F.ids)) if allowed is None else np.flatnonzero(allowed)
+    if k < len(candidates):
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    # Highest score first, lower id on ties
+    candidates = candidates[np.lexsort((F.ids[candidates], -scores[candidates]))]
+    out = []
+    for i in candidates:
+        breakdown = {
+            name: (round(float(parts[name][row, i]), 3) if w[row, f] > 0 else None)
+            for f, name in enumerate(FEATURES)
+        }
+        out.append({"project": F.projects[i], "score": round(float(scores[i]), 3), "breakdown": breakdown})
+    return out
+
+
+def rank_projects(db: Session, ld: LeadDetails, k: int = 20, only_ids: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+    """Top-k projects for one lead; `only_ids` restricts the candidates."""
+    F = project_features(db)
+    if not len(F.ids):
+        return []
+    total, parts, w = _score_matrix(F, [ld])
+    allowed = np.isin(F.ids, np.asarray(list(only_ids), dtype=np.int64)) if only_ids is not None else None
+    return _top_k(F, total, parts, w, 0, k, allowed)
+
+
+def rank_leads(db: Session, leads: Sequence[LeadDetails], k: int = 5) -> Dict[int, List[Dict[str, Any]]]:
+    """Top-k per lead for a whole queue, scored as one matrix; keyed by lead_id."""
+    F = project_features(db)
+    if not leads or not len(F.ids):
+        return {ld.lead_id: [] for ld in leads}
+    total, parts, w = _score_matrix(F, leads)
+    return {ld.lead_id: _top_k(F, total, parts, w, row, k) for row, ld in enumerate(leads)}
@@ -0,0 +1,52 @@
+"""Proximity lookups over the project catalog and live telecaller positions."""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from geo import GridIndex
+from location_latest import latest_positions
+from project_catalog import catalog
+
+
+def project_index(db: Session) -> GridIndex:
+    """Grid over projects with coordinates, rebuilt when the catalog reloads."""
+    return catalog.derived(
+        db, "geo_index", lambda projects: GridIndex((p["id"], p["lat"], p["lng"]) for p in projects)
+    )
+
+
+def telecaller_index(db: Session, max_age: Optional[timedelta]) -> Tuple[GridIndex, Dict[int, Any]]:
+    """Grid over last-known telecaller positions no older than max_age, plus the positions."""
+    latest_positions.sync(db)
+    positions = latest_positions.snapshot()
+    if max_age is not None:
+        cutoff = datetime.utcnow() - max_age
+        positions = {tid: pos for tid, pos in positions.items() if pos.timestamp >= cutoff}
+    return GridIndex((tid, pos.lat, pos.lng) for tid, pos in positions.items()), positions
+
+
+def place_point(db: Session, name: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Coordinates for a free-text place, as the centroid of catalog projects located there.
+
+    Exact (case-insensitive) location matches win; otherwise substring matches
+    either way ("Baner" vs "Baner, Pune"). None when no located project matches.
+    """
+    key = (name or "").strip().lower()
+    if not key:
+        return None
+    located = [p for p in catalog.all(db) if p["lat"] is not None and p["lng"] is not None and p["location"]]
+    hits = [p for p in located if p["location"].strip().lower() == key]
+    if not hits:
+        hits = [p for p in located if key in p["location"].lower() or p["location"].strip().lower() in key]
+    if not hits:
+        return None
+    return sum(p["lat"] for p in hits) / len(hits), sum(p["lng"] for p in hits) / len(hits)
+
+
+def search(index: GridIndex, lat: float, lng: float, radius_km: Optional[float], k: Optional[int]) -> List[Tuple[Any, float]]:
+    """Everything within radius_km (capped at k), or the k nearest when no radius is given."""
+    if radius_km is not None:
+        hits = index.within(lat, lng, radius_km)
+        return hits[:k] if k else hits
+    return index.nearest(lat, lng, k or 10)
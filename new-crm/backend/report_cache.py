@@ -0,0 +1,211 @@
+"""Reports built by background jobs and kept on disk for repeat downloads.
+
+An artifact is keyed by report type, date range, format and a data version:
+the lead_details rows in the range plus the version stamps (versions.py) of
+everything else the report joins. When any of those move the key changes,
+so a stale file is never served; it just ages out. Eviction drops files
+older than REPORT_MAX_AGE, then least recently downloaded ones until the
+cache fits in REPORT_MAX_BYTES. It happens in two steps: the row is marked
+evicted and committed, so it is no longer handed out, and the file is only
+deleted EVICT_GRACE later, once a download that was already given the path
+has had time to open it.
+"""
+import hashlib
+import os
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from jobs import submit_job
+from models import ImportJob, LeadDetails, ReportArtifact
+from reports import FETCH_SIZE, WRITERS, report_query, report_rows
+from versions import get_versions
+
+REPORT_ROOT = Path("report_cache")
+REPORT_MAX_AGE = timedelta(days=int(os.getenv("CRM_REPORT_MAX_AGE_DAYS", "7")))
+REPORT_MAX_BYTES = int(os.getenv("CRM_REPORT_CACHE_MB", "512")) * 1024 * 1024
+EVICT_GRACE = timedelta(minutes=10)
+# An artifact still without a job this long after creation lost its submit
+SUBMIT_GRACE = timedelta(minutes=1)
+
+# Version stamps of the data each report joins besides lead_details
+REPORT_STAMPS = {
+    "calls": ("assignments", "users"),
+    "connected": ("assignments", "users", "projects"),
+    "converted": ("assignments", "users", "projects", "site_visits"),
+    "sitevisits": ("assignments", "users", "projects", "site_visits"),
+}
+
+
+def data_version(db: Session, report_type: str, start_date: date, end_date: date) -> str:
+    parts = [f"{k}={v}" for k, v in sorted(get_versions(db, REPORT_STAMPS[report_type]).items())]
+    if report_type != "sitevisits":
+        lo = datetime.combine(start_date, time.min)
+        hi = datetime.combine(end_date + timedelta(days=1), time.min)
+        n, top = (
+            db.query(func.count(LeadDetails.id), func.max(LeadDetails.id))
+            .filter(LeadDetails.created_at >= lo, LeadDetails.created_at < hi)
+            .one()
+        )
+        parts.append(f"details={n}:{top}")
+    if report_type == "connected":
+        # Lead.status moves with each call outcome, which always adds a lead_details row
+        parts.append(f"latest={db.query(func.max(LeadDetails.id)).scalar()}")
+    return ";".join(parts)
+
+
+def cache_key(report_type: str, start_date: date, end_date: date, fmt: str, version: str) -> str:
+    raw = f"{report_type}|{start_date}|{end_date}|{fmt}|{version}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+
+def _is_ready(art: ReportArtifact) -> bool:
+    return art.evicted_at is None and bool(art.path) and Path(art.path).exists()
+
+
+def find_ready(db: Session, report_type: str, start_date: date, end_date: date, fmt: str) -> Optional[ReportArtifact]:
+    key = cache_key(report_type, start_date, end_date, fmt, data_version(db, report_type, start_date, end_date))
+    art = db.query(ReportArtifact).filter(ReportArtifact.cache_key == key).first()
+    return art if art and _is_ready(art) else None
+
+
+def request_report(db: Session, report_type: str, start_date: date, end_date: date, fmt: str) -> ReportArtifact:
+    """The current artifact for this report: ready, being built, or newly queued."""
+    version = data_version(db, report_type, start_date, end_date)
+    key = cache_key(report_type, start_date, end_date, fmt, version)
+
+    art = db.query(ReportArtifact).filter(ReportArtifact.cache_key == key).first()
+    if art:
+        if _is_ready(art):
+            return art
+        if art.job_id is None:
+            # job_id is set right after the row; past the grace period the
+            # submit failed or the process died in between
+            if art.created_at and art.created_at > datetime.utcnow() - SUBMIT_GRACE:
+                return art
+        else:
+            job = db.get(ImportJob, art.job_id)
+            if job is not None and job.status in ("queued", "running"):
+                return art
+        db.delete(art)  # failed build, lost submit or file gone: build again
+        db.commit()
+
+    art = ReportArtifact(
+        cache_key=key, report_type=report_type, start=start_date, end=end_date,
+        format=fmt, data_version=version,
+    )
+    db.add(art)
+    try:
+        db.commit()
+    except IntegrityError:  # a concurrent request queued the same build
+        db.rollback()
+        return db.query(ReportArtifact).filter(ReportArtifact.cache_key == key).one()
+
+    try:
+        job = submit_job(
+            db, "report", f"{report_type}_report_{start_date}_{end_date}.{fmt}", None,
+            report_job, artifact_id=art.id,
+        )
+    except Exception:
+        db.rollback()
+        db.delete(art)
+        db.commit()
+        raise
+    art.job_id = job.id
+    db.commit()
+    return art
+
+
+def report_job(db: Session, path, job_id: int, on_progress, artifact_id: int) -> Dict[str, Any]:
+    """Background-job handler: write the artifact's file, then evict."""
+    art = db.get(ReportArtifact, artifact_id)
+    REPORT_ROOT.mkdir(parents=True, exist_ok=True)
+    final = REPORT_ROOT / f"{art.cache_key}.{art.format}"
+    part = final.with_name(final.name + ".part")
+
+    def progress(rows):
+        for i, row in enumerate(rows, 1):
+            if i % FETCH_SIZE == 0:
+                on_progress(i, 0)
+            yield row
+
+    # The query streams from its own session: on_progress commits on `db`
+    rdb = SessionLocal()
+    try:
+        header, rows = report_rows(report_query(rdb, art.report_type, art.start, art.end))
+        count = WRITERS[art.format](header, progress(rows), part)
+    except Exception:
+        part.unlink(missing_ok=True)
+        raise
+    finally:
+        rdb.close()
+    os.replace(part, final)
+
+    art.path = str(final)
+    art.size = final.stat().st_size
+    art.rows = count
+    db.commit()
+    on_progress(count, 0)
+    evicted = evict_reports(db)
+    return {"artifact_id": artifact_id, "rows": count, "size": art.size, "evicted": evicted,
+            "message": f"{count} rows written"}
+
+
+def evict_reports(db: Session) -> int:
+    """Mark expired artifacts, then the least recently used until under the size cap,
+    as evicted; delete the files of those evicted more than EVICT_GRACE ago."""
+    now = datetime.utcnow()
+    cutoff = now - REPORT_MAX_AGE
+    ready = (
+        db.query(ReportArtifact)
+        .filter(ReportArtifact.path.isnot(None), ReportArtifact.evicted_at.is_(None))
+        .order_by(ReportArtifact.last_access_at.desc())
+        .all()
+    )
+    total, doomed = 0, []
+    for art in ready:
+        if art.created_at < cutoff or not _is_ready(art) or total + (art.size or 0) > REPORT_MAX_BYTES:
+            doomed.append(art)
+        else:
+            total += art.size or 0
+    for art in doomed:
+        art.evicted_at = now
+    db.commit()
+
+    expired = db.query(ReportArtifact).filter(ReportArtifact.evicted_at < now - EVICT_GRACE).all()
+    for art in expired:
+        db.delete(art)
+    db.commit()
+    for art in expired:  # rows are gone first, so nothing hands these paths out again
+        if art.path:
+            Path(art.path).unlink(missing_ok=True)
+    return len(doomed)
+
+
+def touch(db: Session, art: ReportArtifact) -> None:
+    art.last_access_at = datetime.utcnow()
+    db.commit()
+
+
+def serialize_artifact(art: ReportArtifact, job: Optional[ImportJob]) -> Dict[str, Any]:
+    ready = _is_ready(art)
+    return {
+        "id": art.id,
+        "report_type": art.report_type,
+        "start": art.start.isoformat(),
+        "end": art.end.isoformat(),
+        "format": art.format,
+        "status": "ready" if ready else (job.status if job else "queued"),
+        "job_id": art.job_id,
+        "error": job.error if job and job.status == "failed" else None,
+        "rows": art.rows,
+        "size": art.size,
+        "created_at": art.created_at.isoformat() if art.created_at else None,
+        "last_access_at": art.last_access_at.isoformat() if art.last_access_at else None,
+        "download_url": f"/admin/reports/{art.id}/download" if ready else None,
+    }
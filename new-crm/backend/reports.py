@@ -0,0 +1,221 @@
+"""Admin report exports (calls / connected / converted / sitevisits).
+
+Rows come off a server-side cursor (Query.yield_per) and go straight into a
+CSV generator or a write-only openpyxl workbook, so memory stays flat
+whatever the date range.
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from typing import Any, Iterator, List, Sequence, Tuple
+
+import openpyxl
+from fastapi import HTTPException
+from sqlalchemy.orm import Query, Session
+
+from models import Lead, LeadDetails, Project, SiteVisit, User
+from site_visits import days_range, to_ist
+
+REPORT_TYPES = ("calls", "connected", "converted", "sitevisits")
+FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Rows per server-side cursor fetch / per CSV chunk sent
+FETCH_SIZE = 2000
+
+
+def parse_range(start: str, end: str) -> Tuple[date, date]:
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    return start_date, end_date
+
+
+def report_query(db: Session, report_type: str, start_date: date, end_date: date) -> Query:
+    # Half-open datetime range so the created_at index can be used
+    lo = datetime.combine(start_date, time.min)
+    hi = datetime.combine(end_date + timedelta(days=1), time.min)
+    created_in_range = (LeadDetails.created_at >= lo, LeadDetails.created_at < hi)
+
+    if report_type == "calls":
+        return (
+            db.query(
+                LeadDetails.created_at,
+                LeadDetails.lead_id,
+                LeadDetails.stage,
+                Lead.assigned_to,
+                User.phone.label("telecaller_phone"),
+            )
+            .select_from(LeadDetails)
+            .join(Lead, LeadDetails.lead_id == Lead.id)
+            .join(User, Lead.assigned_to == User.id)
+            .filter(*created_in_range)
+        )
+
+    if report_type == "connected":
+        return (
+            db.query(
+                Lead.name.label("Lead Name"),
+                Lead.phone.label("Phone"),
+                LeadDetails.stage,
+                User.phone.label("Telecaller"),
+                Project.name.label("Project Name"),
+                Project.location.label("Location"),
+            )
+            .join(Lead, LeadDetails.lead_id == Lead.id)
+            .join(User, Lead.assigned_to == User.id)
+            .outerjoin(Project, Project.location == LeadDetails.location_preference)
+            .filter(*created_in_range, Lead.status == "in_progress")
+        )
+
+    if report_type == "converted":
+        return (
+            db.query(
+                Lead.name.label("Lead Name"),
+                Lead.phone,
+                LeadDetails.stage,
+                User.phone.label("Telecaller"),
+                Project.name.label("Project Name"),
+                SiteVisit.date.label("Visit Date"),
+            )
+            .join(Lead, LeadDetails.lead_id == Lead.id)
+            .join(User, Lead.assigned_to == User.id)
+            .outerjoin(SiteVisit, SiteVisit.lead_id == Lead.id)
+            .outerjoin(Project, Project.id == SiteVisit.project_id)
+            .filter(*created_in_range, LeadDetails.stage.in_(["warm", "hot", "svs"]))
+        )
+
+    if report_type == "sitevisits":
+        # Visit dates are instants; the range is IST days (ix_site_visits_date)
+        visit_lo, visit_hi = days_range(start_date, end_date)
+        return (
+            db.query(
+                SiteVisit.date.label("Visit Date"),
+                User.phone.label("Telecaller"),
+                Lead.name.label("Lead Name"),
+                Lead.phone.label("Lead Phone"),
+                Project.name.label("Project Name"),
+                Project.location.label("Project Location"),
+                Project.property_type.label("Property Type"),
+                Project.budget_range.label("Budget"),
+            )
+            .select_from(SiteVisit)
+            .join(Lead, SiteVisit.lead_id == Lead.id)
+            .join(User, Lead.assigned_to == User.id)
+            .join(Project, SiteVisit.project_id == Project.id)
+            .filter(SiteVisit.date >= visit_lo, SiteVisit.date < visit_hi)
+        )
+
+    raise HTTPException(status_code=400, detail="Invalid report type")
+
+
+# Columns holding naive-UTC instants, written out as IST wall time
+IST_COLUMNS = {"Visit Date"}
+
+
+def report_rows(query: Query) -> Tuple[List[str], Iterator[Sequence[Any]]]:
+    """(header, rows) with rows fetched FETCH_SIZE at a time from a server-side cursor."""
+    header = [c["name"] for c in query.column_descriptions]
+    rows = iter(query.yield_per(FETCH_SIZE))
+    convert = [i for i, name in enumerate(header) if name in IST_COLUMNS]
+    if not convert:
+        return header, rows
+
+    def in_ist():
+        for row in rows:
+            row = list(row)
+            for i in convert:
+                row[i] = to_ist(row[i])
+            yield row
+
+    return header, in_ist()
+
+
+def iter_csv(header: List[str], rows: Iterator[Sequence[Any]]) -> Iterator[bytes]:
+    """Encode rows as CSV, one chunk of FETCH_SIZE rows per yield."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    n = 0
+    for row in rows:
+        writer.writerow(["" if v is None else v for v in row])
+        n += 1
+        if n % FETCH_SIZE == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def write_csv(header: List[str], rows: Iterator[Sequence[Any]], path) -> int:
+    """Write rows to `path`; returns the row count."""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with open(path, "wb") as f:
+        for chunk in iter_csv(header, counted()):
+            f.write(chunk)
+    return count
+
+
+def write_xlsx(header: List[str], rows: Iterator[Sequence[Any]], path) -> int:
+    """Write rows to `path`; returns the row count."""
+    # write_only keeps only the current row in memory; cells go to a temp file
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(header)
+    count = 0
+    for row in rows:
+        ws.append(list(row))
+        count += 1
+    wb.save(path)
+    return count
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx}
+
+
+def iter_file(path, chunk_size: int = 1 << 20, remove: bool = False) -> Iterator[bytes]:
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            os.unlink(path)
+
+
+def stream_report(session_factory, report_type: str, start_date: date, end_date: date, fmt: str) -> Iterator[bytes]:
+    """Response body generator; owns its session since it outlives the request's."""
+    db = session_factory()
+    try:
+        header, rows = report_rows(report_query(db, report_type, start_date, end_date))
+        if fmt == "csv":
+            yield from iter_csv(header, rows)
+            return
+        # A zip can't be sent before it is finished: build it on disk, then stream
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            write_xlsx(header, rows, path)
+        except BaseException:
+            os.unlink(path)
+            raise
+        db.close()
+        yield from iter_file(path, remove=True)
+    finally:
+        db.close()
@@ -2,58 +2,49 @@ from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Request
 from sqlalchemy.orm import Session, joinedload
 from database import SessionLocal
 from pydantic import BaseModel
-from models import User, Lead, Project, SiteVisit, ProjectInfo, LeadDetails, Attendance, LiveLocation, Callback
-from schemas import LoginRequest, ManagerCreate, ManagerUpdate, LeadFormData, SVSData, CallOutcome, AttendanceIn, LiveLocationIn, CallbackIn, CallbackUpdate, SVSUpdate
+from models import User, Lead, Project, SiteVisit, ProjectInfo, LeadDetails, Attendance, Callback, ImportJob, LeadBatch, ReportArtifact, Upload
+from schemas import LoginRequest, ManagerCreate, ManagerUpdate, LeadFormData, SVSData, CallOutcome, AttendanceIn, LiveLocationIn, CallbackIn, CallbackUpdate, SVSUpdate, ReportRequest
 from auth import verify_password
-import openpyxl
-from io import BytesIO
-from sqlalchemy import func, and_
-from datetime import date, datetime, timezone, timedelta
+from lead_import import lead_import_job, sheet_row_estimate
+from project_import import project_import_job
+from jobs import save_upload, submit_job, serialize_job
+from lead_assign import assign_mode, plan_allocation, apply_allocation
+from lead_state import record_lead_details
+from pagination import paginate
+from dashboard_stats import get_stats, invalidate_stats
+from reports import REPORT_TYPES, FORMATS as REPORT_FORMATS, parse_range, stream_report
+from versions import bump_version
+from etags import conditional_json
+from project_catalog import catalog
+from project_match import preferences, queue_preferences, matching_project_ids, apply_project_features
+from project_rank import rank_projects, rank_leads
+from report_cache import find_ready, request_report, evict_reports, touch, serialize_artifact
+from lead_search import lead_text_filter, search_leads, DEFAULT_BUDGET_MS
+from location_ingest import location_buffer
+import location_history
+from location_latest import latest_positions, STALE_AFTER
+from geo import valid_point
+from site_visits import NO_VISIT_DATE, parse_visit_date
+from uploads import ALLOWED_MIME, check_size, serialize_upload, store_stream
+from blob_store import blob_url, in_store, incoming_path, put, release, remove_unreferenced
+import proximity
+from event_bus import announce, bus, telecaller_topic
+from callback_scheduler import callback_scheduler, overdue_events
+from sqlalchemy import func
+from datetime import datetime, timezone, timedelta
 from fastapi.responses import RedirectResponse
-from fastapi.responses import StreamingResponse
-import pandas as pd
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
 from sqlalchemy.exc import IntegrityError
 from datetime import date as date_cls
 from fastapi import UploadFile, File, Form
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
 import mimetypes, uuid, json, os
 
 
 
-def serialize_project(p: Project, info: Optional[ProjectInfo]) -> dict:
-    types_list = (info.types_of_inventory.split(",") if info and info.types_of_inventory else [])
-    try:
-        carpet = json.loads(info.carpet_area_json) if (info and info.carpet_area_json) else {}
-    except Exception:
-        carpet = {}
-
-    return {
-        "id": p.id,
-        "name": p.name,
-        "location": p.location,
-        "property_type": p.property_type,
-        "budget_range": p.budget_range,
-        "description": p.description,
-        "info": {
-            "developer_name": info.developer_name if info else "",
-            "experience": info.experience if info else "",
-            "completed_projects": info.completed_projects if info else "",
-            "landmark": info.landmark if info else "",
-            "possession_type": info.possession_type if info else "",
-            "total_land": info.total_land if info else "",
-            "total_towers": info.total_towers if info else "",
-            "number_of_floors": info.number_of_floors if info else "",
-            "construction_technology": info.construction_technology if info else "",
-            "number_of_amenities": info.number_of_amenities if info else "",
-            "types_of_inventory": types_list,
-            "carpet_area": carpet,
-            "flats_per_floor": info.flats_per_floor if info else "",
-            "lifts": info.lifts if info else "",
-        },
-    }
-
-
 router = APIRouter()
 
 
@@ -131,15 +122,24 @@ def telecaller_dashboard():
 
 # --- Telecaller flows ---
 @router.get("/telecaller/leads/{telecaller_id}")
-def get_fresh_leads(telecaller_id: int, db: Session = Depends(get_db)):
-    leads = db.query(Lead).filter(Lead.assigned_to == telecaller_id, Lead.status == "fresh").all()
-    return [{"id": l.id, "name": l.name, "phone": l.phone} for l in leads]
+def get_fresh_leads(
+    telecaller_id: int,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,       # set (or pass cursor) for a {"items", "next_cursor"} page
+    with_total: bool = False,
+    db: Session = Depends(get_db),
+):
+    q = db.query(Lead).filter(Lead.assigned_to == telecaller_id, Lead.status == "fresh")
+    return paginate(
+        q, [(Lead.id, False)],
+        lambda l: {"id": l.id, "name": l.name, "phone": l.phone},
+        cursor, limit, with_total,
+    )
 
 
 @router.post("/telecaller/save-lead")
 def save_lead(data: LeadFormData, db: Session = Depends(get_db)):
-    lead_detail = LeadDetails(**data.dict())
-    db.add(lead_detail)
+    record_lead_details(db, LeadDetails(**data.dict()))
 
     lead = db.query(Lead).filter(Lead.id == data.lead_id).first()
     if lead:
@@ -150,41 +150,89 @@ def save_lead(data: LeadFormData, db: Session = Depends(get_db)):
 
 
 @router.get("/projects/suggestions/{lead_id}")
-def suggest_projects(lead_id: int, db: Session = Depends(get_db)):
-    # 1) Pull lead preferences
-    ld = db.query(LeadDetails).filter(LeadDetails.lead_id == lead_id).first()
+def suggest_projects(lead_id: int, k: int = 20, strict: bool = False, db: Session = Depends(get_db)):
+    """
+    Projects ranked for the lead (see project_rank.py), best first, with a
+    per-feature breakdown in `scores`. strict=true keeps only projects that
+    overlap the lead's budget / BHK / location (project_match.py).
+    """
+    # 1) Latest stated preferences (budget / BHK parsed on write)
+    ld = preferences(db, lead_id)
+    if not ld:
+        return {"lead_id": lead_id, "projects": catalog.all(db), "scores": []}
 
-    # 2) All projects + info
-    rows = db.query(Project, ProjectInfo).outerjoin(ProjectInfo, ProjectInfo.project_id == Project.id).all()
+    # 2) Rank the catalog (or only the hard matches)
+    only_ids = matching_project_ids(db, ld) if strict else None
+    ranked = rank_projects(db, ld, max(1, min(k, 200)), only_ids)
 
-    # 3) Optional filtering using lead’s preferences
-    def matches(p: Project):
-        ok = True
-        if ld and ld.location_preference:
-            ok = ok and (ld.location_preference.lower() in (p.location or "").lower())
-        if ld and ld.looking_for:
-            ok = ok and (ld.looking_for.lower() in (p.property_type or "").lower())
-        if ld and ld.budget:
-            ok = ok and (ld.budget.lower() in (p.budget_range or "").lower())
-        return ok
+    return {
+        "lead_id": lead_id,
+        "projects": [r["project"] for r in ranked],
+        "scores": [{"project_id": r["project"]["id"], "score": r["score"], "breakdown": r["breakdown"]} for r in ranked],
+    }
 
-    filtered = [serialize_project(p, info) for (p, info) in rows if matches(p)]
-    if not filtered:
-        filtered = [serialize_project(p, info) for (p, info) in rows]
 
-    return {"lead_id": lead_id, "projects": filtered}
+@router.get("/telecaller/suggestions/{telecaller_id}")
+def suggest_projects_for_queue(telecaller_id: int, k: int = 5, db: Session = Depends(get_db)):
+    """Top-k projects for every lead assigned to the telecaller, scored in one batch."""
+    ranked = rank_leads(db, queue_preferences(db, telecaller_id), max(1, min(k, 50)))
+    return {
+        "telecaller_id": telecaller_id,
+        "leads": [
+            {
+                "lead_id": lead_id,
+                "projects": [
+                    {
+                        "project_id": r["project"]["id"],
+                        "name": r["project"]["name"],
+                        "location": r["project"]["location"],
+                        "budget_range": r["project"]["budget_range"],
+                        "score": r["score"],
+                        "breakdown": r["breakdown"],
+                    }
+                    for r in rows
+                ],
+            }
+            for lead_id, rows in ranked.items()
+        ],
+    }
 
 
 # --- Site Visit Scheduling ---
 
 @router.post("/sitevisit")
 def schedule_site_visit(data: SVSData, db: Session = Depends(get_db)):
-    # Parse to real date to match DATE column and enable date filters
-    db.add(SiteVisit(**data.dict()))
+    svs = SiteVisit(**{**data.dict(), "date": _visit_date(data.date)})
+    db.add(svs)
+    db.flush()
+    _announce_site_visit(db, svs, "scheduled")
+    bump_version(db, "site_visits")
     db.commit()
+    invalidate_stats()
     return {"msg": "SVS scheduled"}
 
 
+def _visit_date(value: str) -> datetime:
+    visit_at = parse_visit_date(value)
+    if visit_at is None:
+        raise HTTPException(status_code=400, detail="Visit date must be YYYY-MM-DD or an ISO date-time")
+    return visit_at
+
+
+def _announce_site_visit(db: Session, svs: SiteVisit, action: str) -> None:
+    """Tell the lead's telecaller (event stream) about a scheduled or edited visit."""
+    telecaller_id = db.query(Lead.assigned_to).filter(Lead.id == svs.lead_id).scalar()
+    if telecaller_id:
+        announce(db, telecaller_topic(telecaller_id), "site_visit", {
+            "action": action,
+            "svs_id": svs.id,
+            "lead_id": svs.lead_id,
+            "project_id": svs.project_id,
+            "date": _iso_utc(svs.date),
+            "notes": svs.notes or "",
+        })
+
+
 # --- Call Outcome (Connected / Not Connected) ---
 
 @router.post("/telecaller/call-outcome")
@@ -207,7 +255,6 @@ def call_outcome(data: CallOutcome, db: Session = Depends(get_db)):
             remarks="call connected",
             stage="connected",
         )
-        db.add(details)
     else:
         details = LeadDetails(
             lead_id=lead.id,
@@ -221,17 +268,16 @@ def call_outcome(data: CallOutcome, db: Session = Depends(get_db)):
             remarks=(data.reason or "no reason"),
             stage="not_connected",
         )
-        db.add(details)
 
+    record_lead_details(db, details)
     db.commit()
     return {"message": "Outcome recorded"}
 
 
 # --- Project listing (keep a single `/projects`) ---
 @router.get("/projects")
-def list_projects_full(db: Session = Depends(get_db)):
-    rows = db.query(Project, ProjectInfo).outerjoin(ProjectInfo, ProjectInfo.project_id == Project.id).all()
-    return [serialize_project(p, info) for p, info in rows]
+def list_projects_full(request: Request, db: Session = Depends(get_db)):
+    return conditional_json(request, db, ["projects"], (), lambda: catalog.all(db))
 
 
 # --- Admin: Managers CRUD ---
@@ -244,7 +290,9 @@ def list_managers(db: Session = Depends(get_db)):
 def create_manager(data: ManagerCreate, db: Session = Depends(get_db)):
     manager = User(**data.dict(), role="manager")
     db.add(manager)
+    bump_version(db, "users")
     db.commit()
+    invalidate_stats()
     db.refresh(manager)
     return manager
 
@@ -256,7 +304,9 @@ def update_manager(manager_id: int, update: ManagerUpdate, db: Session = Depends
         raise HTTPException(status_code=404, detail="Manager not found")
     for key, value in update.dict().items():
         setattr(mgr, key, value)
+    bump_version(db, "users")
     db.commit()
+    invalidate_stats()
     return mgr
 
 
@@ -266,89 +316,88 @@ def delete_manager(manager_id: int, db: Session = Depends(get_db)):
     if not mgr:
         raise HTTPException(status_code=404, detail="Manager not found")
     db.delete(mgr)
+    bump_version(db, "users")
     db.commit()
+    invalidate_stats()
     return {"message": "Manager deleted"}
 
 
 # --- Admin: Lead upload & assignment ---
-@router.post("/admin/upload-leads")
-def upload_leads(file: UploadFile = File(...), auto_assign: bool = Form(False), db: Session = Depends(get_db)):
+def _save_workbook(file: UploadFile) -> Tuple[Path, Optional[int]]:
+    """Spool an uploaded .xlsx to JOB_ROOT and open it once; (path, row estimate).
+
+    A file that is not a readable workbook is removed again and answered 400
+    before anything else (batch row, job) is created for it.
+    """
     if not file.filename.endswith(".xlsx"):
         raise HTTPException(status_code=400, detail="Only .xlsx files supported")
+    path = save_upload(file.file)
+    try:
+        return path, sheet_row_estimate(path)
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail="Could not read the file as an .xlsx workbook")
 
-    contents = file.file.read()
-    wb = openpyxl.load_workbook(filename=BytesIO(contents))
-    ws = wb.active
-
-    batch_id = str(uuid.uuid4())[:8]  # short batch ID
-    rows = list(ws.iter_rows(min_row=2, values_only=True))  # skip header
-
-    count = 0
-    added_leads = []
-
-    for row in rows:
-        if not row or not row[0] or not row[1]:
-            continue
-
-        name, phone = row
-        phone_str = str(phone).strip()
-        if phone_str.endswith(".0"):
-            phone_str = phone_str[:-2]
-
-        lead = Lead(
-            name=str(name).strip(),
-            phone=phone_str,
-            status="fresh",
-            assigned_to=None,
-        )
-        db.add(lead)
-        db.commit()
-        db.refresh(lead)
-        added_leads.append(lead)
-
-        details = LeadDetails(
-            lead_id=lead.id,
-            looking_for="",
-            budget="",
-            location_preference="",
-            possession_time="",
-            work_location="",
-            spouse_work_location="",
-            current_residence="",
-            remarks=batch_id,
-            stage="fresh",
-        )
-        db.add(details)
-        db.commit()
-
-        count += 1
 
-    return_data = {"message": f"{count} leads uploaded", "batch_id": batch_id}
+@router.post("/admin/upload-leads")
+def upload_leads(file: UploadFile = File(...), auto_assign: bool = Form(False), db: Session = Depends(get_db)):
+    path, total_rows = _save_workbook(file)
 
-    if auto_assign:
-        managers = db.query(User).filter(User.role == "manager").all()
-        if not managers:
-            raise HTTPException(status_code=400, detail="No managers available")
+    batch_id = str(uuid.uuid4())[:8]  # short batch ID
+    db.add(LeadBatch(id=batch_id, filename=file.filename))
+    db.commit()
 
-        if len(added_leads) < len(managers):
-            return {
-                "message": f"{len(added_leads)} leads uploaded. Auto-assignment skipped due to fewer leads.",
-                "batch_id": batch_id,
-            }
+    job = submit_job(
+        db, "leads", file.filename, path, lead_import_job,
+        total_rows=total_rows, batch_id=batch_id, auto_assign=auto_assign,
+    )
+    return {"message": "Upload queued", "job_id": job.id, "batch_id": batch_id}
 
-        for i, lead in enumerate(added_leads):
-            lead.assigned_to = managers[i % len(managers)].id
 
-        db.commit()
-        return_data["message"] += " and auto-assigned to managers"
+@router.get("/admin/users")
+def get_users_by_role(role: str, request: Request, db: Session = Depends(get_db)):
+    def build():
+        users = db.query(User).filter(User.role == role).all()
+        return [{"id": user.id, "phone": user.phone} for user in users]
 
-    return return_data
+    return conditional_json(request, db, ["users"], (role,), build)
 
 
-@router.get("/admin/users")
-def get_users_by_role(role: str, db: Session = Depends(get_db)):
-    users = db.query(User).filter(User.role == role).all()
-    return [{"id": user.id, "phone": user.phone} for user in users]
+def _batch_stats(db: Session, batch_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    # count(assigned_to) skips NULLs; both aggregates come from ix_leads_batch_assigned
+    rows = (
+        db.query(Lead.batch_id, func.count(), func.count(Lead.assigned_to))
+        .filter(Lead.batch_id.in_(batch_ids))
+        .group_by(Lead.batch_id)
+        .all()
+    )
+    stats = {bid: {"total": 0, "assigned": 0, "unassigned": 0} for bid in batch_ids}
+    for bid, total, assigned in rows:
+        stats[bid] = {"total": total, "assigned": assigned, "unassigned": total - assigned}
+    return stats
+
+
+@router.get("/admin/batches")
+def list_batches(limit: int = 50, db: Session = Depends(get_db)):
+    batches = db.query(LeadBatch).order_by(LeadBatch.created_at.desc()).limit(limit).all()
+    stats = _batch_stats(db, [b.id for b in batches])
+    return [
+        {"batch_id": b.id, "filename": b.filename, "created_at": _iso_utc(b.created_at), **stats[b.id]}
+        for b in batches
+    ]
+
+
+@router.get("/admin/batches/{batch_id}")
+def get_batch(batch_id: str, db: Session = Depends(get_db)):
+    batch = db.query(LeadBatch).filter(LeadBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {
+        "batch_id": batch.id,
+        "filename": batch.filename,
+        "created_at": _iso_utc(batch.created_at),
+        **_batch_stats(db, [batch.id])[batch.id],
+    }
 
 
 @router.post("/admin/assign-leads")
@@ -356,99 +405,58 @@ def assign_leads(request: dict, db: Session = Depends(get_db)):
     batch_id = request.get("batch_id")
     role = request.get("role")  # kept for compatibility if UI sends it, even if unused
     assignments = request.get("assignments")
+    dry_run = bool(request.get("dry_run", False))
 
     if not batch_id or not assignments:
         raise HTTPException(status_code=400, detail="Batch ID and assignments required.")
 
-    leads = (
-        db.query(Lead)
-        .join(LeadDetails)
-        .filter(LeadDetails.remarks == batch_id, Lead.assigned_to == None)
+    lead_ids = [
+        lead_id
+        for (lead_id,) in db.query(Lead.id)
+        .filter(Lead.batch_id == batch_id, Lead.assigned_to == None)
+        .order_by(Lead.id)
         .all()
-    )
-    if not leads:
+    ]
+    if not lead_ids:
         raise HTTPException(status_code=404, detail="No unassigned leads found for this batch.")
 
-    total_leads = len(leads)
-    user_counts = []
-    remainders = []
-    total_assigned = 0
-
-    # Determine assignment type
-    assign_type = "percentage" if all(a["value"] <= 100 for a in assignments) else "count"
-
-    # Calculate counts
-    for a in assignments:
-        uid = a["user_id"]
-        val = a["value"]
-
-        if assign_type == "percentage":
-            raw_count = (val / 100) * total_leads
-            count = int(raw_count)
-            remainder = raw_count - count
-        else:
-            count = int(val)
-            remainder = 0
-
-        user_counts.append({"user_id": uid, "count": count})
-        remainders.append((remainder, uid))
-        total_assigned += count
-
-    # Distribute leftovers
-    leftovers = total_leads - total_assigned
-    remainders.sort(reverse=True)
-
-    i = 0
-    while leftovers > 0 and i < len(remainders):
-        for user in user_counts:
-            if user["user_id"] == remainders[i][1]:
-                user["count"] += 1
-                leftovers -= 1
-                break
-        i += 1
-
-    # Final assignment
-    index = 0
-    for user in user_counts:
-        for _ in range(user["count"]):
-            if index < len(leads):
-                leads[index].assigned_to = user["user_id"]
-                index += 1
+    plan = plan_allocation(len(lead_ids), assignments)
+    split = [{"user_id": uid, "count": count} for uid, count in plan]
+    planned = sum(count for _, count in plan)
 
-    db.commit()
-    return {"message": f"{index} leads assigned successfully."}
+    if dry_run:
+        return {
+            "message": f"{planned} of {len(lead_ids)} leads would be assigned.",
+            "dry_run": True,
+            "mode": assign_mode(assignments),
+            "split": split,
+            "unassigned": len(lead_ids) - planned,
+        }
+
+    assigned = apply_allocation(db, batch_id, lead_ids, plan)
+    return {
+        "message": f"{assigned} leads assigned successfully.",
+        "dry_run": False,
+        "split": split,
+        "unassigned": len(lead_ids) - assigned,
+    }
 
 
 # --- Admin: Projects upload/list/get/update/create ---
 @router.post("/admin/upload-projects")
 def upload_projects(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if not file.filename.endswith(".xlsx"):
-        raise HTTPException(status_code=400, detail="Only .xlsx files supported")
+    path, total_rows = _save_workbook(file)
+    job = submit_job(db, "projects", file.filename, path, project_import_job, total_rows=total_rows)
+    return {"message": "Upload queued", "job_id": job.id}
 
-    contents = file.file.read()
-    wb = openpyxl.load_workbook(filename=BytesIO(contents))
-    ws = wb.active
-
-    rows = list(ws.iter_rows(min_row=2, values_only=True))  # skip header
-
-    count = 0
-    for row in rows:
-        if not row or not row[0]:
-            continue
-        name, location, property_type, budget_range, description = row
-        db.add(
-            Project(
-                name=str(name).strip(),
-                location=str(location).strip(),
-                property_type=str(property_type).strip(),
-                budget_range=str(budget_range).strip(),
-                description=(str(description).strip() if description else ""),
-            )
-        )
-        count += 1
 
-    db.commit()
-    return {"message": f"{count} projects uploaded successfully."}
+# --- Admin: background import jobs ---
+@router.get("/admin/jobs/{job_id}")
+def get_import_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialize_job(job)
 
 
 # Helper renamed to avoid route name collision
@@ -461,9 +469,8 @@ def _fetch_project_full(db: Session, project_id: int):
 
 
 @router.get("/admin/projects")
-def list_projects(db: Session = Depends(get_db)):
-    projects = db.query(Project).all()
-    return [{"id": p.id, "name": p.name, "location": p.location} for p in projects]
+def list_projects(request: Request, db: Session = Depends(get_db)):
+    return conditional_json(request, db, ["projects"], (), lambda: catalog.summaries(db))
 
 
 @router.get("/admin/project/{project_id}")
@@ -478,6 +485,8 @@ def get_project(project_id: int, db: Session = Depends(get_db)):
         "property_type": proj.property_type,
         "budget_range": proj.budget_range,
         "description": proj.description,
+        "lat": proj.lat,
+        "lng": proj.lng,
         "info": {
             "developer_name": info.developer_name if info else "",
             "experience": info.experience if info else "",
@@ -498,9 +507,26 @@ def get_project(project_id: int, db: Session = Depends(get_db)):
     return resp
 
 
+def _project_coords(payload: dict):
+    """(lat, lng) from a project payload; both blank clears them."""
+    lat, lng = payload.get("lat"), payload.get("lng")
+    if lat in (None, "") and lng in (None, ""):
+        return None, None
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="lat and lng must both be numbers")
+    if not valid_point(lat, lng):
+        raise HTTPException(status_code=400, detail="lat/lng out of range")
+    return lat, lng
+
+
 @router.post("/admin/project")
 def create_project(payload: dict = Body(...), db: Session = Depends(get_db)):
+    lat, lng = _project_coords(payload)
     p = Project(
+        lat=lat,
+        lng=lng,
         name=(payload.get("name", "") or "").strip(),
         location=(payload.get("location", "") or "").strip(),
         property_type=(payload.get("property_type", "") or "").strip(),
@@ -509,6 +535,7 @@ def create_project(payload: dict = Body(...), db: Session = Depends(get_db)):
     )
     db.add(p)
     db.commit()
+    invalidate_stats()
     db.refresh(p)
 
     info_dict = payload.get("info", {}) or {}
@@ -530,6 +557,9 @@ def create_project(payload: dict = Body(...), db: Session = Depends(get_db)):
         lifts=info_dict.get("lifts", ""),
     )
     db.add(pi)
+    apply_project_features(p, pi)
+    # Stamp once the project and its info are both committed
+    bump_version(db, "projects")
     db.commit()
     return {"message": "Project created", "project_id": p.id}
 
@@ -543,6 +573,8 @@ def update_project(project_id: int, payload: dict = Body(...), db: Session = Dep
     for k in ["name", "location", "property_type", "budget_range", "description"]:
         if k in payload:
             setattr(proj, k, payload.get(k) or "")
+    if "lat" in payload or "lng" in payload:
+        proj.lat, proj.lng = _project_coords(payload)
 
     info_dict = payload.get("info", {}) or {}
     if not info:
@@ -565,6 +597,8 @@ def update_project(project_id: int, payload: dict = Body(...), db: Session = Dep
     info.flats_per_floor = info_dict.get("flats_per_floor", "")
     info.lifts = info_dict.get("lifts", "")
 
+    apply_project_features(proj, info)
+    bump_version(db, "projects")
     db.commit()
     return {"message": "Project updated"}
 
@@ -572,156 +606,76 @@ def update_project(project_id: int, payload: dict = Body(...), db: Session = Dep
 # --- Public project detail route (keep name & path) ---
 @router.get("/projects/{project_id}")
 def get_project_full(project_id: int, db: Session = Depends(get_db)):
-    p = db.query(Project).filter(Project.id == project_id).first()
+    p = catalog.get(db, project_id)
     if not p:
         raise HTTPException(status_code=404, detail="Project not found")
-    info = db.query(ProjectInfo).filter(ProjectInfo.project_id == project_id).first()
-    return serialize_project(p, info)
+    return p
 
 
 # --- Admin dashboard stats ---
 @router.get("/admin/dashboard-stats")
-def get_admin_dashboard_stats(db: Session = Depends(get_db)):
-    today_str = date.today().isoformat()
-    today = date.today()
-
-    converted_today = (
-        db.query(LeadDetails)
-        .filter(func.date(LeadDetails.created_at) == today, LeadDetails.stage == "fresh")
-        .count()
-    )
-
-    total_leads = db.query(Lead).count()
-    assigned_leads = db.query(Lead).filter(Lead.assigned_to != None).count()
-
-    stages = db.query(LeadDetails.stage, func.count()).group_by(LeadDetails.stage).all()
-    stage_counts = {stage: count for stage, count in stages}
-
-    total_managers = db.query(User).filter(User.role == "manager").count()
-    total_telecallers = db.query(User).filter(User.role == "telecaller").count()
-    total_projects = db.query(Project).count()
-
-    site_visits_today = db.query(SiteVisit).filter(SiteVisit.date == today_str).count()
-
-    return {
-        "leads_uploaded_today": converted_today,
-        "total_leads": total_leads,
-        "assigned_leads": assigned_leads,
-        "stage_counts": stage_counts,
-        "managers": total_managers,
-        "telecallers": total_telecallers,
-        "projects": total_projects,
-        "site_visits_today": site_visits_today,
-    }
+def get_admin_dashboard_stats(refresh: bool = False, db: Session = Depends(get_db)):
+    """Counters for admin.html, served from dashboard_stats' TTL cache."""
+    return get_stats(db, refresh)
 
 
 # --- Reports ---
 @router.get("/admin/report/{report_type}")
-def generate_report(report_type: str, start: str, end: str, db: Session = Depends(get_db)):
-    start_date = datetime.strptime(start, "%Y-%m-%d").date()
-    end_date = datetime.strptime(end, "%Y-%m-%d").date()
-
-    if report_type == "calls":
-        query = (
-            db.query(
-                LeadDetails.created_at,
-                LeadDetails.lead_id,
-                LeadDetails.stage,
-                Lead.assigned_to,
-                User.phone.label("telecaller_phone"),
-            )
-            .select_from(LeadDetails)
-            .join(Lead, LeadDetails.lead_id == Lead.id)
-            .join(User, Lead.assigned_to == User.id)
-            .filter(func.date(LeadDetails.created_at).between(start_date, end_date))
-        )
-
-    elif report_type == "connected":
-        query = (
-            db.query(
-                Lead.name.label("Lead Name"),
-                Lead.phone.label("Phone"),
-                LeadDetails.stage,
-                User.phone.label("Telecaller"),
-                Project.name.label("Project Name"),
-                Project.location.label("Location"),
-            )
-            .join(Lead, LeadDetails.lead_id == Lead.id)
-            .join(User, Lead.assigned_to == User.id)
-            .outerjoin(Project, Project.location == LeadDetails.location_preference)
-            .filter(
-                func.date(LeadDetails.created_at).between(start_date, end_date),
-                Lead.status == "in_progress",
-            )
-        )
+def generate_report(report_type: str, start: str, end: str, format: str = "xlsx", db: Session = Depends(get_db)):
+    _validate_report(report_type, format)
+    start_date, end_date = parse_range(start, end)
 
-    elif report_type == "converted":
-        query = (
-            db.query(
-                Lead.name.label("Lead Name"),
-                Lead.phone,
-                LeadDetails.stage,
-                User.phone.label("Telecaller"),
-                Project.name.label("Project Name"),
-                SiteVisit.date.label("Visit Date"),
-            )
-            .join(Lead, LeadDetails.lead_id == Lead.id)
-            .join(User, Lead.assigned_to == User.id)
-            .outerjoin(SiteVisit, SiteVisit.lead_id == Lead.id)
-            .outerjoin(Project, Project.id == SiteVisit.project_id)
-            .filter(
-                func.date(LeadDetails.created_at).between(start_date, end_date),
-                LeadDetails.stage.in_(["warm", "hot", "svs"]),
-            )
-        )
-
-    elif report_type == "sitevisits":
-        query = (
-            db.query(
-                SiteVisit.date.label("Visit Date"),
-                User.phone.label("Telecaller"),
-                Lead.name.label("Lead Name"),
-                Lead.phone.label("Lead Phone"),
-                Project.name.label("Project Name"),
-                Project.location.label("Project Location"),
-                Project.property_type.label("Property Type"),
-                Project.budget_range.label("Budget"),
-            )
-            .select_from(SiteVisit)
-            .join(Lead, SiteVisit.lead_id == Lead.id)
-            .join(User, Lead.assigned_to == User.id)
-            .join(Project, SiteVisit.project_id == Project.id)
-            .filter(func.date(SiteVisit.date).between(start_date, end_date))
-        )
+    filename = f"{report_type}_report_{start}_{end}.{format}"
+    # A background build of this exact report and data version is on disk
+    art = find_ready(db, report_type, start_date, end_date, format)
+    if art:
+        touch(db, art)
+        return FileResponse(art.path, filename=filename, media_type=REPORT_FORMATS[format])
 
-    else:
-        raise HTTPException(status_code=400, detail="Invalid report type")
-
-    # Ensure we use a proper engine/bind
-    engine = db.get_bind()
-    df = pd.read_sql(query.statement, engine)
-    stream = BytesIO()
-    df.to_excel(stream, index=False)
-    stream.seek(0)
-
-    filename = f"{report_type}_report_{start}_{end}.xlsx"
     headers = {"Content-Disposition": f"attachment; filename={filename}"}
     return StreamingResponse(
-        stream,
+        stream_report(SessionLocal, report_type, start_date, end_date, format),
         headers=headers,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=REPORT_FORMATS[format],
     )
 
-def _parse_iso(ts: Optional[str]) -> datetime:
-    if not ts:
-        return datetime.utcnow()
-    # Handle "Z"
-    if ts.endswith("Z"):
-        ts = ts.replace("Z", "+00:00")
-    try:
-        return datetime.fromisoformat(ts)
-    except Exception:
-        return datetime.utcnow()
+def _validate_report(report_type: str, format: str) -> None:
+    if report_type not in REPORT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid report type")
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be csv or xlsx")
+
+
+@router.post("/admin/reports")
+def queue_report(body: ReportRequest, db: Session = Depends(get_db)):
+    """Build a report in the background, or return the cached build of it."""
+    _validate_report(body.report_type, body.format)
+    start_date, end_date = parse_range(body.start, body.end)
+    art = request_report(db, body.report_type, start_date, end_date, body.format)
+    job = db.get(ImportJob, art.job_id) if art.job_id else None
+    return serialize_artifact(art, job)
+
+
+@router.get("/admin/reports")
+def list_reports(db: Session = Depends(get_db)):
+    evict_reports(db)
+    rows = (
+        db.query(ReportArtifact, ImportJob)
+        .outerjoin(ImportJob, ImportJob.id == ReportArtifact.job_id)
+        .order_by(ReportArtifact.created_at.desc())
+        .all()
+    )
+    return [serialize_artifact(art, job) for art, job in rows]
+
+
+@router.get("/admin/reports/{artifact_id}/download")
+def download_report(artifact_id: int, db: Session = Depends(get_db)):
+    art = db.get(ReportArtifact, artifact_id)
+    if not art or art.evicted_at or not art.path or not Path(art.path).exists():
+        raise HTTPException(status_code=404, detail="Report not ready")
+    touch(db, art)
+    filename = f"{art.report_type}_report_{art.start}_{art.end}.{art.format}"
+    return FileResponse(art.path, filename=filename, media_type=REPORT_FORMATS[art.format])
 
 IST = timezone(timedelta(hours=5, minutes=30))
 
@@ -781,15 +735,16 @@ def mark_attendance_today(payload: AttendanceIn, db: Session = Depends(get_db)):
         total_seconds=0,
     )
     db.add(new_rec)
-    db.commit()
-    db.refresh(new_rec)
-
-    return {
+    state = {
         "status": "clocked_in",
         "in_time": _iso_utc(new_rec.in_time),
         "out_time": None,
         "worked_seconds": 0,
     }
+    # Other open dashboards of this telecaller update without polling
+    announce(db, telecaller_topic(payload.telecaller_id), "attendance", state)
+    db.commit()
+    return state
 
 @router.get("/telecaller/attendance/today/{telecaller_id}")
 def get_today_attendance(telecaller_id: int, db: Session = Depends(get_db)):
@@ -813,18 +768,165 @@ def get_today_attendance(telecaller_id: int, db: Session = Depends(get_db)):
     }
 
 @router.post("/telecaller/live-location")
-def share_live_location(payload: LiveLocationIn, db: Session = Depends(get_db)):
-    ts = _parse_iso(payload.timestamp)
-    row = LiveLocation(
-        telecaller_id=payload.telecaller_id,
-        lat=payload.lat,
-        lng=payload.lng,
-        accuracy=payload.accuracy,
-        timestamp=ts,
+def share_live_location(payload: LiveLocationIn):
+    # Buffered: written by location_ingest in multi-row batches
+    row = {
+        "telecaller_id": payload.telecaller_id,
+        "lat": payload.lat,
+        "lng": payload.lng,
+        "accuracy": payload.accuracy,
+        "timestamp": _parse_iso_to_naive_utc(payload.timestamp),
+    }
+    if not location_buffer.offer(row):
+        raise HTTPException(status_code=503, detail="Location queue full, retry shortly", headers={"Retry-After": "2"})
+    latest_positions.apply(row)
+    return {"status": "ok", "logged_at": row["timestamp"].isoformat()}
+
+
+@router.get("/admin/live-location/metrics")
+def live_location_metrics():
+    return {**location_buffer.metrics(), "maintenance": location_history.last_run or None}
+
+
+@router.get("/manager/locations/latest")
+def latest_locations(request: Request, db: Session = Depends(get_db)):
+    """Last known position of every telecaller, with staleness flags."""
+    if request.session.get("role") not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="Managers only")
+    latest_positions.sync(db)
+    positions = latest_positions.snapshot()
+    now = datetime.utcnow()
+    agents = []
+    for user_id, phone in db.query(User.id, User.phone).filter(User.role == "telecaller").order_by(User.id):
+        pos = positions.get(user_id)
+        age = (now - pos.timestamp).total_seconds() if pos else None
+        agents.append({
+            "telecaller_id": user_id,
+            "phone": phone,
+            "lat": pos.lat if pos else None,
+            "lng": pos.lng if pos else None,
+            "accuracy": pos.accuracy if pos else None,
+            "timestamp": _iso_utc(pos.timestamp) if pos else None,
+            "age_seconds": int(age) if age is not None else None,
+            "stale": pos is None or age > STALE_AFTER.total_seconds(),
+        })
+    return {
+        "generated_at": _iso_utc(now),
+        "stale_after_seconds": int(STALE_AFTER.total_seconds()),
+        "agents": agents,
+    }
+
+
+# --- Proximity (geo.py grid over projects / last-known positions) ---
+def _geo_args(lat: float, lng: float, radius_km: Optional[float], k: Optional[int]) -> None:
+    if not valid_point(lat, lng):
+        raise HTTPException(status_code=400, detail="lat/lng out of range")
+    if radius_km is not None and not 0 < radius_km <= 200:
+        raise HTTPException(status_code=400, detail="radius_km must be in (0, 200]")
+    if k is not None and not 1 <= k <= 200:
+        raise HTTPException(status_code=400, detail="k must be 1..200")
+
+
+def _near_projects(db: Session, lat: float, lng: float, radius_km: Optional[float], k: Optional[int]):
+    _geo_args(lat, lng, radius_km, k)
+    by_id = catalog.by_id(db)
+    hits = proximity.search(proximity.project_index(db), lat, lng, radius_km, k)
+    return [{"distance_km": round(d, 3), "project": by_id[pid]} for pid, d in hits if pid in by_id]
+
+
+def _near_telecallers(db: Session, lat: float, lng: float, radius_km: Optional[float], k: Optional[int],
+                      max_age_minutes: Optional[int]):
+    _geo_args(lat, lng, radius_km, k)
+    max_age = timedelta(minutes=max_age_minutes) if max_age_minutes else None
+    index, positions = proximity.telecaller_index(db, max_age)
+    hits = proximity.search(index, lat, lng, radius_km, k)
+    phones = dict(db.query(User.id, User.phone).filter(User.id.in_([tid for tid, _ in hits])).all()) if hits else {}
+    now = datetime.utcnow()
+    return [
+        {
+            "telecaller_id": tid,
+            "phone": phones.get(tid),
+            "distance_km": round(d, 3),
+            "lat": positions[tid].lat,
+            "lng": positions[tid].lng,
+            "timestamp": _iso_utc(positions[tid].timestamp),
+            "stale": (now - positions[tid].timestamp) > STALE_AFTER,
+        }
+        for tid, d in hits
+    ]
+
+
+@router.get("/geo/projects/near")
+def projects_near(lat: float, lng: float, radius_km: Optional[float] = None, k: Optional[int] = None,
+                  db: Session = Depends(get_db)):
+    """Projects within radius_km of a point, or the k nearest (default 10)."""
+    return {"lat": lat, "lng": lng, "results": _near_projects(db, lat, lng, radius_km, k)}
+
+
+@router.get("/geo/leads/{lead_id}/projects")
+def projects_near_lead(lead_id: int, radius_km: Optional[float] = None, k: Optional[int] = None,
+                       db: Session = Depends(get_db)):
+    """Projects near a lead's work location, placed via the located projects sharing that name."""
+    ld = (
+        db.query(LeadDetails)
+        .filter(LeadDetails.lead_id == lead_id, LeadDetails.work_location != "")
+        .order_by(LeadDetails.created_at.desc(), LeadDetails.id.desc())
+        .first()
     )
-    db.add(row)
-    db.commit()
-    return {"status": "ok", "logged_at": row.timestamp.isoformat()}
+    if not ld or not ld.work_location:
+        raise HTTPException(status_code=404, detail="No work location recorded for this lead")
+    point = proximity.place_point(db, ld.work_location)
+    if not point:
+        raise HTTPException(status_code=422, detail=f"Cannot place work location '{ld.work_location}'")
+    lat, lng = point
+    return {"work_location": ld.work_location, "lat": lat, "lng": lng,
+            "results": _near_projects(db, lat, lng, radius_km, k)}
+
+
+@router.get("/geo/telecallers/near")
+def telecallers_near(request: Request, lat: float, lng: float, radius_km: Optional[float] = None,
+                     k: Optional[int] = None, max_age_minutes: Optional[int] = 60, db: Session = Depends(get_db)):
+    """Telecallers whose last known position is near a point (positions older than max_age_minutes are skipped)."""
+    if request.session.get("role") not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="Managers only")
+    return {"lat": lat, "lng": lng, "results": _near_telecallers(db, lat, lng, radius_km, k, max_age_minutes)}
+
+
+@router.get("/geo/projects/{project_id}/telecallers")
+def telecallers_near_project(project_id: int, request: Request, radius_km: Optional[float] = 3.0,
+                             k: Optional[int] = None, max_age_minutes: Optional[int] = 60,
+                             db: Session = Depends(get_db)):
+    """Field telecallers within radius_km (default 3) of a project site."""
+    if request.session.get("role") not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="Managers only")
+    p = catalog.get(db, project_id)
+    if not p:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if p["lat"] is None or p["lng"] is None:
+        raise HTTPException(status_code=422, detail="Project has no coordinates")
+    return {"project_id": project_id, "lat": p["lat"], "lng": p["lng"],
+            "results": _near_telecallers(db, p["lat"], p["lng"], radius_km, k, max_age_minutes)}
+
+
+@router.get("/manager/locations/{telecaller_id}/trail")
+def location_trail(telecaller_id: int, request: Request, day: Optional[str] = None, db: Session = Depends(get_db)):
+    """One IST day of a telecaller's pings (per-minute points once raw pings have expired)."""
+    if request.session.get("role") not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="Managers only")
+    try:
+        d = datetime.strptime(day, "%Y-%m-%d").date() if day else location_history.ist_today()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="day must be YYYY-MM-DD")
+    resolution, points = location_history.trail_points(db, telecaller_id, d)
+    return {
+        "telecaller_id": telecaller_id,
+        "day": d.isoformat(),
+        "resolution": resolution,
+        "points": [
+            {"timestamp": _iso_utc(ts), "lat": lat, "lng": lng, "accuracy": acc}
+            for ts, lat, lng, acc in points
+        ],
+    }
 
 
 # --- Create / schedule a callback ---
@@ -841,7 +943,7 @@ def create_callback(payload: CallbackIn, db: Session = Depends(get_db)):
     db.add(row)
 
     # Optional: log stage in LeadDetails for audit
-    db.add(LeadDetails(
+    record_lead_details(db, LeadDetails(
         lead_id=payload.lead_id, stage="callback",
         remarks=f"callback: {payload.note or ''}", looking_for="", budget="",
         location_preference="", possession_time="", work_location="",
@@ -849,6 +951,7 @@ def create_callback(payload: CallbackIn, db: Session = Depends(get_db)):
     ))
     db.commit()
     db.refresh(row)
+    callback_scheduler.schedule(row.id, row.due_at)
     return {
         "id": row.id, "lead_id": row.lead_id, "telecaller_id": row.telecaller_id,
         "due_at": _iso_utc(row.due_at), "note": row.note, "status": row.status
@@ -860,6 +963,10 @@ def list_callbacks(
     telecaller_id: int,
     scope: str = "today",          # today | overdue | upcoming | all
     status: str = "pending",       # pending | done | canceled | all
+    q: str = "",                   # lead name/phone or note search
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    with_total: bool = False,
     db: Session = Depends(get_db),
 ):
     now_utc = datetime.utcnow()
@@ -870,29 +977,34 @@ def list_callbacks(
     start_utc_naive = start_ist.astimezone(timezone.utc).replace(tzinfo=None)
     end_utc_naive   = end_ist.astimezone(timezone.utc).replace(tzinfo=None)
 
-    q = db.query(Callback, Lead).join(Lead, Lead.id == Callback.lead_id)\
+    qry = db.query(Callback, Lead).join(Lead, Lead.id == Callback.lead_id)\
          .filter(Callback.telecaller_id == telecaller_id)
 
     if status != "all":
-        q = q.filter(Callback.status == status)
+        qry = qry.filter(Callback.status == status)
 
     if scope == "today":
-        q = q.filter(Callback.due_at >= start_utc_naive, Callback.due_at <= end_utc_naive)
+        qry = qry.filter(Callback.due_at >= start_utc_naive, Callback.due_at <= end_utc_naive)
     elif scope == "overdue":
-        q = q.filter(Callback.due_at < start_utc_naive, Callback.status == "pending")
+        qry = qry.filter(Callback.due_at < start_utc_naive, Callback.status == "pending")
     elif scope == "upcoming":
-        q = q.filter(Callback.due_at > end_utc_naive, Callback.status == "pending")
+        qry = qry.filter(Callback.due_at > end_utc_naive, Callback.status == "pending")
     # else "all": no extra filter
 
-    rows = q.order_by(Callback.due_at.asc()).all()
-    out = []
-    for cb, lead in rows:
-        out.append({
+    if q:
+        like = f"%{q.strip()}%"
+        qry = qry.filter(lead_text_filter(db, q.strip(), telecaller_id) | Callback.note.ilike(like))
+
+    def serialize(row):
+        cb, lead = row
+        return {
             "id": cb.id, "lead_id": cb.lead_id, "telecaller_id": cb.telecaller_id,
             "due_at": _iso_utc(cb.due_at), "note": cb.note, "status": cb.status,
             "lead_name": lead.name, "lead_phone": lead.phone
-        })
-    return out
+        }
+
+    keys = [(Callback.due_at, False), (Callback.id, False)]
+    return paginate(qry, keys, serialize, cursor, limit, with_total)
 
 # --- Reschedule / update ---
 @router.put("/telecaller/callback/{cb_id}")
@@ -909,6 +1021,7 @@ def update_callback(cb_id: int, payload: CallbackUpdate, db: Session = Depends(g
             raise HTTPException(status_code=400, detail="Invalid status")
         cb.status = payload.status
     db.commit()
+    callback_scheduler.schedule(cb.id, cb.due_at, cb.status)
     return {"ok": True}
 
 # --- Quick actions ---
@@ -919,6 +1032,7 @@ def complete_callback(cb_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Callback not found")
     cb.status = "done"
     db.commit()
+    callback_scheduler.cancel(cb_id)
     return {"ok": True}
 
 @router.delete("/telecaller/callback/{cb_id}")
@@ -928,15 +1042,89 @@ def delete_callback(cb_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Callback not found")
     db.delete(cb)
     db.commit()
+    callback_scheduler.cancel(cb_id)
     return {"ok": True}
 
 
+# --- Server-sent events (event_bus.py) ---
+SSE_KEEPALIVE = 20  # seconds between comment lines, so proxies keep the stream open
+
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+def _initial_events(telecaller_id: int) -> List[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        return overdue_events(db, telecaller_id)
+    finally:
+        db.close()
+
+
+@router.get("/events/telecaller/{telecaller_id}")
+async def telecaller_events(telecaller_id: int, request: Request):
+    """
+    Push stream for one telecaller. Event types:
+      - lead_assigned   {batch_id, count}: new leads in the telecaller's queue
+      - callback_due    reminder_payload(): a callback fell due (overdue ones on connect)
+      - attendance      same shape as /telecaller/attendance/today
+      - site_visit      {action, svs_id, lead_id, project_id, date, notes}
+      - resync          the client missed events it can't be sent; refetch
+    A reconnecting EventSource sends Last-Event-ID and gets the events it missed.
+    """
+    role = request.session.get("role")
+    if role not in ("admin", "manager") and request.session.get("user_id") != telecaller_id:
+        raise HTTPException(status_code=403, detail="Not your event stream")
+
+    topic = telecaller_topic(telecaller_id)
+    last_id = request.headers.get("last-event-id")
+
+    async def stream():
+        sub = bus.subscribe(topic)
+        try:
+            # Replayed events are those up to sub.start_id; everything after it
+            # arrives through the queue. Overdue reminders are rebuilt on every
+            # connect and carry sub.start_id, so ids only ever increase and
+            # resuming from any of them loses nothing
+            missed = bus.since(topic, last_id) if last_id else []
+            overdue = await run_in_threadpool(_initial_events, telecaller_id)
+            yield "retry: 5000\n\n"
+            if missed is None:
+                yield "event: resync\ndata: {}\n\n"
+            for event in missed or ():
+                if event["seq"] <= sub.start_seq:
+                    yield _sse(event)
+            for data in overdue:
+                yield f"id: {sub.start_id}\nevent: callback_due\ndata: {json.dumps(data)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["seq"] > sub.start_seq:
+                    yield _sse(event)
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # --- SVS Leads: list & update ---
 
 @router.get("/telecaller/svs-leads/{telecaller_id}")
 def list_svs_leads(
     telecaller_id: int,
     scope: str = "upcoming",           # upcoming | past | all | today
+    q: str = "",                       # lead name/phone, project name/location or notes
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    with_total: bool = False,
     db: Session = Depends(get_db),
 ):
     """
@@ -944,39 +1132,47 @@ def list_svs_leads(
     including project info and comments (notes).
     """
     # Base join: only leads assigned to this telecaller
-    q = (
-        db.query(SiteVisit, Lead, Project, ProjectInfo)
+    qry = (
+        db.query(SiteVisit, Lead)
         .join(Lead, SiteVisit.lead_id == Lead.id)
-        .outerjoin(Project, SiteVisit.project_id == Project.id)
-        .outerjoin(ProjectInfo, ProjectInfo.project_id == Project.id)
+        .outerjoin(Project, SiteVisit.project_id == Project.id)  # for the q filter
         .filter(Lead.assigned_to == telecaller_id)
     )
 
-    # Date windowing (string dates OK if ISO; func.date works on TEXT in many DBs)
-    today = date.today().isoformat()
+    # Date windowing: ranges over the IST day, on ix_site_visits_lead_date
+    day_start, day_end = location_history.day_bounds(location_history.ist_today())
     if scope == "upcoming":
-        q = q.filter(func.date(SiteVisit.date) >= today)
+        qry = qry.filter(SiteVisit.date >= day_start)
     elif scope == "past":
-        q = q.filter(func.date(SiteVisit.date) < today)
+        qry = qry.filter(SiteVisit.date < day_start)
     elif scope == "today":
-        q = q.filter(func.date(SiteVisit.date) == today)
+        qry = qry.filter(SiteVisit.date >= day_start, SiteVisit.date < day_end)
     # else "all" => no extra filter
 
-    rows = q.order_by(SiteVisit.date.asc()).all()
-    out = []
-    for svs, lead, proj, pinfo in rows:
-        out.append({
+    if q:
+        like = f"%{q.strip()}%"
+        qry = qry.filter(
+            Lead.name.ilike(like) | Lead.phone.ilike(like) | Project.name.ilike(like)
+            | Project.location.ilike(like) | SiteVisit.notes.ilike(like)
+        )
+
+    projects = catalog.by_id(db)
+
+    def serialize(row):
+        svs, lead = row
+        return {
             "svs_id": svs.id,
             "lead_id": lead.id,
             "lead_name": lead.name,
             "lead_phone": lead.phone,
-            "date": svs.date,                 # whatever you stored (ISO string recommended)
+            "date": _iso_utc(svs.date),
             "notes": svs.notes or "",
-            "project": (
-                serialize_project(proj, pinfo) if proj else None
-            ),
-        })
-    return out
+            "project": projects.get(svs.project_id),
+        }
+
+    # Visits whose legacy date couldn't be parsed sort first instead of breaking the cursor
+    keys = [(func.coalesce(SiteVisit.date, NO_VISIT_DATE), False), (SiteVisit.id, False)]
+    return paginate(qry, keys, serialize, cursor, limit, with_total)
 
 @router.put("/sitevisit/{svs_id}")
 def update_site_visit(svs_id: int, payload: SVSUpdate, db: Session = Depends(get_db)):
@@ -984,12 +1180,15 @@ def update_site_visit(svs_id: int, payload: SVSUpdate, db: Session = Depends(get
     if not svs:
       raise HTTPException(status_code=404, detail="Site visit not found")
     if payload.date is not None:
-      svs.date = payload.date
+      svs.date = _visit_date(payload.date)
     if payload.notes is not None:
       svs.notes = payload.notes
     if payload.project_id is not None:
       svs.project_id = payload.project_id
+    _announce_site_visit(db, svs, "updated")
+    bump_version(db, "site_visits")
     db.commit()
+    invalidate_stats()
     return {"ok": True}
 
 # --- My Leads (assigned to telecaller, excluding 'fresh') ---
@@ -1000,87 +1199,89 @@ def telecaller_my_leads(
     stage: str = "",              # e.g. "connected" or "warm,hot"
     q: str = "",                  # name/phone search
     sort: str = "recent",         # recent | oldest | name | stage
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    with_total: bool = False,
     db: Session = Depends(get_db),
 ):
     """
     Returns each lead assigned to telecaller with their *latest* stage
-    (from LeadDetails). Excludes leads whose latest stage is 'fresh'.
+    (Lead.current_stage, kept in step with LeadDetails). Excludes leads
+    whose latest stage is 'fresh'.
     Supports:
       - stage filter (comma separated)
       - q search (name/phone)
       - sort (recent|oldest|name|stage)
+      - keyset pages via limit/cursor (see pagination.py)
     """
-    # Subquery to get latest LeadDetails.created_at per lead
-    latest_sub = (
-        db.query(
-            LeadDetails.lead_id,
-            func.max(LeadDetails.created_at).label("max_ts"),
-        )
-        .group_by(LeadDetails.lead_id)
-        .subquery()
-    )
-
-    # Join to get the latest LeadDetails row per lead
+    # Current state is denormalized onto Lead (see lead_state.py); the
+    # LeadDetails join is by primary key, only for remarks
     qbase = (
         db.query(Lead, LeadDetails)
-        .join(latest_sub, Lead.id == latest_sub.c.lead_id)
-        .join(
-            LeadDetails,
-            and_(
-                LeadDetails.lead_id == latest_sub.c.lead_id,
-                LeadDetails.created_at == latest_sub.c.max_ts,
-            ),
-        )
+        .join(LeadDetails, LeadDetails.id == Lead.last_details_id)
         .filter(Lead.assigned_to == telecaller_id)
     )
 
     # Exclude 'fresh' stage
-    qbase = qbase.filter(LeadDetails.stage != "fresh")
+    qbase = qbase.filter(Lead.current_stage != "fresh")
 
     # Stage filter (comma separated)
     if stage:
         allowed = [s.strip().lower() for s in stage.split(",") if s.strip()]
         if allowed:
-            qbase = qbase.filter(func.lower(LeadDetails.stage).in_(allowed))
+            qbase = qbase.filter(func.lower(Lead.current_stage).in_(allowed))
 
-    # Search by name/phone
-    if q:
-        like = f"%{q.strip()}%"
-        qbase = qbase.filter(
-            (Lead.name.ilike(like)) | (Lead.phone.ilike(like))
-        )
+    # Search by name/phone (trigram-indexed, see lead_search.py)
+    if q and q.strip():
+        qbase = qbase.filter(lead_text_filter(db, q.strip(), telecaller_id))
 
-    # Sorting
+    # Sorting (Lead.id last so every key tuple is unique)
     if sort == "name":
-        qbase = qbase.order_by(func.lower(Lead.name).asc())
+        keys = [(func.lower(func.coalesce(Lead.name, "")), False), (Lead.id, False)]
     elif sort == "stage":
-        qbase = qbase.order_by(func.lower(LeadDetails.stage).asc(), LeadDetails.created_at.desc())
+        keys = [(func.lower(func.coalesce(Lead.current_stage, "")), False), (Lead.last_update, True), (Lead.id, True)]
     elif sort == "oldest":
-        qbase = qbase.order_by(LeadDetails.created_at.asc())
+        keys = [(Lead.last_update, False), (Lead.id, False)]
     else:  # recent (default)
-        qbase = qbase.order_by(LeadDetails.created_at.desc())
+        keys = [(Lead.last_update, True), (Lead.id, True)]
 
-    rows = qbase.all()
-
-    out = []
-    for lead, ld in rows:
-        out.append({
+    def serialize(row):
+        lead, ld = row
+        return {
             "id": lead.id,
             "name": lead.name,
             "phone": lead.phone,
-            "current_stage": ld.stage,
-            "last_update": _iso_utc(ld.created_at),
+            "current_stage": lead.current_stage,
+            "last_update": _iso_utc(lead.last_update),
             "remarks": ld.remarks or "",
-        })
-    return out
+        }
+
+    return paginate(qbase, keys, serialize, cursor, limit, with_total)
+
+# --- Global lead search (managers/admin) ---
+@router.get("/leads/search")
+def lead_search(
+    request: Request,
+    q: str,
+    limit: int = 20,
+    assigned_to: Optional[int] = None,
+    budget_ms: int = DEFAULT_BUDGET_MS,
+    db: Session = Depends(get_db),
+):
+    """Ranked name/phone substring search across all leads."""
+    if request.session.get("role") not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="Managers only")
+    if len(q.strip()) < 2:
+        raise HTTPException(status_code=400, detail="Query must be at least 2 characters")
+    return search_leads(db, q, max(1, min(limit, 100)), assigned_to, max(10, min(budget_ms, 2000)))
 
 # --- Latest Lead Details for a lead ---
 @router.get("/lead/{lead_id}/last-details")
 def get_last_lead_details(lead_id: int, db: Session = Depends(get_db)):
     ld = (
         db.query(LeadDetails)
-        .filter(LeadDetails.lead_id == lead_id)
-        .order_by(LeadDetails.created_at.desc())
+        .join(Lead, Lead.last_details_id == LeadDetails.id)
+        .filter(Lead.id == lead_id)
         .first()
     )
     if not ld:
@@ -1104,37 +1305,6 @@ def get_last_lead_details(lead_id: int, db: Session = Depends(get_db)):
 
 # ========= Uploads (Documents / Location Selfies) =========
 
-UPLOAD_ROOT = Path("static/uploads")
-INDEX_ROOT  = UPLOAD_ROOT / "_index"
-ALLOWED_MIME = {
-    "image/jpeg": ".jpg",
-    "image/png": ".png",
-    "image/webp": ".webp",
-    "application/pdf": ".pdf",
-}
-
-def _utc_now_z() -> str:
-    return datetime.utcnow().replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
-
-def _tele_index_path(telecaller_id: int) -> Path:
-    INDEX_ROOT.mkdir(parents=True, exist_ok=True)
-    return INDEX_ROOT / f"telecaller_{telecaller_id}.json"
-
-def _load_index(telecaller_id: int) -> List[Dict[str, Any]]:
-    p = _tele_index_path(telecaller_id)
-    if not p.exists():
-        return []
-    try:
-        return json.loads(p.read_text(encoding="utf-8")) or []
-    except Exception:
-        return []
-
-def _save_index(telecaller_id: int, items: List[Dict[str, Any]]) -> None:
-    p = _tele_index_path(telecaller_id)
-    tmp = p.with_suffix(".json.tmp")
-    tmp.write_text(json.dumps(items, ensure_ascii=False, indent=0), encoding="utf-8")
-    tmp.replace(p)
-
 def _safe_ext(filename: str, mime: str) -> str:
     # Prefer by MIME; fallback to filename extension
     if mime in ALLOWED_MIME:
@@ -1153,6 +1323,7 @@ async def telecaller_upload(
     lat: Optional[float] = Form(None),
     lng: Optional[float] = Form(None),
     file: UploadFile = File(...),
+    db: Session = Depends(get_db),
 ):
     mime = file.content_type or mimetypes.guess_type(file.filename or "")[0] or ""
     if mime not in ALLOWED_MIME:
@@ -1161,23 +1332,12 @@ async def telecaller_upload(
     ext = _safe_ext(file.filename or "", mime)
     if not ext:
         raise HTTPException(status_code=400, detail="File type not allowed")
+    check_size(mime, file.size)
 
-    # Make dated folder
-    today = datetime.utcnow().date().isoformat()
-    folder = UPLOAD_ROOT / f"telecaller_{telecaller_id}" / today
-    folder.mkdir(parents=True, exist_ok=True)
-
-    # Unique name
+    # Stream into the incoming area, hashing on the way; put() then files it by content
     uid = uuid.uuid4().hex[:16]
-    fname = f"{uid}{ext}"
-    fpath = folder / fname
-
-    # Save file
-    data = await file.read()
-    fpath.write_bytes(data)
-
-    # Public URL under /static (already mounted)
-    url = f"/uploads/telecaller_{telecaller_id}/{today}/{fname}"
+    staged = incoming_path(uid)
+    size, sha256 = await run_in_threadpool(store_stream, file.file, staged, mime)
 
     # Decide kind
     if kind == "auto":
@@ -1185,65 +1345,76 @@ async def telecaller_upload(
     else:
         kind_final = kind
 
-    item: Dict[str, Any] = {
-        "id": uid,
-        "telecaller_id": telecaller_id,
-        "url": url,
-        "filename": str(fpath.as_posix()),
-        "description": (description or "").strip(),
-        "kind": kind_final,
-        "mime": mime,
-        "size": len(data),
-        "created_at": _utc_now_z(),
-        "lat": lat,
-        "lng": lng,
-    }
-
-    # Append to index
-    items = _load_index(telecaller_id)
-    items.append(item)
-    _save_index(telecaller_id, items)
+    def persist():
+        try:
+            path = put(db, staged, sha256, size, mime)
+            item = Upload(
+                id=uid,
+                telecaller_id=telecaller_id,
+                url=blob_url(path),
+                filename=path.as_posix(),
+                description=(description or "").strip(),
+                kind=kind_final,
+                mime=mime,
+                size=size,
+                sha256=sha256,
+                lat=lat,
+                lng=lng,
+            )
+            db.add(item)
+            db.commit()
+        except Exception:
+            # put() only files the upload away on commit; the staged copy is ours to remove
+            db.rollback()
+            staged.unlink(missing_ok=True)
+            raise
+        return serialize_upload(item)
 
-    return item
+    return await run_in_threadpool(persist)
 
 @router.get("/telecaller/uploads/{telecaller_id}")
 def list_uploads(
     telecaller_id: int,
     kind: str = "",          # "", "document", "selfie"
     q: str = "",             # search description
-    date_on: str = "",       # "YYYY-MM-DD" (folder date)
+    date_on: str = "",       # "YYYY-MM-DD" (UTC day of the upload)
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    with_total: bool = False,
     db: Session = Depends(get_db),
 ):
-    items = _load_index(telecaller_id)
-    # Filter
+    # Every filter is SQL; the scan stays on ix_upload_telecaller_created
+    qry = db.query(Upload).filter(Upload.telecaller_id == telecaller_id)
     if kind:
-        items = [x for x in items if x.get("kind") == kind]
+        qry = qry.filter(Upload.kind == kind)
     if q:
-        ql = q.lower()
-        items = [x for x in items if ql in (x.get("description") or "").lower()]
+        qry = qry.filter(Upload.description.ilike(f"%{q.strip()}%"))
     if date_on:
-        # url contains /<date>/ segment
-        items = [x for x in items if f"/{date_on}/" in (x.get("url") or "")]
-    # Sort by created_at desc
-    items.sort(key=lambda i: i.get("created_at") or "", reverse=True)
-    return items
+        try:
+            day = datetime.strptime(date_on, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="date_on must be YYYY-MM-DD")
+        qry = qry.filter(Upload.created_at >= day, Upload.created_at < day + timedelta(days=1))
+    keys = [(Upload.created_at, True), (Upload.id, True)]
+    return paginate(qry, keys, serialize_upload, cursor, limit, with_total)
 
 @router.delete("/telecaller/upload/{telecaller_id}/{upload_id}")
-def delete_upload(telecaller_id: int, upload_id: str):
-    items = _load_index(telecaller_id)
-    keep: List[Dict[str, Any]] = []
-    deleted = None
-    for x in items:
-        if x.get("id") == upload_id:
-            deleted = x
-            # try to remove the file
-            try:
-                Path(x.get("filename", "")).unlink(missing_ok=True)
-            except Exception:
-                pass
-        else:
-            keep.append(x)
-    if deleted is None:
+def delete_upload(telecaller_id: int, upload_id: str, db: Session = Depends(get_db)):
+    item = db.query(Upload).filter(Upload.id == upload_id, Upload.telecaller_id == telecaller_id).first()
+    if item is None:
         raise HTTPException(status_code=404, detail="Upload not found")
-    _save_index(telecaller_id, keep)
+    db.delete(item)
+    if in_store(item.filename):
+        # Shared by every upload of the same content: only the last reference removes it
+        released = release(db, item.sha256)
+        db.commit()
+        if released is not None:
+            remove_unreferenced(db, item.sha256, released)
+        return {"ok": True}
+    db.commit()
+    # stored before the blob store: try to remove the file
+    try:
+        Path(item.filename).unlink(missing_ok=True)
+    except Exception:
+        pass
     return {"ok": True}
@@ -73,6 +73,13 @@ class UploadListItem(BaseModel):
     kind: str
     mime: str
     size: int
+    sha256: Optional[str] = None
     created_at: str
     lat: Optional[float] = None
-    lng: Optional[float] = None
\ No newline at end of file
+    lng: Optional[float] = None
+
+class ReportRequest(BaseModel):
+    report_type: str               # calls | connected | converted | sitevisits
+    start: str                     # YYYY-MM-DD
+    end: str                       # YYYY-MM-DD
+    format: str = "xlsx"           # xlsx | csv
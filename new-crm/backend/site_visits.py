@@ -0,0 +1,46 @@
+"""Site visit times.
+
+SiteVisit.date is a naive-UTC timestamp, like Callback.due_at. Visits are
+entered as IST wall time: a bare "YYYY-MM-DD" from older forms, a
+datetime-local value ("2025-08-15T14:00") or an ISO string with an offset
+or "Z" (the SVS edit modal sends toISOString()). Date filters are
+half-open UTC ranges over IST days, so they stay on ix_site_visits_date.
+"""
+from datetime import date, datetime, time, timezone
+from typing import Optional, Tuple
+
+from location_history import IST, day_bounds
+
+# Sort key standing in for a legacy visit whose date couldn't be parsed
+NO_VISIT_DATE = datetime(1970, 1, 1)
+
+
+def parse_visit_date(value: Optional[str]) -> Optional[datetime]:
+    """Naive UTC for an entered visit date/time; None if it can't be read."""
+    s = (value or "").strip()
+    if not s:
+        return None
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    try:
+        if len(s) == 10:
+            dt = datetime.combine(date.fromisoformat(s), time.min)
+        else:
+            dt = datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=IST)
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_ist(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored naive UTC back to naive IST wall time, for exports."""
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc).astimezone(IST).replace(tzinfo=None)
+
+
+def days_range(start: date, end: date) -> Tuple[datetime, datetime]:
+    """Naive-UTC [lo, hi) covering the IST days start..end inclusive."""
+    return day_bounds(start)[0], day_bounds(end)[1]
@@ -0,0 +1,31 @@
+/* cached_fetch.js : conditional GETs for the catalog / user list endpoints.
+   The server tags these responses with an ETag; we keep the last body per URL
+   in localStorage and send If-None-Match, so an unchanged list costs a 304. */
+
+window.CachedFetch = (function () {
+  const PREFIX = "etag-cache:";
+
+  function load(url) {
+    try { return JSON.parse(localStorage.getItem(PREFIX + url)); } catch (_) { return null; }
+  }
+
+  function store(url, etag, body) {
+    try { localStorage.setItem(PREFIX + url, JSON.stringify({ etag, body })); } catch (_) { /* quota: just don't cache */ }
+  }
+
+  // Parsed JSON body of `url`; throws on HTTP errors.
+  async function json(url) {
+    const cached = load(url);
+    const headers = cached && cached.etag ? { "If-None-Match": cached.etag } : {};
+    // no-store: we handle revalidation ourselves and need to see the 304
+    const res = await fetch(url, { headers, cache: "no-store" });
+    if (res.status === 304 && cached) return cached.body;
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const body = await res.json();
+    const etag = res.headers.get("ETag");
+    if (etag) store(url, etag, body);
+    return body;
+  }
+
+  return { json };
+})();
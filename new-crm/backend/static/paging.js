@@ -0,0 +1,71 @@
+/* paging.js : cursor (keyset) pagination helpers for the list endpoints.
+   Endpoints return {items, next_cursor[, total]} when called with ?limit=. */
+
+window.Paging = (function () {
+  const PAGE_SIZE = 50;
+
+  // One page: buildUrl() returns the endpoint URL with filters (no limit/cursor).
+  async function fetchPage(buildUrl, cursor, opts = {}) {
+    const u = new URL(buildUrl(), location.origin);
+    u.searchParams.set("limit", opts.pageSize || PAGE_SIZE);
+    if (cursor) u.searchParams.set("cursor", cursor);
+    if (opts.withTotal) u.searchParams.set("with_total", "true");
+    const res = await fetch(u.pathname + u.search);
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    return res.json();
+  }
+
+  /* Infinite scroll below `listEl`.
+     opts: url() -> endpoint URL, render(items, isFirstPage), onEmpty(), onError(err),
+           pageSize, withTotal, onTotal(total)
+     Returns { reset() } — call reset() to (re)load from the first page. */
+  function infinite(listEl, opts) {
+    const sentinel = document.createElement("div");
+    sentinel.style.height = "1px";
+    listEl.after(sentinel);
+
+    let cursor = null, done = true, loading = false, gen = 0, seen = 0;
+
+    function sentinelVisible() {
+      return sentinel.getBoundingClientRect().top < window.innerHeight + 200;
+    }
+
+    async function loadMore() {
+      if (loading || done) return;
+      loading = true;
+      const mine = gen;
+      try {
+        const page = await fetchPage(opts.url, cursor, { pageSize: opts.pageSize, withTotal: opts.withTotal && !cursor });
+        if (mine !== gen) return;
+        if (page.total != null && opts.onTotal) opts.onTotal(page.total);
+        opts.render(page.items, seen === 0);
+        seen += page.items.length;
+        cursor = page.next_cursor;
+        done = !cursor;
+        if (!seen && opts.onEmpty) opts.onEmpty();
+      } catch (err) {
+        if (mine !== gen) return;
+        done = true;
+        if (opts.onError) opts.onError(err);
+      } finally {
+        if (mine === gen) loading = false;
+      }
+      // Short pages may leave the sentinel on screen; keep filling
+      if (mine === gen && !done && sentinelVisible()) loadMore();
+    }
+
+    new IntersectionObserver(entries => {
+      if (entries.some(e => e.isIntersecting)) loadMore();
+    }, { rootMargin: "200px" }).observe(sentinel);
+
+    return {
+      reset() {
+        gen++;
+        cursor = null; done = false; loading = false; seen = 0;
+        loadMore();
+      },
+    };
+  }
+
+  return { PAGE_SIZE, fetchPage, infinite };
+})();
@@ -0,0 +1,30 @@
+/* telecaller_events.js : the server-push stream for one telecaller
+   (/events/telecaller/{id}). Pages pass a handler per event type instead of
+   polling. The browser reconnects on its own and the server replays what was
+   missed; when it can't ("resync"), or nothing had arrived yet to resume
+   from, onResync runs so the page refetches. */
+
+window.TelecallerEvents = (function () {
+  // Returns the EventSource, or null when the browser has none (keep polling then).
+  function connect(telecallerId, handlers, onResync) {
+    if (!window.EventSource || !telecallerId) return null;
+    const source = new EventSource(`/events/telecaller/${telecallerId}`);
+    let opened = false;
+    let resumable = false;
+
+    for (const [type, fn] of Object.entries(handlers)) {
+      source.addEventListener(type, (e) => {
+        if (e.lastEventId) resumable = true;
+        fn(JSON.parse(e.data));
+      });
+    }
+    source.addEventListener("resync", () => { if (onResync) onResync(); });
+    source.addEventListener("open", () => {
+      if (opened && !resumable && onResync) onResync();
+      opened = true;
+    });
+    return source;
+  }
+
+  return { connect };
+})();
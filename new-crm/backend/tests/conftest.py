@@ -0,0 +1,27 @@
+"""Shared fixtures. The backend modules import each other flat (run from
+new-crm/backend), so that directory goes on sys.path. Importing `database`
+builds the Postgres engine but does not connect; tests that need tables get
+an in-memory SQLite session instead."""
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import Base  # noqa: E402
+import models  # noqa: E402,F401  (registers all tables on Base.metadata)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
@@ -0,0 +1,104 @@
+import hashlib
+
+import pytest
+
+import blob_store
+from models import Blob
+
+MIME = "image/jpeg"
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_ROOT", tmp_path / "blobs")
+    return tmp_path
+
+
+def staged(store, name, content=b"photo"):
+    path = store / name
+    path.write_bytes(content)
+    return path, hashlib.sha256(content).hexdigest()
+
+
+def refcount(db, sha256):
+    return db.query(Blob.refcount).filter(Blob.sha256 == sha256).scalar()
+
+
+def test_new_content_moves_in_on_commit(db, store):
+    src, sha = staged(store, "a")
+    path = blob_store.put(db, src, sha, 5, MIME)
+    assert path == blob_store.BLOB_ROOT / sha[:2] / f"{sha}.jpg"
+    assert src.exists() and not path.exists()
+
+    db.commit()
+    assert path.read_bytes() == b"photo" and not src.exists()
+    assert refcount(db, sha) == 1
+
+
+def test_duplicate_adds_a_reference_and_drops_the_copy(db, store):
+    src, sha = staged(store, "a")
+    path = blob_store.put(db, src, sha, 5, MIME)
+    db.commit()
+
+    dup, _ = staged(store, "b")
+    assert blob_store.put(db, dup, sha, 5, MIME) == path
+    db.commit()
+    assert refcount(db, sha) == 2
+    assert path.exists() and not dup.exists()
+
+
+def test_rollback_leaves_files_alone(db, store):
+    src, sha = staged(store, "a")
+    path = blob_store.put(db, src, sha, 5, MIME)
+    db.rollback()
+    assert src.exists() and not path.exists()
+    assert refcount(db, sha) is None
+
+    # Nothing queued by the failed attempt runs on the next commit
+    db.commit()
+    assert src.exists() and not path.exists()
+
+
+def test_savepoint_end_does_not_apply_file_ops(db, store):
+    src, sha = staged(store, "a")
+    path = blob_store.put(db, src, sha, 5, MIME)
+    with db.begin_nested():
+        pass
+    assert src.exists() and not path.exists()
+    db.commit()
+    assert path.exists()
+
+
+def test_last_release_returns_path_for_removal(db, store):
+    src, sha = staged(store, "a")
+    path = blob_store.put(db, src, sha, 5, MIME)
+    db.commit()
+    dup, _ = staged(store, "b")
+    blob_store.put(db, dup, sha, 5, MIME)
+    db.commit()
+
+    assert blob_store.release(db, sha) is None
+    db.commit()
+    assert refcount(db, sha) == 1
+
+    assert blob_store.release(db, sha) == path
+    assert path.exists()
+    db.commit()
+    assert refcount(db, sha) is None
+    blob_store.remove_unreferenced(db, sha, path)
+    assert not path.exists()
+
+
+def test_remove_unreferenced_keeps_content_stored_again(db, store):
+    src, sha = staged(store, "a")
+    path = blob_store.put(db, src, sha, 5, MIME)
+    db.commit()
+    assert blob_store.release(db, sha) == path
+    db.commit()
+
+    # Another upload stores the same content before the removal runs
+    again, _ = staged(store, "b")
+    blob_store.put(db, again, sha, 5, MIME)
+    db.commit()
+    blob_store.remove_unreferenced(db, sha, path)
+    assert path.exists() and refcount(db, sha) == 1
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from geo import GridIndex, haversine_km, valid_point
+
+
+def brute_force(points, lat, lng):
+    return sorted(((key, haversine_km(lat, lng, plat, plng)) for key, plat, plng in points), key=lambda h: h[1])
+
+
+@pytest.fixture(scope="module")
+def city():
+    # Dense cluster around Bengaluru plus a few far-away points
+    rng = random.Random(7)
+    points = [(i, 12.97 + rng.uniform(-0.2, 0.2), 77.59 + rng.uniform(-0.2, 0.2)) for i in range(2000)]
+    points += [("mumbai", 19.07, 72.88), ("delhi", 28.61, 77.21)]
+    return points
+
+
+def test_haversine_known_distance():
+    # Bengaluru - Mumbai is about 845 km as the crow flies
+    assert haversine_km(12.97, 77.59, 19.07, 72.88) == pytest.approx(845, abs=5)
+
+
+def test_invalid_points_are_skipped():
+    assert not valid_point(None, 77.0)
+    assert not valid_point(91.0, 77.0)
+    assert GridIndex([(1, None, 77.0), (2, 12.9, 200.0), (3, 12.9, 77.6)]).size == 1
+
+
+@pytest.mark.parametrize("radius", [0.5, 3, 25])
+def test_within_matches_brute_force(city, radius):
+    index = GridIndex(city)
+    for lat, lng in [(12.97, 77.59), (13.1, 77.45), (12.5, 78.0)]:
+        expected = [h for h in brute_force(city, lat, lng) if h[1] <= radius]
+        got = index.within(lat, lng, radius)
+        assert [k for k, _ in got] == [k for k, _ in expected]
+
+
+@pytest.mark.parametrize("k", [1, 5, 50])
+def test_nearest_matches_brute_force(city, k):
+    index = GridIndex(city)
+    for lat, lng in [(12.97, 77.59), (13.3, 77.9), (18.9, 72.8)]:
+        expected = brute_force(city, lat, lng)[:k]
+        got = index.nearest(lat, lng, k)
+        assert [d for _, d in got] == pytest.approx([d for _, d in expected])
+
+
+def test_nearest_respects_max_km(city):
+    index = GridIndex(city)
+    got = index.nearest(18.9, 72.8, 3, max_km=50)
+    assert [k for k, _ in got] == ["mumbai"]
+
+
+def test_nearest_on_empty_index():
+    assert GridIndex([]).nearest(12.97, 77.59, 3) == []
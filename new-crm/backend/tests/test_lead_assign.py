@@ -0,0 +1,38 @@
+from lead_assign import assign_mode, plan_allocation
+
+
+def users(*values):
+    return [{"user_id": i + 1, "value": v} for i, v in enumerate(values)]
+
+
+def test_values_up_to_100_are_percentages():
+    assert assign_mode(users(60, 40)) == "percentage"
+    assert assign_mode(users(60, 140)) == "count"
+
+
+def test_percentages_use_largest_remainder():
+    # Quotas 2.25 / 2.25 / 4.5: the lead lost to rounding goes to the largest remainder
+    assert plan_allocation(9, users(25, 25, 50)) == [(1, 2), (2, 2), (3, 5)]
+    # Quotas 2.5 / 2.5: the remainders tie and the earlier user wins
+    assert plan_allocation(5, users(50, 50)) == [(1, 3), (2, 2)]
+
+
+def test_percentages_below_100_leave_leads_unassigned():
+    plan = plan_allocation(10, users(30, 30))
+    assert plan == [(1, 3), (2, 3)]
+
+
+def test_percentages_never_exceed_the_total():
+    plan = plan_allocation(7, users(100, 100))
+    assert sum(n for _, n in plan) == 7
+
+
+def test_counts_get_one_leftover_each_in_listed_order():
+    assert plan_allocation(502, users(200, 300)) == [(1, 201), (2, 301)]
+    assert plan_allocation(501, users(200, 300)) == [(1, 201), (2, 300)]
+    # At most one extra each; the rest stays unassigned
+    assert plan_allocation(1000, users(200, 300)) == [(1, 201), (2, 301)]
+
+
+def test_counts_are_truncated_when_leads_run_out():
+    assert plan_allocation(250, users(200, 300)) == [(1, 200), (2, 50)]
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from location_history import downsample
+from models import LiveLocation, LiveLocationMinute
+
+T0 = datetime(2026, 1, 5, 10, 0)
+
+
+def ping(tid, seconds, acc, lat=12.9):
+    return LiveLocation(telecaller_id=tid, lat=lat, lng=77.6, accuracy=acc,
+                        timestamp=T0 + timedelta(seconds=seconds))
+
+
+def minutes(db):
+    return {(m.telecaller_id, m.minute): (m.lat, m.accuracy)
+            for m in db.query(LiveLocationMinute)}
+
+
+def test_keeps_most_accurate_then_latest_per_minute(db):
+    db.add_all([
+        ping(1, 5, 30.0, lat=1.0),
+        ping(1, 20, 10.0, lat=2.0),    # most accurate in 10:00
+        ping(1, 50, None, lat=3.0),    # no accuracy ranks last
+        ping(1, 65, 15.0, lat=4.0),
+        ping(1, 80, 15.0, lat=5.0),    # tie on accuracy: later wins
+        ping(2, 10, None, lat=6.0),    # only ping in the minute, kept anyway
+    ])
+    db.commit()
+
+    assert downsample(db, T0 + timedelta(hours=1)) == 3
+    db.commit()
+    assert minutes(db) == {
+        (1, T0): (2.0, 10.0),
+        (1, T0 + timedelta(minutes=1)): (5.0, 15.0),
+        (2, T0): (6.0, None),
+    }
+
+
+def test_range_is_half_open(db):
+    db.add_all([ping(1, -1, 5.0), ping(1, 0, 5.0), ping(1, 60, 5.0)])
+    db.commit()
+
+    assert downsample(db, T0 + timedelta(minutes=1), since=T0) == 1
+    db.commit()
+    assert list(minutes(db)) == [(1, T0)]
+
+
+def test_rerun_leaves_stored_minutes_alone(db):
+    db.add(ping(1, 10, 20.0, lat=1.0))
+    db.commit()
+    downsample(db, T0 + timedelta(hours=1))
+    db.commit()
+
+    db.add(ping(1, 30, 5.0, lat=2.0))
+    db.add(ping(1, 70, 5.0, lat=3.0))
+    db.commit()
+    assert downsample(db, T0 + timedelta(hours=1)) == 1
+    db.commit()
+    assert minutes(db) == {
+        (1, T0): (1.0, 20.0),
+        (1, T0 + timedelta(minutes=1)): (3.0, 5.0),
+    }
+
+
+def test_nothing_to_do(db):
+    assert downsample(db, T0) == 0
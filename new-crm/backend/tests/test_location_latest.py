@@ -0,0 +1,14 @@
+import pytest
+
+from location_latest import _missing
+
+
+@pytest.mark.parametrize("lo, hi, ids, expected", [
+    (1, 5, [], [(1, 5)]),
+    (1, 5, [1, 2, 3, 4, 5], []),
+    (1, 5, [3], [(1, 2), (4, 5)]),
+    (1, 5, [1, 5], [(2, 4)]),
+    (3, 8, [1, 2, 4, 6, 9, 10], [(3, 3), (5, 5), (7, 8)]),
+])
+def test_missing_ranges(lo, hi, ids, expected):
+    assert list(_missing(lo, hi, ids)) == expected
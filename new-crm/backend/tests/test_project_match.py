@@ -0,0 +1,38 @@
+import pytest
+
+from project_match import bhk_list, parse_bhk, parse_budget
+
+CR, LAKH = 10**7, 10**5
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.2-1.5 Cr", (int(1.2 * CR), int(1.5 * CR))),    # one unit covers both figures
+    ("₹75L - 1.1Cr", (75 * LAKH, int(1.1 * CR))),
+    ("45,00,000", (4_500_000, 4_500_000)),             # Indian digit grouping
+    ("50 lakhs", (50 * LAKH, 50 * LAKH)),
+    ("60-80", (60 * LAKH, 80 * LAKH)),                 # unitless mid-size figures are lakhs
+    ("1.15-2.25", (int(1.15 * CR), int(2.25 * CR))),   # unitless small figures are crores
+    ("under 80L", (0, 80 * LAKH)),
+    ("above 2 cr", (2 * CR, None)),
+])
+def test_parse_budget(text, expected):
+    assert parse_budget(text) == expected
+
+
+@pytest.mark.parametrize("text", [None, "", "negotiable"])
+def test_parse_budget_without_figures(text):
+    assert parse_budget(text) == (None, None)
+
+
+@pytest.mark.parametrize("text, sizes", [
+    ("2BHK,3BHK", ["2BHK", "3BHK"]),
+    ("2-4 BHK", ["2BHK", "3BHK", "4BHK"]),
+    ("2 and 3 bhk", ["2BHK", "3BHK"]),
+    ("Studio, 1BHK", ["Studio", "1BHK"]),
+    ("1 RK", ["Studio"]),
+    ("3.5 BHK", ["3BHK"]),
+    ("villa", []),
+    (None, []),
+])
+def test_parse_bhk(text, sizes):
+    assert bhk_list(parse_bhk(text)) == sizes
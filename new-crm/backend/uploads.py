@@ -0,0 +1,227 @@
+"""Telecaller uploads: files under static/uploads, metadata in the `upload` table.
+
+Size limits: UploadLimitMiddleware refuses an upload request from its
+Content-Length, before any of the body is read, when it exceeds the largest
+per-MIME limit. Starlette spools the multipart body of accepted requests to
+a temporary file; only then is the file part's MIME type known, and the
+route checks that type's own limit (check_size) against the spooled size.
+
+store_stream() then copies the upload to disk CHUNK_SIZE bytes at a time,
+hashing as it goes, into a .part file that is renamed into place only once
+complete; memory per upload is one chunk whatever the file size. The
+SHA-256 is kept on the row.
+
+Metadata used to live in one JSON file per telecaller
+(static/uploads/_index/telecaller_{id}.json), rewritten whole on every
+upload or delete. import_json_indexes() loads those files into the table;
+run it once with `python uploads.py` (migrate.py runs it too). Once the
+rows are committed, mark_imported() renames the files *.json.imported so
+later runs skip them.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from database import SessionLocal
+from models import Upload
+
+UPLOAD_ROOT = Path("static/uploads")
+INDEX_ROOT = UPLOAD_ROOT / "_index"
+CHUNK_SIZE = 1024 * 1024
+
+ALLOWED_MIME = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "application/pdf": ".pdf",
+}
+
+_MB = 1024 * 1024
+_IMAGE_MAX = int(os.getenv("CRM_UPLOAD_MAX_IMAGE_MB", "10")) * _MB
+MAX_BYTES = {
+    "image/jpeg": _IMAGE_MAX,
+    "image/png": _IMAGE_MAX,
+    "image/webp": _IMAGE_MAX,
+    "application/pdf": int(os.getenv("CRM_UPLOAD_MAX_PDF_MB", "25")) * _MB,
+}
+
+
+# Multipart framing plus the small form fields sent alongside the file
+FORM_OVERHEAD = 64 * 1024
+# Routes taking a multipart upload checked by UploadLimitMiddleware
+UPLOAD_PATHS = {"/telecaller/upload"}
+
+
+def _too_large(mime: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large (max {MAX_BYTES[mime] // _MB} MB for {mime})")
+
+
+def check_size(mime: str, size: Optional[int]) -> None:
+    """Reject a spooled upload over its MIME type's limit before copying it."""
+    if size is not None and size > MAX_BYTES[mime]:
+        raise _too_large(mime)
+
+
+class UploadLimitMiddleware:
+    """Refuse oversized uploads before the body is read (see module docstring)."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.max_body = max(MAX_BYTES.values()) + FORM_OVERHEAD
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in UPLOAD_PATHS:
+            length = Headers(scope=scope).get("content-length")
+            response = None
+            if length is None:
+                response = JSONResponse({"detail": "Content-Length required"}, status_code=411)
+            elif not length.isdigit():
+                response = JSONResponse({"detail": "Invalid Content-Length"}, status_code=400)
+            elif int(length) > self.max_body:
+                response = JSONResponse(
+                    {"detail": f"File too large (max {max(MAX_BYTES.values()) // _MB} MB)"}, status_code=413
+                )
+            if response is not None:
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def store_stream(src: BinaryIO, dest: Path, mime: str) -> Tuple[int, str]:
+    """Copy `src` to `dest` in chunks; returns (size, sha256 hex).
+
+    Blocking: run it in a worker thread. Nothing is left behind at `dest`
+    (or in its .part file) if the copy fails or exceeds the limit.
+    """
+    limit = MAX_BYTES[mime]
+    part = dest.with_name(dest.name + ".part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with part.open("wb") as out:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise _too_large(mime)
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(part, dest)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
+
+
+def file_sha256(path: Path) -> Optional[str]:
+    """SHA-256 of a stored file, or None if it is missing."""
+    digest = hashlib.sha256()
+    try:
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except (FileNotFoundError, IsADirectoryError):  # an empty filename is "."
+        return None
+    return digest.hexdigest()
+
+
+def _parse_created(value: Optional[str]) -> datetime:
+    try:
+        dt = datetime.fromisoformat((value or "").replace("Z", "+00:00"))
+    except ValueError:
+        return datetime.utcnow()
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def serialize_upload(u: Upload) -> Dict[str, Any]:
+    return {
+        "id": u.id,
+        "telecaller_id": u.telecaller_id,
+        "url": u.url,
+        "filename": u.filename,
+        "description": u.description or "",
+        "kind": u.kind,
+        "mime": u.mime,
+        "size": u.size,
+        "sha256": u.sha256,
+        "created_at": u.created_at.replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z"),
+        "lat": u.lat,
+        "lng": u.lng,
+    }
+
+
+def import_json_indexes(db: Session, index_root: Path = INDEX_ROOT) -> Dict[str, Any]:
+    """Add every legacy JSON index entry to the session (the caller commits).
+
+    Entries already in the table are skipped; ones without an id or an
+    integer telecaller_id are counted as malformed. `paths` lists the files
+    read, to hand to mark_imported() after the commit.
+    """
+    paths: List[Path] = []
+    imported = skipped = malformed = 0
+    for path in sorted(index_root.glob("telecaller_*.json")):
+        try:
+            items = json.loads(path.read_text(encoding="utf-8")) or []
+        except ValueError:
+            print(f"   {path}: unreadable, left in place")
+            continue
+        valid = []
+        for x in items if isinstance(items, list) else ():
+            if isinstance(x, dict) and x.get("id") and isinstance(x.get("telecaller_id"), int):
+                valid.append(x)
+            else:
+                malformed += 1
+        ids = [x["id"] for x in valid]
+        known = {uid for (uid,) in db.query(Upload.id).filter(Upload.id.in_(ids))} if ids else set()
+        for x in valid:
+            if x["id"] in known:
+                skipped += 1
+                continue
+            known.add(x["id"])
+            db.add(Upload(
+                id=x["id"],
+                telecaller_id=x["telecaller_id"],
+                url=x.get("url") or "",
+                filename=x.get("filename") or "",
+                description=x.get("description") or "",
+                kind=x.get("kind") or "",
+                mime=x.get("mime") or "",
+                size=x.get("size") or 0,
+                created_at=_parse_created(x.get("created_at")),
+                lat=x.get("lat"),
+                lng=x.get("lng"),
+            ))
+            imported += 1
+        db.flush()
+        paths.append(path)
+    return {"files": len(paths), "imported": imported, "skipped": skipped, "malformed": malformed, "paths": paths}
+
+
+def mark_imported(paths: List[Path]) -> None:
+    """Rename imported index files so later runs skip them; only after the rows are committed."""
+    for path in paths:
+        path.rename(path.with_name(path.name + ".imported"))
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        result = import_json_indexes(db)
+        db.commit()
+        mark_imported(result.pop("paths"))
+        print(result)
+    finally:
+        db.close()
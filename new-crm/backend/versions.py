@@ -0,0 +1,40 @@
+"""Data-set version stamps shared by every worker process.
+
+A write that changes a data set calls bump_version() before its commit, so
+the stamp and the data move together; readers compare stamps to decide
+whether something derived from that data (a cached report, a cached
+catalog) is still current.
+"""
+from datetime import datetime
+from typing import Dict, Iterable
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import DataVersion
+
+
+def bump_version(db: Session, *names: str) -> None:
+    """Increment the named stamps inside the caller's transaction (caller commits)."""
+    now = datetime.utcnow()
+    for name in names:
+        updated = (
+            db.query(DataVersion)
+            .filter(DataVersion.name == name)
+            .update({"version": DataVersion.version + 1, "updated_at": now}, synchronize_session=False)
+        )
+        if updated:
+            continue
+        try:
+            with db.begin_nested():
+                db.add(DataVersion(name=name, version=1, updated_at=now))
+        except IntegrityError:  # another writer created the row first
+            db.query(DataVersion).filter(DataVersion.name == name).update(
+                {"version": DataVersion.version + 1, "updated_at": now}, synchronize_session=False
+            )
+
+
+def get_versions(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    names = list(names)
+    found = dict(db.query(DataVersion.name, DataVersion.version).filter(DataVersion.name.in_(names)).all())
+    return {name: found.get(name, 0) for name in names}